@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+""" Synthetic MultiQC benchmark corpus. Writes made up (but realistically
+formatted and sized) logs for FastQC, Qualimap BamQC, Picard, STAR, Samtools,
+Bcftools and Custom Content, for any number of samples. Samples are written
+in batches of 1000 per directory, with one directory per tool in each batch.
+The same seed always gives the same files. """
+
+from __future__ import print_function, division
+import argparse
+import io
+import json
+import os
+import random
+import zipfile
+
+MODULES = ['fastqc', 'qualimap', 'picard', 'star', 'samtools', 'bcftools', 'custom_content']
+BATCH_SIZE = 1000
+
+def write(fn, text):
+    d = os.path.dirname(fn)
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    with io.open(fn, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+    return len(text)
+
+def fastqc(rng, s_name, out_dir):
+    """ Zipped FastQC report, as written by fastqc --noextract """
+    read_len = 101
+    total = rng.randint(5000000, 50000000)
+    gc = rng.randint(38, 52)
+    l = [ '##FastQC\t0.11.5', '>>Basic Statistics\tpass', '#Measure\tValue',
+          'Filename\t{}.fastq.gz'.format(s_name), 'File type\tConventional base calls',
+          'Encoding\tSanger / Illumina 1.9', 'Total Sequences\t{}'.format(total),
+          'Sequences flagged as poor quality\t0', 'Sequence length\t{}'.format(read_len),
+          '%GC\t{}'.format(gc), '>>END_MODULE' ]
+    l += [ '>>Per base sequence quality\tpass', '#Base\tMean\tMedian\tLower Quartile\tUpper Quartile\t10th Percentile\t90th Percentile' ]
+    for b in range(1, read_len + 1):
+        m = 38 - (b / read_len) * rng.uniform(2, 8)
+        l.append('{}\t{:.2f}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}'.format(b, m, round(m), m - 3, m + 1, m - 8, m + 2))
+    l += [ '>>END_MODULE', '>>Per sequence quality scores\tpass', '#Quality\tCount' ]
+    for q in range(2, 42):
+        l.append('{}\t{:.1f}'.format(q, total * 0.4 ** abs(38 - q) * rng.uniform(0.9, 1.1)))
+    l += [ '>>END_MODULE', '>>Per base sequence content\tpass', '#Base\tG\tA\tT\tC' ]
+    for b in range(1, read_len + 1):
+        g = gc / 2 + rng.uniform(-1, 1)
+        a = (100 - gc) / 2 + rng.uniform(-1, 1)
+        l.append('{}\t{:.2f}\t{:.2f}\t{:.2f}\t{:.2f}'.format(b, g, a, 100 - gc - a, gc - g))
+    l += [ '>>END_MODULE', '>>Per sequence GC content\twarn', '#GC Content\tCount' ]
+    for p in range(0, 101):
+        l.append('{}\t{:.1f}'.format(p, total * 0.9 ** abs(gc - p) / 10))
+    l += [ '>>END_MODULE', '>>Per base N content\tpass', '#Base\tN-Count' ]
+    for b in range(1, read_len + 1):
+        l.append('{}\t{:.3f}'.format(b, rng.uniform(0, 0.05)))
+    l += [ '>>END_MODULE', '>>Sequence Length Distribution\tpass', '#Length\tCount',
+           '{}\t{}.0'.format(read_len, total), '>>END_MODULE',
+           '>>Sequence Duplication Levels\tpass', '#Total Deduplicated Percentage\t{:.2f}'.format(rng.uniform(40, 95)),
+           '#Duplication Level\tPercentage of deduplicated\tPercentage of total' ]
+    for d in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '>10', '>50', '>100', '>500', '>1k', '>5k', '>10k']:
+        l.append('{}\t{:.3f}\t{:.3f}'.format(d, rng.uniform(0, 80), rng.uniform(0, 80)))
+    l += [ '>>END_MODULE', '>>Overrepresented sequences\tpass', '>>END_MODULE',
+           '>>Adapter Content\tpass', '#Position\tIllumina Universal Adapter\tIllumina Small RNA Adapter\tNextera Transposase Sequence\tSOLID Small RNA Adapter' ]
+    for b in range(1, read_len - 10):
+        l.append('{}\t{:.4f}\t0.0\t0.0\t0.0'.format(b, b * rng.uniform(0, 0.01)))
+    l += [ '>>END_MODULE', '' ]
+    fn = os.path.join(out_dir, '{}_fastqc.zip'.format(s_name))
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    with zipfile.ZipFile(fn, 'w', zipfile.ZIP_DEFLATED) as z:
+        # FastQC zips start with the report directory
+        z.writestr('{}_fastqc/'.format(s_name), '')
+        z.writestr('{}_fastqc/fastqc_data.txt'.format(s_name), '\n'.join(l))
+        z.writestr('{}_fastqc/summary.txt'.format(s_name), 'PASS\tBasic Statistics\t{}.fastq.gz\n'.format(s_name))
+    return os.path.getsize(fn)
+
+def qualimap(rng, s_name, out_dir):
+    """ Qualimap BamQC results directory """
+    d = os.path.join(out_dir, s_name)
+    reads = rng.randint(10000000, 60000000)
+    mapped = int(reads * rng.uniform(0.8, 0.99))
+    insert = rng.randint(200, 450)
+    size = write(os.path.join(d, 'genome_results.txt'), '\n'.join([
+        'BamQC report', '-----------------------------------', '',
+        '>>>>>>> Input', '', '     bam file = /data/{}.bam'.format(s_name), '     outfile = {}/genome_results.txt'.format(s_name), '',
+        '>>>>>>> Reference', '', '     number of bases = 3,101,804,739 bp', '     number of contigs = 84', '',
+        '>>>>>>> Globals', '', '     number of windows = 400',
+        '     number of reads = {:,}'.format(reads),
+        '     number of mapped reads = {:,} ({:.2f}%)'.format(mapped, mapped / reads * 100),
+        '     number of mapped bases = {:,} bp'.format(mapped * 100),
+        '     number of sequenced bases = {:,} bp'.format(reads * 100), '',
+        '>>>>>>> Insert size', '', '     mean insert size = {:.4f}'.format(insert * rng.uniform(0.95, 1.05)),
+        '     median insert size = {}'.format(insert), '',
+        '>>>>>>> Mapping quality', '', '     mean mapping quality = {:.4f}'.format(rng.uniform(30, 60)), ''
+    ]))
+    raw = os.path.join(d, 'raw_data_qualimapReport')
+    cov = rng.uniform(10, 60)
+    size += write(os.path.join(raw, 'coverage_histogram.txt'), '#Coverage\tNumber of genomic locations\n' + ''.join(
+        '{:.1f}\t{:.1f}\n'.format(c, int(3e9 * 0.95 ** abs(cov - c) / 20)) for c in range(0, 200)))
+    size += write(os.path.join(raw, 'insert_size_histogram.txt'), '#Insert size\tOccurrences\n' + ''.join(
+        '{:.1f}\t{:.1f}\n'.format(i, int(mapped * 0.99 ** abs(insert - i) / 100)) for i in range(0, 1000, 2)))
+    size += write(os.path.join(raw, 'mapped_reads_gc-content_distribution.txt'), '#GC Content (%)\tSample\tHUMAN (hg19)\n' + ''.join(
+        '{:.1f}\t{:.8f}\t{:.8f}\n'.format(g, 0.9 ** abs(45 - g) / 20, 0.9 ** abs(41 - g) / 20) for g in range(0, 101)))
+    return size
+
+PICARD_HEADER = """## htsjdk.samtools.metrics.StringHeader
+# {cmd}
+## htsjdk.samtools.metrics.StringHeader
+# Started on: Thu Jan 12 10:00:00 GMT 2017
+
+"""
+
+def picard(rng, s_name, out_dir):
+    """ Picard MarkDuplicates and CollectInsertSizeMetrics metrics files """
+    pairs = rng.randint(5000000, 30000000)
+    dups = int(pairs * rng.uniform(0.05, 0.4))
+    text = PICARD_HEADER.format(cmd='picard.sam.markduplicates.MarkDuplicates INPUT=[{0}.bam] OUTPUT={0}.dedup.bam METRICS_FILE={0}.markdups_metrics.txt'.format(s_name))
+    text += '## METRICS CLASS\tpicard.sam.DuplicationMetrics\n'
+    text += 'LIBRARY\tUNPAIRED_READS_EXAMINED\tREAD_PAIRS_EXAMINED\tSECONDARY_OR_SUPPLEMENTARY_RDS\tUNMAPPED_READS\tUNPAIRED_READ_DUPLICATES\tREAD_PAIR_DUPLICATES\tREAD_PAIR_OPTICAL_DUPLICATES\tPERCENT_DUPLICATION\tESTIMATED_LIBRARY_SIZE\n'
+    text += '{}\t{}\t{}\t0\t{}\t{}\t{}\t{}\t{:.6f}\t{}\n\n'.format(s_name, rng.randint(1000, 50000), pairs, rng.randint(1000, 90000),
+        rng.randint(100, 5000), dups, int(dups * 0.01), dups / pairs, pairs * 3)
+    text += '## HISTOGRAM\tjava.lang.Double\nBIN\tVALUE\n' + ''.join('{:.1f}\t{:.6f}\n'.format(b, b * 0.9) for b in range(1, 101))
+    size = write(os.path.join(out_dir, '{}.markdups_metrics.txt'.format(s_name)), text)
+
+    insert = rng.randint(200, 450)
+    text = PICARD_HEADER.format(cmd='picard.analysis.CollectInsertSizeMetrics HISTOGRAM_FILE={0}.pdf INPUT={0}.bam OUTPUT={0}.insert_size_metrics.txt'.format(s_name))
+    text += '## METRICS CLASS\tpicard.analysis.InsertSizeMetrics\n'
+    text += 'MEDIAN_INSERT_SIZE\tMEDIAN_ABSOLUTE_DEVIATION\tMIN_INSERT_SIZE\tMAX_INSERT_SIZE\tMEAN_INSERT_SIZE\tSTANDARD_DEVIATION\tREAD_PAIRS\tPAIR_ORIENTATION\tWIDTH_OF_10_PERCENT\tWIDTH_OF_20_PERCENT\tWIDTH_OF_30_PERCENT\tWIDTH_OF_40_PERCENT\tWIDTH_OF_50_PERCENT\tWIDTH_OF_60_PERCENT\tWIDTH_OF_70_PERCENT\tWIDTH_OF_80_PERCENT\tWIDTH_OF_90_PERCENT\tWIDTH_OF_99_PERCENT\tSAMPLE\tLIBRARY\tREAD_GROUP\n'
+    text += '{}\t{}\t20\t{}\t{:.6f}\t{:.6f}\t{}\tFR\t11\t23\t35\t47\t61\t75\t93\t119\t165\t421\t\t\t\n\n'.format(
+        insert, rng.randint(30, 90), rng.randint(5000, 100000), insert * rng.uniform(0.95, 1.05), rng.uniform(50, 150), pairs)
+    text += '## HISTOGRAM\tjava.lang.Integer\ninsert_size\tAll_Reads.fr_count\n' + ''.join(
+        '{}\t{}\n'.format(i, int(pairs * 0.98 ** abs(insert - i) / 100)) for i in range(20, 800))
+    size += write(os.path.join(out_dir, '{}.insert_size_metrics.txt'.format(s_name)), text)
+    return size
+
+def star(rng, s_name, out_dir):
+    """ STAR Log.final.out """
+    reads = rng.randint(10000000, 60000000)
+    uniq = rng.uniform(70, 95)
+    multi = rng.uniform(1, 100 - uniq - 2)
+    toomany = rng.uniform(0, 0.5)
+    short = 100 - uniq - multi - toomany - 0.5
+    rows = [
+        ('Started job on', 'Jan 12 10:00:00'), ('Started mapping on', 'Jan 12 10:01:00'),
+        ('Finished on', 'Jan 12 10:30:00'), ('Mapping speed, Million of reads per hour', '{:.2f}'.format(rng.uniform(100, 400))),
+        ('', ''), ('Number of input reads', reads), ('Average input read length', 202), ('UNIQUE READS:', None),
+        ('Uniquely mapped reads number', int(reads * uniq / 100)), ('Uniquely mapped reads %', '{:.2f}%'.format(uniq)),
+        ('Average mapped length', '{:.2f}'.format(rng.uniform(195, 201))),
+        ('Number of splices: Total', rng.randint(1000000, 9000000)), ('Number of splices: Annotated (sjdb)', rng.randint(900000, 8000000)),
+        ('Number of splices: GT/AG', rng.randint(900000, 8000000)), ('Number of splices: GC/AG', rng.randint(1000, 90000)),
+        ('Number of splices: AT/AC', rng.randint(100, 9000)), ('Number of splices: Non-canonical', rng.randint(100, 9000)),
+        ('Mismatch rate per base, %', '{:.2f}%'.format(rng.uniform(0.1, 0.6))), ('Deletion rate per base', '0.01%'),
+        ('Deletion average length', '1.72'), ('Insertion rate per base', '0.01%'), ('Insertion average length', '1.45'),
+        ('MULTI-MAPPING READS:', None), ('Number of reads mapped to multiple loci', int(reads * multi / 100)),
+        ('% of reads mapped to multiple loci', '{:.2f}%'.format(multi)), ('Number of reads mapped to too many loci', int(reads * toomany / 100)),
+        ('% of reads mapped to too many loci', '{:.2f}%'.format(toomany)), ('UNMAPPED READS:', None),
+        ('% of reads unmapped: too many mismatches', '0.00%'), ('% of reads unmapped: too short', '{:.2f}%'.format(short)),
+        ('% of reads unmapped: other', '0.50%'), ('CHIMERIC READS:', None),
+        ('Number of chimeric reads', 0), ('% of chimeric reads', '0.00%')
+    ]
+    text = ''
+    for k, v in rows:
+        if v is None:
+            text += '{:>48}\n'.format(k)
+        else:
+            text += '{:>48} |\t{}\n'.format(k, v)
+    return write(os.path.join(out_dir, '{}.Log.final.out'.format(s_name)), text)
+
+def samtools(rng, s_name, out_dir):
+    """ samtools stats output (summary numbers, insert sizes and coverage) """
+    reads = rng.randint(10000000, 60000000)
+    mapped = int(reads * rng.uniform(0.8, 0.99))
+    insert = rng.randint(200, 450)
+    sn = [
+        ('raw total sequences', reads), ('filtered sequences', 0), ('sequences', reads), ('is sorted', 1),
+        ('1st fragments', reads // 2), ('last fragments', reads // 2), ('reads mapped', mapped),
+        ('reads mapped and paired', mapped - 1000), ('reads unmapped', reads - mapped), ('reads properly paired', mapped - 5000),
+        ('reads paired', reads), ('reads duplicated', int(mapped * rng.uniform(0.05, 0.3))), ('reads MQ0', rng.randint(1000, 90000)),
+        ('reads QC failed', 0), ('non-primary alignments', rng.randint(1000, 90000)), ('total length', reads * 101),
+        ('bases mapped', mapped * 101), ('bases mapped (cigar)', mapped * 100), ('bases trimmed', 0), ('bases duplicated', 0),
+        ('mismatches', rng.randint(1000000, 9000000)), ('error rate', '{:.6e}'.format(rng.uniform(0.001, 0.01))),
+        ('average length', 101), ('maximum length', 101), ('average quality', '{:.1f}'.format(rng.uniform(30, 38))),
+        ('insert size average', '{:.1f}'.format(insert)), ('insert size standard deviation', '{:.1f}'.format(rng.uniform(50, 150))),
+        ('inward oriented pairs', mapped // 2 - 1000), ('outward oriented pairs', rng.randint(100, 9000)),
+        ('pairs with other orientation', rng.randint(10, 900)), ('pairs on different chromosomes', rng.randint(1000, 90000))
+    ]
+    text = '# This file was produced by samtools stats (1.3+htslib-1.3) and can be plotted using plot-bamstats\n'
+    text += '# The command line was:  stats {}.bam\n'.format(s_name)
+    text += '# Summary Numbers. Use `grep ^SN | cut -f 2-` to extract this part.\n'
+    text += ''.join('SN\t{}:\t{}\n'.format(k, v) for k, v in sn)
+    text += '# Insert sizes. Use `grep ^IS | cut -f 2-` to extract this part. The columns are: insert size, pairs total, inward oriented pairs, outward oriented pairs, other pairs\n'
+    for i in range(0, 600):
+        n = int(mapped * 0.98 ** abs(insert - i) / 200)
+        text += 'IS\t{}\t{}\t{}\t0\t0\n'.format(i, n, n)
+    text += '# Coverage distribution. Use `grep ^COV | cut -f 2-` to extract this part.\n'
+    for c in range(1, 300):
+        text += 'COV\t[{0}-{0}]\t{0}\t{1}\n'.format(c, int(3e9 * 0.95 ** c / 20))
+    return write(os.path.join(out_dir, '{}.stats'.format(s_name)), text)
+
+def bcftools(rng, s_name, out_dir):
+    """ bcftools stats output for one sample's VCF """
+    snps = rng.randint(3000000, 5000000)
+    indels = rng.randint(400000, 900000)
+    text = '# This file was produced by bcftools stats (1.3+htslib-1.3) and can be plotted using plot-vcfstats.\n'
+    text += '# The command line was:\tbcftools stats  {}.vcf.gz\n'.format(s_name)
+    text += '# Definition of sets:\n# ID\t[2]id\t[3]tab-separated file names\n'
+    text += 'ID\t0\t{}.vcf.gz\n'.format(s_name)
+    text += '# SN, Summary numbers:\n# SN\t[2]id\t[3]key\t[4]value\n'
+    for k, v in [('number of samples', 1), ('number of records', snps + indels), ('number of no-ALTs', 0),
+                 ('number of SNPs', snps), ('number of MNPs', 0), ('number of indels', indels), ('number of others', 0),
+                 ('number of multiallelic sites', rng.randint(10000, 90000)), ('number of multiallelic SNP sites', rng.randint(1000, 9000))]:
+        text += 'SN\t0\t{}:\t{}\n'.format(k, v)
+    ts = int(snps * 0.67)
+    text += '# TSTV, transitions/transversions:\n# TSTV\t[2]id\t[3]ts\t[4]tv\t[5]ts/tv\t[6]ts (1st ALT)\t[7]tv (1st ALT)\t[8]ts/tv (1st ALT)\n'
+    text += 'TSTV\t0\t{0}\t{1}\t{2:.2f}\t{0}\t{1}\t{2:.2f}\n'.format(ts, snps - ts, ts / (snps - ts))
+    text += '# ST, Substitution types:\n# ST\t[2]id\t[3]type\t[4]count\n'
+    for t in ['A>C', 'A>G', 'A>T', 'C>A', 'C>G', 'C>T', 'G>A', 'G>C', 'G>T', 'T>A', 'T>C', 'T>G']:
+        text += 'ST\t0\t{}\t{}\n'.format(t, rng.randint(100000, 900000))
+    text += '# IDD, InDel distribution:\n# IDD\t[2]id\t[3]length (deletions negative)\t[4]count\n'
+    for i in range(-60, 61):
+        if i != 0:
+            text += 'IDD\t0\t{}\t{}\n'.format(i, int(indels * 0.8 ** abs(i) / 4))
+    text += '# PSC, Per-sample counts\n# PSC\t[2]id\t[3]sample\t[4]nRefHom\t[5]nNonRefHom\t[6]nHets\t[7]nTransitions\t[8]nTransversions\t[9]nIndels\t[10]average depth\t[11]nSingletons\n'
+    text += 'PSC\t0\t{}\t0\t{}\t{}\t{}\t{}\t{}\t{:.1f}\t{}\n'.format(s_name, snps // 3, snps // 2, ts, snps - ts, indels, rng.uniform(20, 40), snps)
+    text += '# DP, Depth distribution\n# DP\t[2]id\t[3]bin\t[4]number of genotypes\t[5]fraction of genotypes (%)\t[6]number of sites\t[7]fraction of sites (%)\n'
+    for b in range(0, 500):
+        n = int(snps * 0.97 ** abs(30 - b) / 30)
+        text += 'DP\t0\t{}\t0\t0.000000\t{}\t{:.6f}\n'.format(b, n, n / snps * 100)
+    return write(os.path.join(out_dir, '{}.bcftools_stats.txt'.format(s_name)), text)
+
+def custom_content(rng, s_name, out_dir):
+    """ Custom Content table row """
+    text = "# id: 'benchmark_table'\n# section_name: 'Benchmark table'\n# plot_type: 'table'\n"
+    text += 'Sample\tYield\tLane\tTemperature\tFlowcell\n'
+    text += '{}\t{:.3f}\t{}\t{:.1f}\tFC{}\n'.format(s_name, rng.uniform(1, 100), rng.randint(1, 8), rng.uniform(19, 24), rng.randint(1000, 9999))
+    return write(os.path.join(out_dir, '{}_mqc.tsv'.format(s_name)), text)
+
+GENERATORS = {
+    'fastqc': fastqc,
+    'qualimap': qualimap,
+    'picard': picard,
+    'star': star,
+    'samtools': samtools,
+    'bcftools': bcftools,
+    'custom_content': custom_content
+}
+
+def make_corpus(out_dir, num_samples, modules=MODULES, seed=1):
+    """ Write the corpus to out_dir, unless the same corpus is already there.
+    Returns a dict describing it (numbers of samples, files and bytes). """
+    info_fn = os.path.join(out_dir, 'corpus.json')
+    info = { 'samples': num_samples, 'modules': list(modules), 'seed': seed }
+    if os.path.isfile(info_fn):
+        with io.open(info_fn, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if all(existing.get(k) == v for k, v in info.items()):
+            return existing
+        raise IOError("Directory '{}' already has a different benchmark corpus".format(out_dir))
+    rng = random.Random(seed)
+    info['bytes'] = 0
+    for i in range(num_samples):
+        s_name = 'sample_{:06d}'.format(i + 1)
+        batch_dir = os.path.join(out_dir, 'batch_{:03d}'.format(i // BATCH_SIZE))
+        for m in modules:
+            info['bytes'] += GENERATORS[m](rng, s_name, os.path.join(batch_dir, m))
+    info['files'] = sum(len(files) for root, dirs, files in os.walk(out_dir))
+    with io.open(info_fn, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(info, ensure_ascii=False))
+    return info
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('out_dir', help='Directory to write the corpus to')
+    parser.add_argument('-n', '--samples', type=int, default=10, help='Number of samples')
+    parser.add_argument('-m', '--modules', default=','.join(MODULES), help='Comma-separated modules to make logs for')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    args = parser.parse_args()
+    modules = [ m for m in args.modules.split(',') if m ]
+    unknown = [ m for m in modules if m not in GENERATORS ]
+    if unknown:
+        parser.error('Unknown modules: {}'.format(', '.join(unknown)))
+    info = make_corpus(args.out_dir, args.samples, modules, args.seed)
+    print(json.dumps(info, indent=4, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
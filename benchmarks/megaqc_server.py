@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+""" Stand-in MegaQC server, to test and time MegaQC uploads without a real
+MegaQC install. Accepts gzipped JSON request bodies, sent in chunks or with a
+Content-Length, and reports how many bytes it received and how quickly.
+
+With --fail-first N, the first N attempts for each X-MultiQC-Upload-Id get a
+503 error, so that the retry / backoff code in multiqc_api_post() is used.
+With --truncate-first N, the next N attempts get a response that is cut off
+part way through, as if the connection dropped.
+Run MultiQC against it with:
+
+    python benchmarks/megaqc_server.py --port 8008 --fail-first 2
+    multiqc . --cl_config "megaqc_url: http://localhost:8008/api/upload_data"
+
+or use --self-test to run both at once, uploading a made up report. """
+
+from __future__ import print_function, division
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer # Python 2
+    from SocketServer import ThreadingMixIn
+
+class UploadServer(ThreadingMixIn, HTTPServer):
+    """ HTTP server that remembers the attempts for each upload id """
+    daemon_threads = True
+
+    def __init__(self, address, fail_first=0, truncate_first=0, verbose=True):
+        HTTPServer.__init__(self, address, UploadHandler)
+        self.fail_first = fail_first
+        self.truncate_first = truncate_first
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.attempts = defaultdict(int)
+        self.uploads = list()
+
+class UploadHandler(BaseHTTPRequestHandler):
+
+    def read_body(self):
+        """ Read the request body, decoding chunked transfer encoding """
+        if 'chunked' not in self.headers.get('Transfer-Encoding', '').lower():
+            return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = io.BytesIO()
+        while True:
+            size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+            if size == 0:
+                # Skip any trailers, up to the final blank line
+                while self.rfile.readline().strip():
+                    pass
+                break
+            body.write(self.rfile.read(size))
+            self.rfile.readline()
+        return body.getvalue()
+
+    def send_json(self, status, data):
+        response = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_POST(self):
+        start = time.time()
+        body = self.read_body()
+        elapsed = max(time.time() - start, 0.001)
+        upload_id = self.headers.get('X-MultiQC-Upload-Id', 'none')
+        with self.server.lock:
+            self.server.attempts[upload_id] += 1
+            attempt = self.server.attempts[upload_id]
+        if attempt <= self.server.fail_first:
+            self.log_message("Upload %s attempt %d: failing on purpose", upload_id, attempt)
+            self.send_json(503, {'success': False, 'message': 'Failed on purpose (attempt {})'.format(attempt)})
+            return
+        if attempt <= self.server.fail_first + self.server.truncate_first:
+            self.log_message("Upload %s attempt %d: cutting off the response", upload_id, attempt)
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'40\r\n{"success": true')
+            self.close_connection = True
+            return
+        try:
+            if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+                data = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+            else:
+                data = body
+            num_samples = len(json.loads(data.decode('utf-8'))['data'].get('report_data_sources', {}))
+        except Exception as e:
+            self.send_json(400, {'success': False, 'message': 'Could not read upload: {}'.format(e)})
+            return
+        upload = {
+            'upload_id': upload_id,
+            'attempts': attempt,
+            'bytes': len(body),
+            'json_bytes': len(data),
+            'seconds': elapsed,
+            'mb_per_second': len(body) / 1048576 / elapsed,
+        }
+        with self.server.lock:
+            self.server.uploads.append(upload)
+        self.log_message("Upload %s: %.2f MB (%.2f MB of JSON) in %.2f seconds (%.2f MB/s), after %d attempt(s)",
+            upload_id, len(body) / 1048576, len(data) / 1048576, elapsed, upload['mb_per_second'], attempt)
+        self.send_json(200, {'success': True, 'message': 'Received {} bytes'.format(len(body))})
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+def self_test(fail_first, truncate_first, size):
+    """ Upload a made up report to a server in this process, returning the
+    server's record of the upload """
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    from multiqc.utils import config, megaqc
+    server = UploadServer(('127.0.0.1', 0), fail_first=fail_first, truncate_first=truncate_first)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    config.megaqc_url = 'http://127.0.0.1:{}/api/upload_data'.format(server.server_address[1])
+    config.megaqc_retries = fail_first + truncate_first
+    config.megaqc_retry_backoff = 0.1
+    samples = ['sample_{}'.format(i) for i in range(size)]
+    exported_data = {
+        'report_data_sources': {'Stand-in': {'all_sections': {s: '/data/{}.txt'.format(s) for s in samples}}},
+        'report_general_stats_data': [{s: {'reads': i, 'percent_gc': i % 100} for i, s in enumerate(samples)}],
+    }
+    megaqc.multiqc_api_post(exported_data)
+    server.shutdown()
+    return server.uploads
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8008)
+    parser.add_argument('--fail-first', type=int, default=0, metavar='N',
+        help='Give a 503 error for the first N attempts of each upload')
+    parser.add_argument('--truncate-first', type=int, default=0, metavar='N',
+        help='Cut off the response for the N attempts after those')
+    parser.add_argument('--self-test', action='store_true',
+        help='Upload a made up report with multiqc_api_post() and exit')
+    parser.add_argument('--samples', type=int, default=1000,
+        help='Number of samples in the --self-test upload')
+    args = parser.parse_args()
+
+    if args.self_test:
+        uploads = self_test(args.fail_first, args.truncate_first, args.samples)
+        print(json.dumps(uploads, indent=4))
+        attempts = args.fail_first + args.truncate_first + 1
+        if len(uploads) != 1 or uploads[0]['attempts'] != attempts:
+            sys.exit("Expected one upload after {} attempts".format(attempts))
+        return
+
+    server = UploadServer((args.host, args.port), fail_first=args.fail_first, truncate_first=args.truncate_first)
+    print("Stand-in MegaQC server at http://{}:{}/ - press Ctrl-C to stop".format(args.host, args.port), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    total = sum(u['bytes'] for u in server.uploads)
+    print("{} upload(s), {:.2f} MB in total".format(len(server.uploads), total / 1048576), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+""" MultiQC report benchmark. Makes a synthetic corpus (see corpus.py) for
+each number of samples and times each step of making a report from it:
+finding files, running each module, building the tables and plots,
+compressing the plot data, writing data files and rendering the report.
+Prints the results as JSON, with throughput in samples and files per second.
+Time spent in the plot functions (table.plot, bargraph.plot etc.) is also
+given for each type of plot, as well as being part of the module times.
+
+By default 10 and 1000 samples are run, which takes a minute or two. --full
+adds 50,000 samples, which needs around 3.5 GB of disk for the corpus and
+takes a good while, so is better kept for checking large-report changes.
+
+If --compare is given with an earlier results file, exits with an error if
+the total time or any step got slower by more than --max-slowdown, so that
+it can be run for every commit to catch regressions. """
+
+from __future__ import print_function, division
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import corpus
+import multiqc
+from multiqc.utils import config
+
+def run_report(corpus_dir, modules, out_dir, interactive=False):
+    """ Make a report, returning the time taken for each step, module and
+    type of plot, from the telemetry of the run """
+    ctx = multiqc.run(corpus_dir, outdir=out_dir, module=modules, plots_interactive=interactive,
+                      force=True, quiet=True, no_version_check=True)
+    if ctx.sys_exit_code != 0:
+        raise RuntimeError('MultiQC exited with code {}'.format(ctx.sys_exit_code))
+    steps = OrderedDict(ctx.telemetry['stages'])
+    steps['compression'] = ctx.telemetry['background'].get('plot_data_compression', 0)
+    steps['total'] = ctx.telemetry['seconds']
+    return steps, OrderedDict(ctx.telemetry['modules']), OrderedDict(ctx.telemetry['plots'])
+
+def run_benchmarks(sample_counts, modules, repeats, work_dir, interactive=False):
+    results = OrderedDict()
+    for num_samples in sample_counts:
+        corpus_dir = os.path.join(work_dir, 'corpus_{}'.format(num_samples))
+        start = time.time()
+        info = corpus.make_corpus(corpus_dir, num_samples, modules)
+        print("Made {} sample corpus in {:.1f}s".format(num_samples, time.time() - start), file=sys.stderr)
+
+        # Keep the fastest time for each step
+        steps = None
+        module_times = None
+        plot_times = None
+        for i in range(repeats):
+            s, m, p = run_report(corpus_dir, modules, os.path.join(work_dir, 'report_{}'.format(num_samples)), interactive)
+            steps = s if steps is None else OrderedDict((k, min(v, s[k])) for k, v in steps.items())
+            module_times = m if module_times is None else OrderedDict((k, min(v, m.get(k, v))) for k, v in module_times.items())
+            plot_times = p if plot_times is None else OrderedDict((k, min(v, p.get(k, v))) for k, v in plot_times.items())
+        print("{} samples: {:.2f}s".format(num_samples, steps['total']), file=sys.stderr)
+        results[str(num_samples)] = OrderedDict([
+            ('samples', num_samples),
+            ('files', info['files']),
+            ('bytes', info['bytes']),
+            ('seconds', steps),
+            ('module_seconds', module_times),
+            ('plot_seconds', plot_times),
+            ('files_per_second', info['files'] / steps['discovery'] if steps['discovery'] > 0 else None),
+            ('samples_per_second', num_samples / steps['total'])
+        ])
+    return results
+
+def compare(results, baseline, max_slowdown):
+    """ Steps that are slower than in the baseline results """
+    slower = list()
+    for scale, r in results.items():
+        if scale not in baseline.get('results', {}):
+            continue
+        b = baseline['results'][scale]
+        times = [ (k, v, b['seconds'].get(k)) for k, v in r['seconds'].items() ]
+        times += [ ('module {}'.format(k), v, b.get('module_seconds', {}).get(k)) for k, v in r['module_seconds'].items() ]
+        times += [ ('{} plots'.format(k), v, b.get('plot_seconds', {}).get(k)) for k, v in r['plot_seconds'].items() ]
+        for name, t, base_t in times:
+            # Ignore tiny times, which vary too much to compare
+            if base_t and max(t, base_t) > 0.1 and t > base_t * max_slowdown:
+                slower.append('{} samples, {}: {:.3f}s (was {:.3f}s)'.format(scale, name, t, base_t))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--samples', default='10,1000', help='Comma-separated numbers of samples, eg. 10,1000,50000')
+    parser.add_argument('--full', action='store_true', help='Run 10, 1000 and 50000 samples, instead of --samples')
+    parser.add_argument('-m', '--modules', default=','.join(corpus.MODULES), help='Comma-separated modules to run')
+    parser.add_argument('-r', '--repeats', type=int, default=3, help='Number of times to make each report')
+    parser.add_argument('-i', '--interactive', action='store_true', help='Always use interactive plots. Otherwise plots with many samples are drawn with MatPlotLib, which is slow.')
+    parser.add_argument('-d', '--work-dir', help='Directory for the corpus and reports. Corpora are reused if they are already there. Default: a temporary directory')
+    parser.add_argument('-o', '--output', help='Write the results to this file as well as printing them')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=1.25, help='Fail if a step is this many times slower than in --compare')
+    args = parser.parse_args()
+
+    if args.full:
+        args.samples = '10,1000,50000'
+    sample_counts = [ int(n) for n in args.samples.split(',') if n ]
+    modules = [ m for m in args.modules.split(',') if m ]
+    work_dir = args.work_dir or tempfile.mkdtemp()
+    try:
+        results = run_benchmarks(sample_counts, modules, args.repeats, work_dir, args.interactive)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = OrderedDict([
+        ('benchmark', 'report'),
+        ('multiqc_version', config.version),
+        ('git_hash', config.git_hash),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('time', time.strftime('%Y-%m-%d %H:%M:%S')),
+        ('repeats', args.repeats),
+        ('modules', modules),
+        ('interactive', args.interactive),
+        ('results', results)
+    ])
+    output_json = json.dumps(output, indent=4)
+    print(output_json)
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output_json + '\n')
+
+    if args.compare:
+        with io.open(args.compare, 'r', encoding='utf-8') as f:
+            slower = compare(results, json.load(f), args.max_slowdown)
+        if len(slower) > 0:
+            print("Slower than {}:\n  {}".format(args.compare, '\n  '.join(slower)), file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
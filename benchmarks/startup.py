@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+""" MultiQC startup time benchmark. Times how long it takes to import
+MultiQC and to run `multiqc --version`, with an empty registry cache
+(first run after installing) and with a warm cache. Prints the results
+as JSON. If --max-seconds is given, exits with an error if the warm
+`multiqc --version` time is slower, so it can be used to catch
+regressions. """
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MULTIQC_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'scripts', 'multiqc')
+
+COMMANDS = {
+    'import': [sys.executable, '-c', 'import multiqc'],
+    'version': [sys.executable, MULTIQC_SCRIPT, '--version']
+}
+
+def time_command(cmd, env):
+    """ Wall clock time to run a command, in seconds """
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(cmd, env=env, stdout=devnull, stderr=devnull)
+    return time.time() - start
+
+def run_benchmarks(repeats):
+    results = dict()
+    cache_dir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env['XDG_CACHE_HOME'] = cache_dir
+    try:
+        for name, cmd in sorted(COMMANDS.items()):
+            cold = list()
+            warm = list()
+            for i in range(repeats):
+                # Empty cache, then the same again with the cache that it made
+                shutil.rmtree(cache_dir)
+                os.makedirs(cache_dir)
+                cold.append(time_command(cmd, env))
+                warm.append(time_command(cmd, env))
+            results[name] = {
+                'cold_min': min(cold),
+                'cold_mean': sum(cold) / len(cold),
+                'warm_min': min(warm),
+                'warm_mean': sum(warm) / len(warm)
+            }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--repeats', type=int, default=5, help='Number of times to run each command')
+    parser.add_argument('--max-seconds', type=float, help='Fail if warm `multiqc --version` takes longer than this')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeats)
+    print(json.dumps({'benchmark': 'startup', 'repeats': args.repeats, 'results': results}, indent=4, sort_keys=True))
+    if args.max_seconds is not None and results['version']['warm_min'] > args.max_seconds:
+        print("Startup regression: `multiqc --version` took {:.2f}s (limit {:.2f}s)".format(
+            results['version']['warm_min'], args.max_seconds), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
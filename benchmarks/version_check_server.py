@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+""" Test the background version check against stand-in servers, without
+needing multiqc.info. Runs two version checks one after the other (as two
+MultiQC runs would) for each case:
+
+ * success - the server replies with a version number
+ * hang    - the server accepts connections but never replies
+ * refused - nothing is listening, so the connection is refused
+
+and checks that neither check holds up the run by more than the grace
+period, and that the result is cached so that the second check doesn't
+connect again. Prints the timings as JSON and exits with an error if any
+case failed. A temporary cache directory is used. """
+
+from __future__ import print_function
+import argparse
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer # Python 2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+REMOTE_VERSION = '99.0'
+
+class VersionHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(REMOTE_VERSION.encode('utf-8'))
+
+    def log_message(self, fmt, *args):
+        pass
+
+def success_server():
+    """ Replies to every request with REMOTE_VERSION """
+    server = HTTPServer(('127.0.0.1', 0), VersionHandler)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server.server_address[1], server.shutdown
+
+def hang_server():
+    """ Listens, so connections are made, but never accepts or replies """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    return sock.getsockname()[1], sock.close
+
+def refused_server():
+    """ A port that nothing is listening on """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port, lambda: None
+
+def run_check(url, timeout):
+    """ One version check, as made by a MultiQC run. Returns the seconds
+    that the run was held up by, and whether a check was started """
+    from multiqc.utils import config, run_context, version_check
+    with run_context.RunContext():
+        config.version_check_url = url
+        config.version_check_timeout = timeout
+        start = time.time()
+        version_check.start()
+        started = version_check._thread is not None
+        version_check.finish()
+        return time.time() - start, started
+
+def run_case(name, make_server, timeout):
+    from multiqc.utils import version_check
+    if os.path.exists(version_check.cache_fn()):
+        os.remove(version_check.cache_fn())
+    port, stop = make_server()
+    url = 'http://127.0.0.1:{}/version.php?v={{}}'.format(port)
+    try:
+        first, first_started = run_check(url, timeout)
+        second, second_started = run_check(url, timeout)
+    finally:
+        stop()
+    with io.open(version_check.cache_fn(), 'r', encoding='utf-8') as f:
+        cached = json.load(f)
+    max_seconds = version_check.grace_seconds + 0.5
+    problems = list()
+    if first > max_seconds or second > max_seconds:
+        problems.append('held up the run for more than {:.1f}s'.format(max_seconds))
+    if not first_started or second_started:
+        problems.append('second check was not skipped')
+    if name == 'success' and cached.get('remote_version') != REMOTE_VERSION:
+        problems.append('version {} not cached'.format(REMOTE_VERSION))
+    if name != 'success' and not cached.get('error'):
+        problems.append('failure not cached')
+    return {
+        'first_seconds': first,
+        'second_seconds': second,
+        'cached_version': cached.get('remote_version'),
+        'cached_error': cached.get('error'),
+        'problems': problems
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=3, help='version_check_timeout to use')
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    os.environ['XDG_CACHE_HOME'] = cache_dir
+    try:
+        results = dict()
+        for name, make_server in [('success', success_server), ('hang', hang_server), ('refused', refused_server)]:
+            results[name] = run_case(name, make_server, args.timeout)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(json.dumps(results, indent=4, sort_keys=True))
+    failed = [ '{}: {}'.format(name, ', '.join(r['problems'])) for name, r in sorted(results.items()) if r['problems'] ]
+    if failed:
+        sys.exit('Failed:\n  ' + '\n  '.join(failed))
+
+if __name__ == '__main__':
+    main()
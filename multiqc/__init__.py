@@ -1,6 +1,19 @@
 import logging
+import sys
 from multiqc.utils import config
 
 config.logger = logging.getLogger(__name__)
 
-__version__ = config.version
+# Only worked out when used, as it can read the git hash (see config.py)
+def __getattr__(name):
+    if name == '__version__':
+        return config.version
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+if sys.version_info < (3, 7):
+    __version__ = config.version
+
+def run(*args, **kwargs):
+    """ Run MultiQC from Python. See multiqc.multiqc.run() """
+    from multiqc.multiqc import run
+    return run(*args, **kwargs)
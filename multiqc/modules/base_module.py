@@ -12,7 +12,7 @@ import os
 import re
 import textwrap
 
-from multiqc.utils import report, config, util_functions
+from multiqc.utils import report, config, log, util_functions
 logger = logging.getLogger(__name__)
 
 class BaseMultiqcModule(object):
@@ -57,12 +57,16 @@ class BaseMultiqcModule(object):
 
         self.sections = list()
 
+        # Plots made by this module, found in add_section() (for split reports)
+        self.plot_ids = set()
+        self._plot_ids_seen = set(report.plot_data.keys())
+
     def find_log_files(self, sp_key, filecontents=True, filehandles=False):
         """
         Return matches log files of interest.
         :param sp_key: Search pattern key specified in config
         :param filehandles: Set to true to return a file handle instead of slurped file contents
-        :return: Yields a dict with filename (fn), root directory (root), cleaned sample name
+        :return: Yields a dict-like report.SearchFile with filename (fn), root directory (root), cleaned sample name
                  generated from the filename (s_name) and either the file contents or file handle
                  for the current matched file (f).
                  As yield is used, the results can be iterated over without loading all files at once
@@ -75,9 +79,9 @@ class BaseMultiqcModule(object):
         # Old, depreciated syntax support. Likely to be removed in a future version.
         if isinstance(sp_key, dict):
             report.files[self.name] = list()
-            for sf in report.searchfiles:
-                if report.search_file(sp_key, {'fn': sf[0], 'root': sf[1]}):
-                    report.files[self.name].append({'fn': sf[0], 'root': sf[1]})
+            for sf in report.get_searchfiles():
+                if report.search_file(sp_key, sf):
+                    report.files[self.name].append(sf)
             sp_key = self.name
             logwarn = "Depreciation Warning: {} - Please use new style for find_log_files()".format(self.name)
             if len(report.files[self.name]) > 0:
@@ -93,7 +97,7 @@ class BaseMultiqcModule(object):
             # If path_filters is given, skip unless match
             if path_filters is not None and len(path_filters) > 0:
                 if not all([ fnmatch.fnmatch(f['fn'], pf) for pf in path_filters ]):
-                    logger.debug("{} - Skipping '{}' as didn't match module path filters".format(sp_key, f['fn']))
+                    log.debug_repeated(logger, "{} - Skipping file as didn't match module path filters".format(sp_key), f['fn'])
                     continue
 
             # Make a note of the filename so that we can report it if something crashes
@@ -156,6 +160,11 @@ class BaseMultiqcModule(object):
         comment = comment.strip()
         helptext = helptext.strip()
 
+        # Plots made since this module started or added its last section
+        new_plot_ids = set(report.plot_data.keys()) - self._plot_ids_seen
+        self.plot_ids.update(new_plot_ids)
+        self._plot_ids_seen.update(new_plot_ids)
+
         self.sections.append({
             'name': name,
             'anchor': anchor,
@@ -300,6 +309,17 @@ class BaseMultiqcModule(object):
         report.saved_raw_data[fn] = data
         util_functions.write_data_file(data, fn, sort_cols, data_format)
 
+    # Attributes used to render the report, kept by release_data()
+    report_attributes = ['name', 'anchor', 'intro', 'comment', 'sections', 'css', 'js']
+
+    def release_data(self):
+        """ Drop everything apart from the report sections and intro, such
+        as the parsed data. Called once the module has run, with the
+        lean_memory config option. """
+        for k in list(vars(self).keys()):
+            if k not in self.report_attributes:
+                delattr(self, k)
+
     ##################################################
     #### DEPRECATED FORWARDERS
     def plot_bargraph (self, data, cats=None, pconfig=None):
@@ -17,6 +17,14 @@ from multiqc.plots import table, bargraph, linegraph, scatter, heatmap, beeswarm
 # Initialise the logger
 log = logging.getLogger(__name__)
 
+# Parsing as OrderedDict is slightly messier with YAML
+# http://stackoverflow.com/a/21048064/713980
+class OrderedLoader(config.yaml_loader):
+    pass
+def dict_constructor(loader, node):
+    return OrderedDict(loader.construct_pairs(node))
+OrderedLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, dict_constructor)
+
 def custom_module_classes():
     """
     MultiQC Custom Content class. This module does a lot of different
@@ -75,12 +83,7 @@ def custom_module_classes():
                 parsed_data = None
                 if f_extension == '.yaml' or f_extension == '.yml':
                     try:
-                        # Parsing as OrderedDict is slightly messier with YAML
-                        # http://stackoverflow.com/a/21048064/713980
-                        def dict_constructor(loader, node):
-                            return OrderedDict(loader.construct_pairs(node))
-                        yaml.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, dict_constructor)
-                        parsed_data = yaml.load(f['f'])
+                        parsed_data = yaml.load(f['f'], Loader=OrderedLoader)
                     except Exception as e:
                         log.warning("Error parsing YAML file '{}' (probably invalid YAML)".format(f['fn']))
                         log.warning("YAML error: {}".format(e))
@@ -293,7 +296,7 @@ def _find_file_header(f):
             hlines.append(l[1:])
     hconfig = None
     try:
-        hconfig = yaml.load("\n".join(hlines))
+        hconfig = yaml.load("\n".join(hlines), Loader=OrderedLoader)
         assert(isinstance(hconfig, dict))
     except yaml.YAMLError as e:
         log.warn("Could not parse comment file header for MultiQC custom content: {}".format(f['fn']))
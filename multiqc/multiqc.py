@@ -0,0 +1,903 @@
+#!/usr/bin/env python
+
+""" MultiQC: A modular tool to aggregate results from bioinformatics analyses across many samples into a single report
+
+Runs MultiQC, either from the command line (run_cli) or from Python (run).
+"""
+
+from __future__ import absolute_import, print_function
+
+import click
+import errno
+import io
+import jinja2
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from multiqc.plots import table
+from multiqc.utils import report, plugin_hooks, megaqc, util_functions, config, log, template_cache, data_writer, registry, run_context, spill, version_check
+logger = config.logger
+
+
+@click.command(
+    context_settings = dict( help_option_names = ['-h', '--help'] )
+)
+@click.argument('analysis_dir',
+                    type = click.Path(exists=True),
+                    nargs = -1,
+                    required = True,
+                    metavar = "<analysis directory>"
+)
+@click.option('-f', '--force',
+                    is_flag = True,
+                    help = "Overwrite any existing reports"
+)
+@click.option('-d', '--dirs',
+                    is_flag = True,
+                    help = "Prepend directory to sample names"
+)
+@click.option('-dd', '--dirs-depth', 'dirs_depth',
+                    type = int,
+                    help = "Prepend [INT] directories to sample names. Negative number to take from start of path."
+)
+@click.option('-s', '--fullnames', 'no_clean_sname',
+                    is_flag = True,
+                    help = "Do not clean the sample names (leave as full file name)"
+)
+@click.option('-i', '--title',
+                    type = str,
+                    help = "Report title. Printed as page header, used for filename if not otherwise specified."
+)
+@click.option('-b', '--comment', 'report_comment',
+                    type = str,
+                    help = "Custom comment, will be printed at the top of the report."
+)
+@click.option('-n', '--filename',
+                    type = str,
+                    help = "Report filename. Use 'stdout' to print to standard out."
+)
+@click.option('-o', '--outdir',
+                    type = str,
+                    help = "Create report in the specified output directory."
+)
+@click.option('-t', '--template',
+                    type = click.Choice(config.avail_templates),
+                    help = "Report template to use."
+)
+@click.option( '--tag', 'module_tag',
+                    type = str,
+                    multiple = True,
+                    help = "Use only modules which tagged with this keyword, eg. RNA"
+)
+@click.option( '--view_tags',
+                    is_flag = True,
+                    help = "View the available tags and which modules they load"
+)
+@click.option('-x', '--ignore',
+                    type = str,
+                    multiple = True,
+                    help = "Ignore analysis files (glob expression)"
+)
+@click.option('--ignore-samples', 'ignore_samples',
+                    type = str,
+                    multiple = True,
+                    help = "Ignore sample names (glob expression)"
+)
+@click.option('--sample-names', 'sample_names',
+                    type = click.Path(exists=True, readable=True),
+                    help = "File containing alternative sample names"
+)
+@click.option('-l', '--file-list',
+                    is_flag = True,
+                    help = "Supply a file containing a list of file paths to be searched, one per row"
+)
+@click.option('-e', '--exclude', metavar='[module name]',
+                    type = click.Choice(['general_stats']+list(config.avail_modules.keys())),
+                    multiple = True,
+                    help = "Do not use this module. Can specify multiple times."
+)
+@click.option('-m', '--module', metavar='[module name]',
+                    type = click.Choice(config.avail_modules),
+                    multiple = True,
+                    help = "Use only this module. Can specify multiple times."
+)
+@click.option('--data-dir', 'make_data_dir',
+                    is_flag = True,
+                    help = "Force the parsed data directory to be created."
+)
+@click.option('--no-data-dir', 'no_data_dir',
+                    is_flag = True,
+                    help = "Prevent the parsed data directory from being created."
+)
+@click.option('-k', '--data-format', 'data_format',
+                    type = click.Choice(config.data_format_extensions.keys()),
+                    help = "Output parsed data in a different format. Default: {}".format(config.data_format)
+)
+@click.option('-z', '--zip-data-dir', 'zip_data_dir',
+                    is_flag = True,
+                    help = "Compress the data directory."
+)
+@click.option('-p', '--export', 'export_plots',
+                    is_flag = True,
+                    help = "Export plots as static images in addition to the report"
+)
+@click.option('-fp', '--flat', 'plots_flat',
+                    is_flag = True,
+                    help = "Use only flat plots (static images)"
+)
+@click.option('-ip', '--interactive', 'plots_interactive',
+                    is_flag = True,
+                    help = "Use only interactive plots (HighCharts Javascript)"
+)
+@click.option('--lint', 'lint',
+                    is_flag = True,
+                    help = "Use strict linting (validation) to help code development"
+)
+@click.option('--split-report', 'split_report',
+                    is_flag = True,
+                    help = "Write each module to a separate page, with an index page for General Stats"
+)
+@click.option('--pdf', 'make_pdf',
+                    is_flag = True,
+                    help = "Creates PDF report with 'simple' template. Requires Pandoc to be installed."
+)
+@click.option('-c', '--config', 'config_file',
+                    type = click.Path(exists=True, readable=True),
+                    multiple=True,
+                    help = "Specific config file to load, after those in MultiQC dir / home dir / working dir."
+)
+@click.option('--cl_config',
+                    type = str,
+                    multiple = True,
+                    help = "Specify MultiQC config YAML on the command line"
+)
+@click.option('-v', '--verbose',
+                    count = True,
+                    default = 0,
+                    help = "Increase output verbosity."
+)
+@click.option('-q', '--quiet',
+                    is_flag = True,
+                    help = "Only show log warnings"
+)
+@util_functions.version_option
+
+def run_cli(analysis_dir, dirs, dirs_depth, no_clean_sname, title, report_comment, template, module_tag, view_tags, module, exclude, outdir,
+ignore, ignore_samples, sample_names, file_list, filename, make_data_dir, no_data_dir, data_format, zip_data_dir, force, export_plots,
+plots_flat, plots_interactive, lint, split_report, make_pdf, config_file, cl_config, verbose, quiet, **kwargs):
+    """MultiQC aggregates results from bioinformatics analyses across many samples into a single report.
+
+        It searches a given directory for analysis logs and compiles a HTML report.
+        It's a general use tool, perfect for summarising the output from numerous
+        bioinformatics tools.
+
+        To run, supply with one or more directory to scan for analysis results.
+        To run here, use 'multiqc .'
+
+        See http://multiqc.info for more details.
+
+        Author: Phil Ewels (http://phil.ewels.co.uk)
+    """
+    try:
+        ctx = run(
+            analysis_dir=analysis_dir,
+            dirs=dirs,
+            dirs_depth=dirs_depth,
+            no_clean_sname=no_clean_sname,
+            title=title,
+            report_comment=report_comment,
+            template=template,
+            module_tag=module_tag,
+            view_tags=view_tags,
+            module=module,
+            exclude=exclude,
+            outdir=outdir,
+            ignore=ignore,
+            ignore_samples=ignore_samples,
+            sample_names=sample_names,
+            file_list=file_list,
+            filename=filename,
+            make_data_dir=make_data_dir,
+            no_data_dir=no_data_dir,
+            data_format=data_format,
+            zip_data_dir=zip_data_dir,
+            force=force,
+            export_plots=export_plots,
+            plots_flat=plots_flat,
+            plots_interactive=plots_interactive,
+            lint=lint,
+            split_report=split_report,
+            make_pdf=make_pdf,
+            config_file=config_file,
+            cl_config=cl_config,
+            verbose=verbose,
+            quiet=quiet,
+            plugin_options=kwargs
+        )
+    except KeyboardInterrupt:
+        sys.exit(1)
+    sys.exit(ctx.sys_exit_code)
+
+
+def run(analysis_dir, dirs=False, dirs_depth=None, no_clean_sname=False, title=None, report_comment=None, template=None, module_tag=(), view_tags=False, module=(), exclude=(), outdir=None,
+        ignore=(), ignore_samples=(), sample_names=None, file_list=False, filename=None, make_data_dir=False, no_data_dir=False, data_format=None, zip_data_dir=False, force=False, export_plots=False,
+        plots_flat=False, plots_interactive=False, lint=False, split_report=False, make_pdf=False, config_file=(), cl_config=(), verbose=0, quiet=False, plugin_options=None, **kwargs):
+    """ Run MultiQC from Python. Takes the same arguments as the command line,
+    using the long option names. Any other keyword arguments are set as config
+    variables, as with --cl_config. Each run starts from the default config,
+    so runs in the same process don't affect each other.
+
+    Concurrent runs in the same process are not supported. The run state is
+    still kept in the config and report module variables, which every module
+    uses directly, so a process-wide lock makes a call from another thread
+    block until the current run has finished. To make several reports at
+    once, use separate processes, such as the `multiqc serve` worker pool.
+    :param analysis_dir: Directory to search, or a list of directories
+    :param plugin_options: Dict of command line options added by plugins
+    :return: RunContext, with the final config and report as ctx.config and
+             ctx.report and the exit code as ctx.sys_exit_code
+    """
+    if isinstance(analysis_dir, str) or not hasattr(analysis_dir, '__iter__'):
+        analysis_dir = [analysis_dir]
+    with run_context.RunContext() as ctx:
+        ctx.sys_exit_code = _run(ctx, list(analysis_dir), dirs, dirs_depth, no_clean_sname, title, report_comment, template, module_tag, view_tags, module, exclude,
+            outdir, ignore, ignore_samples, sample_names, file_list, filename, make_data_dir, no_data_dir, data_format, zip_data_dir, force,
+            export_plots, plots_flat, plots_interactive, lint, split_report, make_pdf, config_file, cl_config, verbose, quiet, plugin_options, kwargs)
+    return ctx
+
+
+def _run(ctx, analysis_dir, dirs, dirs_depth, no_clean_sname, title, report_comment, template, module_tag, view_tags, module, exclude,
+        outdir, ignore, ignore_samples, sample_names, file_list, filename, make_data_dir, no_data_dir, data_format, zip_data_dir, force,
+        export_plots, plots_flat, plots_interactive, lint, split_report, make_pdf, config_file, cl_config, verbose, quiet, plugin_options, config_kwargs):
+    """ Run MultiQC within a RunContext. Returns the exit code. """
+
+    # Set up logging level
+    loglevel = log.LEVELS.get(min(verbose,1), "INFO")
+    if quiet:
+        loglevel = 'WARNING'
+    log.init_log(logger, loglevel=loglevel)
+
+    # Load config files
+    plugin_hooks.mqc_trigger('before_config')
+    config.mqc_load_userconfig(config_file)
+    plugin_hooks.mqc_trigger('config_loaded')
+
+    # Command-line config YAML
+    if len(cl_config) > 0:
+        config.mqc_cl_config(cl_config)
+
+    # Config passed as keyword arguments to multiqc.run()
+    if len(config_kwargs) > 0:
+        config.mqc_add_config(config_kwargs)
+
+    # Log the command used to launch MultiQC
+    report.multiqc_command = " ".join(sys.argv)
+    logger.debug("Command used: {}".format(report.multiqc_command))
+
+    # Check that we're running the latest version of MultiQC
+    # Runs in the background, the result is shown at the end
+    version_check.start()
+
+    # View available tags and modules and exit
+    if view_tags:
+        avail_tags = dict()
+        print("\nMultiQC Available module tag groups:\n")
+        for mod_dict in config.module_order:
+            if type(mod_dict) is dict:
+                mod_key = list(mod_dict.keys())[0]
+                mod = mod_dict[mod_key]
+                if 'module_tag' in mod:
+                    tags = mod['module_tag'] if type(mod['module_tag']) is list else list(mod['module_tag'])
+                    for t in tags:
+                        if t not in avail_tags:
+                            avail_tags[t] = []
+                        avail_tags[t].append(mod_key)
+        for t in sorted(avail_tags.keys(), key=lambda s: s.lower()):
+            print (" - {}:".format(t))
+            for ttgs in avail_tags[t]:
+                print ("   - {}".format(ttgs))
+        return 0
+
+    # Set up key variables (overwrite config vars from command line)
+    if template is not None:
+        config.template = template
+    if title is not None:
+        config.title = title
+    if report_comment is not None:
+        config.report_comment = report_comment
+    config.prepend_dirs = dirs
+    if dirs_depth is not None:
+        config.prepend_dirs = True
+        config.prepend_dirs_depth = dirs_depth
+    config.analysis_dir = analysis_dir
+    if outdir is not None:
+        config.output_dir = outdir
+    if no_clean_sname:
+        config.fn_clean_sample_names = False
+        logger.info("Not cleaning sample names")
+    if make_data_dir:
+        config.make_data_dir = True
+    if no_data_dir:
+        config.make_data_dir = False
+    if force:
+        config.force = True
+    if zip_data_dir:
+        config.zip_data_dir = True
+    if data_format is not None:
+        config.data_format = data_format
+    if export_plots:
+        config.export_plots = True
+    if plots_flat:
+        config.plots_force_flat = True
+    if plots_interactive:
+        config.plots_force_interactive = True
+    if lint:
+        config.lint = True
+    if split_report:
+        config.split_report = True
+    if make_pdf:
+        config.template = 'simple'
+    if sample_names:
+        config.load_sample_names(sample_names)
+    if module_tag is not None:
+        config.module_tag = module_tag
+    config.kwargs = dict(plugin_options or {}) # Plugin command line options
+
+    plugin_hooks.mqc_trigger('execution_start')
+
+    logger.info("This is MultiQC v{}".format(config.version))
+    logger.debug("Command     : {}".format(' '.join(sys.argv)))
+    logger.debug("Working dir : {}".format(os.getcwd()))
+    if make_pdf:
+        logger.info('--pdf specified. Using non-interactive HTML template.')
+    logger.info("Template    : {}".format(config.template))
+    if lint:
+        logger.info('--lint specified. Being strict with validation.')
+
+    # Add files if --file-list option is given
+    if file_list:
+        if len(analysis_dir) > 1:
+            raise ValueError("If --file-list is giving, analysis_dir should have only one plain text file.")
+        config.analysis_dir = []
+        with (open(analysis_dir[0])) as in_handle:
+            for line in in_handle:
+                if os.path.exists(line.strip()):
+                    path = os.path.abspath(line.strip())
+                    report.listed_files.append(path)
+        if len(report.listed_files) == 0:
+            logger.error("No files were added from {} using --file-list option.".format(analysis_dir[0]))
+            logger.error("Please, check that {} contains correct file paths.".format(analysis_dir[0]))
+            raise ValueError("Any files to be searched.")
+
+    if len(ignore) > 0:
+        logger.debug("Ignoring files, directories and paths that match: {}".format(", ".join(ignore)))
+        config.fn_ignore_files.extend(ignore)
+        config.fn_ignore_dirs.extend(ignore)
+        config.fn_ignore_paths.extend(ignore)
+    if len(ignore_samples) > 0:
+        logger.debug("Ignoring sample names that match: {}".format(", ".join(ignore_samples)))
+        config.sample_names_ignore.extend(ignore_samples)
+    if filename == 'stdout':
+        config.output_fn = sys.stdout
+        logger.info("Printing report to stdout")
+    else:
+        if title is not None and filename is None:
+            filename = re.sub('[^\w\.-]', '', re.sub('[-\s]+', '-', title) ).strip()
+            filename += '_multiqc_report'
+        if filename is not None:
+            if filename.endswith('.html'):
+                filename = filename[:-5]
+            config.output_fn_name = filename
+            config.data_dir_name = '{}_data'.format(filename)
+        if not config.output_fn_name.endswith('.html'):
+            config.output_fn_name = '{}.html'.format(config.output_fn_name)
+
+    # Print some status updates
+    if config.title is not None:
+        logger.info("Report title: {}".format(config.title))
+    if dirs:
+        logger.info("Prepending directory to sample names")
+    for d in config.analysis_dir:
+        logger.info("Searching '{}'".format(d))
+
+    # Prep module configs
+    config.top_modules = [ m if type(m) is dict else {m:{}} for m in config.top_modules ]
+    config.module_order = [ m if type(m) is dict else {m:{}} for m in config.module_order ]
+    mod_keys = [ list(m.keys())[0] for m in config.module_order ]
+
+    #Get the avaiable tags to decide which modules to run.
+    modules_from_tags = set()
+    if config.module_tag is not None:
+        tags = config.module_tag
+        for m in config.module_order:
+            module_name = list(m.keys())[0] # only one name in each dict
+            for tag in tags:
+                for t in m[module_name].get('module_tag', []):
+                    if tag.lower() == t.lower():
+                        modules_from_tags.add(module_name)
+
+    # Get the list of modules we want to run, in the order that we want them
+    run_modules = [ m for m in config.top_modules if list(m.keys())[0] in config.avail_modules.keys() ]
+    run_modules.extend( [ {m:{}} for m in config.avail_modules.keys() if m not in mod_keys and m not in run_modules ] )
+    run_modules.extend( [ m for m in config.module_order if list(m.keys())[0] in config.avail_modules.keys() and list(m.keys())[0] not in [list(rm.keys())[0] for rm in run_modules] ] )
+
+    if module:
+        run_modules = [ m for m in run_modules if list(m.keys())[0] in module ]
+        logger.info('Only using modules {}'.format(', '.join(module)))
+    elif modules_from_tags:
+        run_modules = [ m for m in run_modules if list(m.keys())[0] in modules_from_tags ]
+        logger.info("Only using modules with '{}' tag".format(', '.join(module_tag)))
+    elif exclude:
+        logger.info("Excluding modules '{}'".format("', '".join(exclude)))
+        if 'general_stats' in exclude:
+            config.skip_generalstats = True
+            exclude = tuple(x for x in exclude if x != 'general_stats')
+        run_modules = [m for m in run_modules if list(m.keys())[0] not in exclude]
+    if len(run_modules) == 0:
+        logger.critical('No analysis modules specified!')
+        return 1
+    run_module_names = [ list(m.keys())[0] for m in run_modules ]
+    logger.debug("Analysing modules: {}".format(', '.join(run_module_names)))
+
+    # Create the temporary working directories
+    tmp_dir = tempfile.mkdtemp()
+    ctx.tmp_dir = tmp_dir
+    logger.debug('Using temporary directory for creating report: {}'.format(tmp_dir))
+    config.data_tmp_dir = os.path.join(tmp_dir, 'multiqc_data')
+    if filename != 'stdout' and config.make_data_dir == True:
+        config.data_dir = config.data_tmp_dir
+        os.makedirs(config.data_dir)
+        # Data files are written straight into the archive if zipping
+        if config.zip_data_dir:
+            data_writer.start_archive(config.data_dir, config.zip_data_dir_format, config.zip_data_dir_level)
+    else:
+        config.data_dir = None
+    config.plots_tmp_dir = os.path.join(tmp_dir, 'multiqc_plots')
+    if filename != 'stdout' and config.export_plots == True:
+        config.plots_dir = config.plots_tmp_dir
+        os.makedirs(config.plots_dir)
+    # Plot data and raw data can be moved to disk as each module finishes
+    if config.lean_memory:
+        logger.debug("Lean memory mode: module data will be released after each module")
+        report.plot_data = spill.SpillDict(os.path.join(tmp_dir, 'multiqc_spill', 'plot_data'))
+        report.saved_raw_data = spill.SpillDict(os.path.join(tmp_dir, 'multiqc_spill', 'raw_data'))
+
+    # Load the template
+    template_mod = run_context.load_template(config.template)
+
+    # Add an output subdirectory if specified by template
+    try:
+        config.output_dir = os.path.join(config.output_dir, template_mod.output_subdir)
+    except AttributeError:
+        pass # No subdirectory variable given
+
+
+    # Add custom content section names
+    try:
+        if 'custom_content' in run_module_names:
+            run_module_names.extend(config.custom_data.keys())
+    except AttributeError:
+        pass # custom_data not in config
+
+    # Get the list of files to search
+    ctx.start_stage('discovery')
+    plugin_hooks.mqc_trigger('before_discovery', modules=run_module_names)
+    ctx.count('files_searched', report.get_filelist(run_module_names))
+    ctx.count('files_matched', sum([len(f) for f in report.files.values()]))
+    plugin_hooks.mqc_trigger('after_discovery')
+
+    # Run the modules!
+    ctx.start_stage('modules')
+    plugin_hooks.mqc_trigger('before_modules')
+    report.modules_output = list()
+    sys_exit_code = 0
+    for mod_dict in run_modules:
+        module_start = time.time()
+        output = None
+        try:
+            this_module = list(mod_dict.keys())[0]
+            mod_cust_config = list(mod_dict.values())[0]
+            plot_ids_before = set(report.plot_data.keys())
+            # Plugins can give the module output themselves, eg. from a cache
+            output = plugin_hooks.mqc_trigger('before_module', module=this_module, mod_cust_config=mod_cust_config)
+            if output is None:
+                mod = config.avail_modules[this_module].load()
+                mod.mod_cust_config = mod_cust_config # feels bad doing this, but seems to work
+                output = mod()
+            if type(output) != list:
+                output = [output]
+            # Remember which plots belong to each module, for split reports. Some
+            # modules (eg. custom_content) return several, each with its own plots
+            new_plot_ids = set(report.plot_data.keys()) - plot_ids_before
+            for m in output:
+                report.modules_output.append(m)
+                if len(output) == 1 or getattr(m, 'plot_ids', None) is None:
+                    report.module_plot_ids[m.anchor] = new_plot_ids
+                else:
+                    report.module_plot_ids[m.anchor] = m.plot_ids & new_plot_ids
+
+            # Copy over css & js files if requested by the theme
+            try:
+                for to, path in report.modules_output[-1].css.items():
+                    copy_to = os.path.join(tmp_dir, to)
+                    os.makedirs(os.path.dirname(copy_to))
+                    shutil.copyfile(path, copy_to)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    pass
+                else:
+                    raise
+            except AttributeError:
+                pass
+            try:
+                for to, path in report.modules_output[-1].js.items():
+                    copy_to = os.path.join(tmp_dir, to)
+                    os.makedirs(os.path.dirname(copy_to))
+                    shutil.copyfile(path, copy_to)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    pass
+                else:
+                    raise
+            except AttributeError:
+                pass
+
+        except UserWarning:
+            logger.debug("No samples found: {}".format(list(mod_dict.keys())[0]))
+        except KeyboardInterrupt:
+            shutil.rmtree(tmp_dir)
+            logger.critical(
+                    "User Cancelled Execution!\n{eq}\n{tb}{eq}\n"
+                    .format(eq=('='*60), tb=traceback.format_exc())+
+                    "User Cancelled Execution!\nExiting MultiQC...")
+            raise
+        except:
+            # Flag the error, but carry on
+            logger.error("Oops! The '{}' MultiQC module broke... \n".format(this_module) + \
+                      "  Please copy the following traceback and report it at " + \
+                      "https://github.com/ewels/MultiQC/issues \n" + \
+                      "  If possible, please include a log file that triggers the error - " + \
+                      "the last file found was:\n" + \
+                      "    {}\n".format(report.last_found_file) + \
+                      ('='*60)+"\nModule {} raised an exception: {}".format(
+                          this_module, traceback.format_exc()) + ('='*60))
+            sys_exit_code = 1
+        # Called even if the module found nothing or broke, so caught separately
+        try:
+            plugin_hooks.mqc_trigger('after_module', module=this_module, output=output)
+        except KeyboardInterrupt:
+            raise
+        except:
+            # Flag the error, but carry on
+            logger.error("Oops! A plugin 'after_module' hook broke for the '{}' module... \n".format(this_module) + \
+                      ('='*60)+"\nThe hook raised an exception: {}".format(traceback.format_exc()) + ('='*60))
+            sys_exit_code = 1
+        # Keep only what is needed for the report, and move the plot data to disk
+        if config.lean_memory:
+            for m in output or []:
+                if hasattr(m, 'release_data'):
+                    m.release_data()
+            report.plot_data.spill()
+            report.saved_raw_data.spill()
+        ctx.add_time('modules', this_module, time.time() - module_start)
+        ctx.count('modules_run')
+    log.log_repeated_summary()
+
+    # Did we find anything?
+    if len(report.modules_output) == 0:
+        logger.warn("No analysis results found. Cleaning up..")
+        report.load_spilled_data()
+        shutil.rmtree(tmp_dir)
+        version_check.finish()
+        ctx.log_telemetry(logger)
+        logger.info("MultiQC complete")
+        # Exit with an error code if a module broke
+        return sys_exit_code
+
+    # Sort the report sections if we have a config
+    if len(getattr(config, 'report_section_order', {})) > 0:
+        section_id_order = {}
+        idx = 10
+        for mod in reversed(report.modules_output):
+            section_id_order[mod.anchor] = idx
+            idx += 10
+        for anchor, ss in config.report_section_order.items():
+            if anchor not in section_id_order.keys():
+                continue
+            if ss.get('order') is not None:
+                section_id_order[anchor] = ss['order']
+            if ss.get('after') in section_id_order.keys():
+                section_id_order[anchor] = section_id_order[ss['after']] + 1
+            if ss.get('before') in section_id_order.keys():
+                section_id_order[anchor] = section_id_order[ss['before']] - 1
+        sorted_ids = sorted(section_id_order, key=section_id_order.get)
+        report.modules_output = [ mod for i in reversed(sorted_ids) for mod in report.modules_output if mod.anchor == i ]
+
+    ctx.start_stage('tables')
+    ctx.count('modules_with_results', len(report.modules_output))
+    plugin_hooks.mqc_trigger('after_modules')
+
+    # Remove empty data sections from the General Stats table
+    empty_keys = [i for i, d in enumerate(report.general_stats_data[:]) if len(d) == 0]
+    empty_keys.sort(reverse=True)
+    for i in empty_keys:
+        del report.general_stats_data[i]
+        del report.general_stats_headers[i]
+    # Add general-stats IDs to table row headers
+    for idx, h in enumerate(report.general_stats_headers):
+        for k in h.keys():
+            if 'rid' not in h[k]:
+                h[k]['rid'] = re.sub(r'\W+', '_', k).strip().strip('_')
+            report.general_stats_headers[idx][k]['rid'] = 'mqc-generalstats-{}'.format(h[k]['rid'])
+    # Generate the General Statistics HTML & write to file
+    if len(report.general_stats_data) > 0:
+        pconfig = {
+            'id': 'general_stats_table',
+            'table_title': 'General Statistics',
+            'save_file': True,
+            'raw_data_fn':'multiqc_general_stats'
+        }
+        report.general_stats_html = table.plot(report.general_stats_data, report.general_stats_headers, pconfig)
+    else:
+        config.skip_generalstats = True
+
+    # Write the report sources to disk
+    if config.data_dir is not None:
+        report.data_sources_tofile()
+    ctx.count('samples', len(set([s_name for d in report.general_stats_data for s_name in d])))
+    ctx.count('plots', len(report.plot_data))
+    ctx.start_stage('data_files')
+    plugin_hooks.mqc_trigger('before_report_generation')
+
+    # Compress the report plot data, one chunk per plot. Runs in the background
+    # whilst the output directories and template are prepared.
+    logger.info("Compressing plot data")
+    finish_plot_data = report.compress_plot_data()
+
+    # Data Export / MegaQC integration - save report data to file or send report data to an API endpoint
+    # The JSON is encoded once, and streamed to the file and the upload
+    if config.data_dump_file or config.megaqc_url:
+        multiqc_json_dump = megaqc.multiqc_dump_json(report)
+        data_dump_fn = None
+        if config.data_dump_file and config.data_dir is not None:
+            data_dump_fn = 'multiqc_data.json'
+        request_body = megaqc.write_json_dump(multiqc_json_dump, data_dump_fn, upload=bool(config.megaqc_url))
+        if config.megaqc_url:
+            megaqc.multiqc_api_post(multiqc_json_dump, request_body)
+
+    # Make the final report path & data directories
+    if filename != 'stdout':
+        config.output_fn = os.path.join(config.output_dir, config.output_fn_name)
+        config.data_dir = os.path.join(config.output_dir, config.data_dir_name)
+        # Check for existing reports and remove if -f was specified
+        if os.path.exists(config.output_fn) or (config.make_data_dir and os.path.exists(config.data_dir)):
+            if config.force:
+                if os.path.exists(config.output_fn):
+                    logger.warning("Deleting    : {}   (-f was specified)".format(os.path.relpath(config.output_fn)))
+                    os.remove(config.output_fn)
+                if config.make_data_dir and os.path.exists(config.data_dir):
+                    logger.warning("Deleting    : {}   (-f was specified)".format(os.path.relpath(config.data_dir)))
+                    shutil.rmtree(config.data_dir)
+            else:
+                # Set up the base names of the report and the data dir
+                report_num = 1
+                report_base, report_ext = os.path.splitext(config.output_fn_name)
+                dir_base = os.path.basename(config.data_dir)
+
+                # Iterate through appended numbers until we find one that's free
+                while os.path.exists(config.output_fn) or (config.make_data_dir and os.path.exists(config.data_dir)):
+                    config.output_fn = os.path.join(config.output_dir, "{}_{}{}".format(report_base, report_num, report_ext) )
+                    config.data_dir = os.path.join(config.output_dir, "{}_{}".format(dir_base, report_num) )
+                    report_num += 1
+
+                config.output_fn_name = os.path.basename(config.output_fn)
+                config.data_dir_name = os.path.basename(config.data_dir)
+                logger.warning("Previous MultiQC output found! Adjusting filenames..")
+                logger.warning("Use -f or --force to overwrite existing reports instead")
+
+        # Make directories for report if needed
+        if not os.path.exists(os.path.dirname(config.output_fn)):
+            os.makedirs(os.path.dirname(config.output_fn))
+        logger.info("Report      : {}".format(os.path.relpath(config.output_fn)))
+
+        if config.make_data_dir == False:
+            logger.info("Data        : None")
+        elif config.zip_data_dir:
+            # Modules have run, so the archive should be complete by now. Move it.
+            data_archive_fn = data_writer.finish_archive(config.data_dir)
+            logger.info("Data        : {}".format(os.path.relpath(data_archive_fn)))
+        else:
+            # Make directories for data_dir
+            logger.info("Data        : {}".format(os.path.relpath(config.data_dir)))
+            os.makedirs(config.data_dir)
+            # Modules have run, so data directory should be complete by now. Move its contents.
+            for f in os.listdir(config.data_tmp_dir):
+                fn = os.path.join(config.data_tmp_dir, f)
+                logger.debug("Moving data file from '{}' to '{}'".format(fn, config.data_dir))
+                shutil.move(fn, config.data_dir)
+
+        # Copy across the static plot images if requested
+        if config.export_plots:
+            config.plots_dir = os.path.join(config.output_dir, config.plots_dir_name)
+            if os.path.exists(config.plots_dir):
+                if config.force:
+                    logger.warning("Deleting    : {}   (-f was specified)".format(os.path.relpath(config.plots_dir)))
+                    shutil.rmtree(config.plots_dir)
+                else:
+                    logger.error("Output directory {} already exists.".format(config.plots_dir))
+                    logger.info("Use -f or --force to overwrite existing reports")
+                    report.load_spilled_data()
+                    shutil.rmtree(tmp_dir)
+                    return 1
+            os.makedirs(config.plots_dir)
+            logger.info("Plots       : {}".format(os.path.relpath(config.plots_dir)))
+
+            # Modules have run, so plots directory should be complete by now. Move its contents.
+            for f in os.listdir(config.plots_tmp_dir):
+                fn = os.path.join(config.plots_tmp_dir, f)
+                logger.debug("Moving plots directory from '{}' to '{}'".format(fn, config.plots_dir))
+                shutil.move(fn, config.plots_dir)
+
+    ctx.start_stage('rendering')
+    plugin_hooks.mqc_trigger('before_template')
+
+    # Templates are used from where they are installed. Files in a child
+    # theme are used in preference to those in its parent theme.
+    template_dirs = [template_mod.template_dir]
+    try:
+        parent_template = run_context.load_template(template_mod.template_parent)
+        template_dirs.append(parent_template.template_dir)
+    except AttributeError:
+        pass # Not a child theme
+
+    # Load the report template
+    try:
+        env = jinja2.Environment(
+            loader = jinja2.FileSystemLoader(template_dirs),
+            bytecode_cache = template_cache.bytecode_cache()
+        )
+        env.globals['include_file'] = template_cache.include_file_function(template_dirs)
+        j_template = env.get_template(template_mod.base_fn)
+    except:
+        raise IOError ("Could not load {} template file '{}'".format(config.template, template_mod.base_fn))
+
+    # Wait for the plot data to finish compressing
+    ctx.add_time('background', 'plot_data_compression', finish_plot_data())
+
+    # Use jinja2 to render the template and overwrite. The report is written
+    # as it is rendered, so the whole HTML is never held in memory at once.
+    def write_report(report_output, output_fn):
+        try:
+            with io.open (output_fn, "w", encoding='utf-8', buffering=1024*1024) as f:
+                for chunk in report_output:
+                    f.write(chunk)
+                f.write(u'\n')
+        except IOError as e:
+            raise IOError ("Could not print report to '{}' - {}".format(output_fn, IOError(e)))
+
+    config.analysis_dir = [os.path.realpath(d) for d in config.analysis_dir]
+    if filename == 'stdout':
+        if config.split_report:
+            logger.warning("Can't write a split report to stdout, writing a single page")
+        stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        for chunk in j_template.generate(report=report, config=config, page=None):
+            stdout.write(chunk.encode('utf-8'))
+        stdout.write(b'\n')
+        stdout.flush()
+    else:
+        pages = [ (config.output_fn, None) ]
+        if config.split_report:
+            # Write the shared CSS and JavaScript once, for all pages to use
+            bundle_name = '{}_assets'.format(os.path.splitext(config.output_fn_name)[0])
+            for ext in ['css', 'js']:
+                try:
+                    bundle_template = env.get_template('bundle.{}'.format(ext))
+                except jinja2.TemplateNotFound:
+                    continue
+                bundle_fn = os.path.join(os.path.dirname(config.output_fn), '{}.{}'.format(bundle_name, ext))
+                write_report(bundle_template.generate(report=report, config=config), bundle_fn)
+            pages = report.split_report_pages(bundle_name)
+            logger.info("Split report: {} pages".format(len(pages)))
+        for page_fn, page in pages:
+            write_report(j_template.generate(report=report, config=config, page=page), page_fn)
+
+        # Copy over files if requested by the theme - parent theme first,
+        # then the theme itself and then any files added by modules
+        try:
+            for f in template_mod.copy_files:
+                from distutils.dir_util import copy_tree # slow to import, so only when needed
+                dest_dir = os.path.join( os.path.dirname(config.output_fn), f)
+                for fdir in list(reversed(template_dirs)) + [tmp_dir]:
+                    fn = os.path.join(fdir, f)
+                    if os.path.exists(fn):
+                        copy_tree(fn, dest_dir)
+        except AttributeError:
+            pass # No files to copy
+
+    # Save any newly read template files to the cache
+    template_cache.save_assets()
+
+    # Clean up temporary directory
+    report.load_spilled_data()
+    shutil.rmtree(tmp_dir)
+
+    # Try to create a PDF if requested
+    if make_pdf:
+        try:
+            pdf_fn_name = config.output_fn.replace('.html', '.pdf')
+            pandoc_call = [
+                'pandoc',
+                '--standalone',
+                config.output_fn,
+                '--output', pdf_fn_name,
+                '--latex-engine=xelatex',
+                '-V', 'documentclass=article',
+                '-V', 'geometry=margin=1in',
+                '-V', 'title='
+            ]
+            if config.pandoc_template is not None:
+                pandoc_call.append('--template={}'.format(config.pandoc_template))
+            logger.debug("Attempting Pandoc conversion to PDF with following command:\n{}".format(' '.join(pandoc_call)))
+            pdf_exit_code = subprocess.call(pandoc_call)
+            if pdf_exit_code != 0:
+                logger.error("Error creating PDF! Pandoc returned a non-zero exit code.")
+            else:
+                logger.info("PDF Report  : {}".format(pdf_fn_name))
+        except OSError as e:
+            if e.errno == os.errno.ENOENT:
+                logger.error('Error creating PDF - pandoc not found. Is it installed? http://pandoc.org/')
+            else:
+                logger.error("Error creating PDF! Something went wrong when creating the PDF\n"+
+                    ('='*60)+"\n{}\n".format(traceback.format_exc()) + ('='*60))
+
+    ctx.start_stage('finish')
+    plugin_hooks.mqc_trigger('execution_finish')
+
+    version_check.finish()
+    ctx.log_telemetry(logger)
+    logger.info("MultiQC complete")
+
+    if lint and len(report.lint_errors) > 0:
+        logger.error("Found {} linting errors!\n{}".format(len(report.lint_errors), "\n".join(report.lint_errors)))
+        sys_exit_code = 1
+
+    # Move the log file into the data directory
+    log.move_tmp_log(logger)
+
+    # Exit with an error code if a module broke
+    return sys_exit_code
+
+
+def add_plugin_options(main_command):
+    ''' Add any extra command line options from plugins
+    :param main_command: click command object to add the options to
+    :return: The command with the options added
+    '''
+    for entry_point in registry.entry_points('multiqc.cli_options.v1'):
+        opt_func = entry_point.load()
+        main_command = opt_func(main_command)
+    return main_command
+
+
+def modify_usage_error(main_command):
+    ''' Function to modify the default click error handling.
+    Used here to tell the user about how to find additional help.
+    With thanks to this Stack Overflow answer: http://stackoverflow.com/a/43922088/713980
+    :param main_command: top-level group or command object constructed by click wrapper
+    :return: None
+    '''
+    def show(self, file=None):
+        if file is None:
+            file = click._compat.get_text_stderr()
+        color = None
+        if self.ctx is not None:
+            color = self.ctx.color
+            click.utils.echo(self.ctx.get_usage() + '\n', file=file, color=color)
+        click.utils.echo('Error: %s\n\nThis is MultiQC v{}\n\nFor more help, run \'multiqc --help\' or visit http://multiqc.info\n'.format(config.version) % self.format_message(), file=file, color=color)
+    click.exceptions.UsageError.show = show
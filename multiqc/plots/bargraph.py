@@ -14,7 +14,7 @@ import random
 import re
 import sys
 
-from multiqc.utils import config, report, util_functions
+from multiqc.utils import config, report, run_context, util_functions
 logger = logging.getLogger(__name__)
 
 try:
@@ -33,13 +33,11 @@ letters = 'abcdefghijklmnopqrstuvwxyz'
 
 # Load the template so that we can access its configuration
 # Do this lazily to mitigate import-spaghetti when running unit tests
-_template_mod = None
+# Not kept between calls, as the template can change between runs
 def get_template_mod():
-    global _template_mod
-    if not _template_mod:
-        _template_mod = config.avail_templates[config.template].load()
-    return _template_mod
+    return config.avail_templates[config.template].load()
 
+@run_context.timed('plots', 'bargraph')
 def plot (data, cats=None, pconfig=None):
     """ Plot a horizontal bar graph. Expects a 2D dict of sample
     data. Also can take info about categories. There are quite a
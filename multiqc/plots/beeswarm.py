@@ -5,13 +5,14 @@
 import logging
 import random
 
-from multiqc.utils import report
+from multiqc.utils import report, run_context
 from multiqc.plots import table_object
 
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@run_context.timed('plots', 'beeswarm')
 def plot (data, headers=None, pconfig=None):
     """ Helper HTML for a beeswarm plot.
     :param data: A list of data dicts
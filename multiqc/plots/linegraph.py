@@ -11,7 +11,7 @@ import os
 import random
 import sys
 
-from multiqc.utils import config, report, util_functions
+from multiqc.utils import config, data_writer, report, run_context, util_functions
 logger = logging.getLogger(__name__)
 
 try:
@@ -30,13 +30,11 @@ letters = 'abcdefghijklmnopqrstuvwxyz'
 
 # Load the template so that we can access its configuration
 # Do this lazily to mitigate import-spaghetti when running unit tests
-_template_mod = None
+# Not kept between calls, as the template can change between runs
 def get_template_mod():
-    global _template_mod
-    if not _template_mod:
-        _template_mod = config.avail_templates[config.template].load()
-    return _template_mod
+    return config.avail_templates[config.template].load()
 
+@run_context.timed('plots', 'linegraph')
 def plot (data, pconfig=None):
     """ Plot a line graph with X,Y data.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -289,7 +287,7 @@ def matplotlib_linegraph (plotdata, pconfig=None):
                 fout += "\n{}\t".format(d['name'])
                 fout += "\t".join([str(x[1]) for x in d['data']])
                 fout += "\n"
-            with io.open (os.path.join(config.data_dir, '{}.txt'.format(pid)), 'w', encoding='utf-8') as f:
+            with data_writer.open_file('{}.txt'.format(pid)) as f:
                 print( fout.encode('utf-8', 'ignore').decode('utf-8'), file=f )
         else:
             util_functions.write_data_file(fdata, pid)
@@ -5,12 +5,13 @@
 import logging
 import random
 
-from multiqc.utils import report
+from multiqc.utils import report, run_context
 
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@run_context.timed('plots', 'scatter')
 def plot (data, pconfig=None):
     """ Plot a scatter plot with X,Y data.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -4,14 +4,17 @@
 
 from collections import defaultdict, OrderedDict
 import logging
+import math
+import numpy as np
 import random
 
-from multiqc.utils import config, report, util_functions, mqc_colour
+from multiqc.utils import config, report, run_context, util_functions, mqc_colour
 from multiqc.plots import table_object, beeswarm
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@run_context.timed('plots', 'table')
 def plot (data, headers=None, pconfig=None):
     """ Return HTML for a MultiQC table.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -62,6 +65,21 @@ def make_table (dt):
     if table_title is None:
         table_title = table_id.replace("_", " ").title()
 
+    # Long tables are sent to the browser as column arrays instead of HTML cells.
+    # Only the rows scrolled into view are then drawn (multiqc_tables.js). Tables
+    # with max_table_rows or more are beeswarm plots unless no_beeswarm is set
+    num_rows = len(set([ s_name for d in dt.data for s_name in d.keys() ]))
+    virtual = num_rows >= config.virtual_table_rows and not config.simple_output
+    vt_columns = list()
+
+    # Pre-render the number separators once for the whole table
+    # This is horrible, but Python locale settings are worse
+    if config.thousandsSep_format is None:
+        config.thousandsSep_format = '<span class="mqc_thousandSep"></span>'
+    if config.decimalPoint_format is None:
+        config.decimalPoint_format = '.'
+    sep_translation = { ord('.'): config.decimalPoint_format, ord(','): config.thousandsSep_format }
+
     for idx, k, header in dt.get_headers_in_order():
 
         rid = header['rid']
@@ -116,75 +134,64 @@ def make_table (dt):
                 sk = header.get('shared_key', '')
             )
 
-        # Make a colour scale
-        if header['scale'] == False:
-            c_scale = None
-        else:
-            c_scale = mqc_colour.mqc_colour_scale(header['scale'], header['dmin'], header['dmax'])
-
-        # Add the data table cells
-        for (s_name, samp) in dt.data[idx].items():
-            if k in samp:
-                val = samp[k]
-                kname = '{}_{}'.format(header['namespace'], rid)
-                dt.raw_vals[s_name][kname] = val
-
-                if 'modify' in header and callable(header['modify']):
-                    val = header['modify'](val)
-
-                try:
-                    dmin = header['dmin']
-                    dmax = header['dmax']
-                    percentage = ((float(val) - dmin) / (dmax - dmin)) * 100
-                    percentage = min(percentage, 100)
-                    percentage = max(percentage, 0)
-                except (ZeroDivisionError,ValueError):
-                    percentage = 0
-
-                try:
-                    valstring = str(header['format'].format(val))
-                except ValueError:
-                    try:
-                        valstring = str(header['format'].format(float(val)))
-                    except ValueError:
-                        valstring = str(val)
-                except:
-                    valstring = str(val)
-
-                # This is horrible, but Python locale settings are worse
-                if config.thousandsSep_format is None:
-                    config.thousandsSep_format = '<span class="mqc_thousandSep"></span>'
-                if config.decimalPoint_format is None:
-                    config.decimalPoint_format = '.'
-                valstring = valstring.replace('.', 'DECIMAL').replace(',', 'THOUSAND')
-                valstring = valstring.replace('DECIMAL', config.decimalPoint_format).replace('THOUSAND', config.thousandsSep_format)
-
-                # Percentage suffixes etc
-                valstring += header.get('suffix', '')
-
-                # Build HTML
-                if not header['scale']:
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td class="{rid} {h}">{v}</td>'.format(rid=rid, h=hide, v=val)
-                else:
-                    if c_scale is not None:
-                        col = ' background-color:{};'.format(c_scale.get_colour(val))
-                    else:
-                        col = ''
-                    bar_html = '<span class="bar" style="width:{}%;{}"></span>'.format(percentage, col)
-                    val_html = '<span class="val">{}</span>'.format(valstring)
-                    wrapper_html = '<div class="wrapper">{}{}</div>'.format(bar_html, val_html)
-
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td class="data-coloured {rid} {h}">{c}</td>'.format(rid=rid, h=hide, c=wrapper_html)
+        # Collect this column's values, in sample order
+        s_names = [ s_name for s_name, samp in dt.data[idx].items() if k in samp ]
+        raw_vals = [ dt.data[idx][s_name][k] for s_name in s_names ]
 
         # Remove header if we don't have any filled cells for it
-        if sum([len(rows) for rows in t_rows.values()]) == 0:
+        if len(s_names) == 0:
             t_headers.pop(rid, None)
             t_modal_headers.pop(rid, None)
             logger.debug('Removing header {} from general stats table, as no data'.format(k))
+            continue
+
+        kname = '{}_{}'.format(header['namespace'], rid)
+        for s_name, val in zip(s_names, raw_vals):
+            dt.raw_vals[s_name][kname] = val
+            if s_name not in t_rows:
+                t_rows[s_name] = dict()
+
+        if 'modify' in header and callable(header['modify']):
+            vals = [ header['modify'](val) for val in raw_vals ]
+        else:
+            vals = raw_vals
+
+        # Bar widths, colours and formatted value strings for the whole column
+        if header['scale']:
+            percentages = get_percentages(vals, header['dmin'], header['dmax'])
+            c_scale = mqc_colour.mqc_colour_scale(header['scale'], header['dmin'], header['dmax'])
+            colours = c_scale.get_colours_for_values(vals)
+            suffix = header.get('suffix', '')
+            valstrings = [ format_value(header['format'], val).translate(sep_translation) + suffix for val in vals ]
+
+        # Keep the column arrays for the browser, skipping the HTML cells
+        if virtual:
+            vt_col = {
+                'rid': rid,
+                's_names': s_names,
+                'sort': [ None if math.isnan(v) else v for v in get_float_vals(vals) ]
+            }
+            if header['scale']:
+                vt_col['vals'] = valstrings
+                vt_col['pct'] = [ round(p, 2) for p in percentages ]
+                vt_col['col'] = colours
+            else:
+                vt_col['vals'] = [ str(val) for val in vals ]
+            vt_columns.append(vt_col)
+            continue
+
+        # Plain cells, without bars or number formatting
+        if not header['scale']:
+            for s_name, val in zip(s_names, vals):
+                t_rows[s_name][rid] = '<td class="{rid} {h}">{v}</td>'.format(rid=rid, h=hide, v=val)
+            continue
+
+        # Build HTML
+        cell_template = '<td class="data-coloured {rid} {h}"><div class="wrapper">' \
+            '<span class="bar" style="width:{{}}%; background-color:{{}};"></span>' \
+            '<span class="val">{{}}</span></div></td>'.format(rid=rid, h=hide)
+        for s_name, percentage, col, valstring in zip(s_names, percentages, colours, valstrings):
+            t_rows[s_name][rid] = cell_template.format(percentage, col, valstring)
 
     #
     # Put everything together
@@ -196,10 +203,10 @@ def make_table (dt):
 
         # Copy Table Button
         html += """
-        <button type="button" class="mqc_table_copy_btn btn btn-default btn-sm" data-clipboard-target="#{tid}">
+        <button type="button" class="mqc_table_copy_btn btn btn-default btn-sm{vc}" data-clipboard-target="#{tid}">
             <span class="glyphicon glyphicon-copy"></span> Copy table
         </button>
-        """.format(tid=table_id)
+        """.format(tid=table_id, vc=' mqc_table_copy_virtual' if virtual else '')
 
         # Configure Columns Button
         if len(t_headers) > 1:
@@ -231,30 +238,44 @@ def make_table (dt):
 
     # Build the table itself
     collapse_class = 'mqc-table-collapse' if len(t_rows) > 10 and config.collapse_tables else ''
+    virtual_class = ''
+    if virtual:
+        # Virtual tables need a scrolling container to draw rows into
+        collapse_class = 'mqc-table-collapse'
+        virtual_class = ' mqc_table_virtual'
     html += """
         <div id="{tid}_container" class="mqc_table_container">
             <div class="table-responsive mqc-table-responsive {cc}">
-                <table id="{tid}" class="table table-condensed mqc_table" data-title="{title}">
-        """.format( tid=table_id, title=table_title, cc=collapse_class)
+                <table id="{tid}" class="table table-condensed mqc_table{vc}" data-title="{title}">
+        """.format( tid=table_id, title=table_title, cc=collapse_class, vc=virtual_class)
 
     # Build the header row
     col1_header = dt.pconfig.get('col1_header', 'Sample Name')
     html += '<thead><tr><th class="rowheader">{}</th>{}</tr></thead>'.format(col1_header, ''.join(t_headers.values()))
 
     # Build the table body
-    html += '<tbody>'
     t_row_keys = t_rows.keys()
     if dt.pconfig.get('sortRows') is not False:
         t_row_keys = sorted(t_row_keys)
-    for s_name in t_row_keys:
-        html += '<tr>'
-        # Sample name row header
-        html += '<th class="rowheader" data-original-sn="{sn}">{sn}</th>'.format(sn=s_name)
-        for k in t_headers:
-            html += t_rows[s_name].get(k, empty_cells[k])
-        html += '</tr>'
-    html += '</tbody></table></div>'
-    if len(t_rows) > 10 and config.collapse_tables:
+    body_rows = list()
+    if virtual:
+        logger.debug('Table {} has {} rows, drawing rows in the browser'.format(table_id, len(t_rows)))
+        t_row_keys = list(t_row_keys)
+        row_idx = { s_name: i for i, s_name in enumerate(t_row_keys) }
+        for vt_col in vt_columns:
+            vt_col['idx'] = [ row_idx[s_name] for s_name in vt_col.pop('s_names') ]
+        report.plot_data[table_id] = {
+            'plot_type': 'table',
+            'samples': t_row_keys,
+            'columns': vt_columns
+        }
+    else:
+        for s_name in t_row_keys:
+            # Sample name row header, then the cells in column order
+            row_cells = [ t_rows[s_name].get(k, empty_cells[k]) for k in t_headers ]
+            body_rows.append('<tr><th class="rowheader" data-original-sn="{sn}">{sn}</th>{c}</tr>'.format(sn=s_name, c=''.join(row_cells)))
+    html += '<tbody>{}</tbody></table></div>'.format(''.join(body_rows))
+    if len(t_rows) > 10 and config.collapse_tables and not virtual:
         html += '<div class="mqc-table-expand"><span class="glyphicon glyphicon-chevron-down" aria-hidden="true"></span></div>'
     html += '</div>'
 
@@ -302,3 +323,39 @@ def make_table (dt):
         report.saved_raw_data[fn] = dt.raw_vals
 
     return html
+
+
+def get_float_vals(vals):
+    """ Convert a column of values to floats, with NaN for non-numeric values """
+    fvals = list()
+    for val in vals:
+        try:
+            fvals.append(float(val))
+        except (TypeError, ValueError):
+            fvals.append(float('nan'))
+    return fvals
+
+
+def get_percentages(vals, dmin, dmax):
+    """ Work out the width of the table cell bars for a column of values,
+    as percentages of the column range clamped to 0-100.
+    Values that are not numeric get a width of 0. """
+    if dmax == dmin:
+        return [0] * len(vals)
+    percentages = ((np.array(get_float_vals(vals)) - dmin) / (dmax - dmin)) * 100
+    percentages = np.nan_to_num(np.clip(percentages, 0, 100))
+    return percentages.tolist()
+
+
+def format_value(fmt, val):
+    """ Format a single table value with the column format string,
+    falling back to a float conversion and then the plain string. """
+    try:
+        return str(fmt.format(val))
+    except ValueError:
+        try:
+            return str(fmt.format(float(val)))
+        except (TypeError, ValueError):
+            return str(val)
+    except:
+        return str(val)
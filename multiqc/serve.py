@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+
+""" MultiQC report server. `multiqc serve` starts MultiQC once, with all
+modules imported and search patterns compiled, and then makes reports for
+jobs sent to a local Unix socket by `multiqc submit`. Jobs are run by a pool
+of worker processes, with a limit on the number of jobs waiting.
+
+Each job is one line of JSON: the `multiqc` command line arguments and the
+working directory of the client. The reply is one line of JSON with the exit
+code and the paths of the files that were made.
+"""
+
+from __future__ import absolute_import, print_function
+
+import click
+import fnmatch
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import socketserver # Python 3
+except ImportError:
+    import SocketServer as socketserver # Python 2
+
+from multiqc.utils import config, data_writer, log, registry, run_context, util_functions
+
+logger = config.logger
+
+def default_socket():
+    """ Socket path used if none is given """
+    cdir = registry.cache_dir()
+    if cdir is None:
+        return None
+    return os.path.join(cdir, 'multiqc.sock')
+
+def warm_up():
+    """ Import all modules and the default template and compile the file
+    search patterns, so that jobs don't need to. Returns the names of any
+    modules that could not be imported. """
+    failed = list()
+    for name, entry_point in config.avail_modules.items():
+        try:
+            entry_point.load()
+        except Exception:
+            failed.append(name)
+    # Templates change the config when imported, so do this as a run
+    with run_context.RunContext():
+        run_context.load_template(config.template)
+    for patterns in config.sp.values():
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        for pattern in patterns:
+            if not isinstance(pattern, dict):
+                continue
+            if 'fn' in pattern:
+                fnmatch.fnmatch('', pattern['fn'])
+            for k in ['fn_re', 'contents_re']:
+                if k in pattern:
+                    re.compile(pattern[k])
+    return failed
+
+def _init_worker():
+    # Ctrl-C is handled by the server, which stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Already done if the worker was forked from the server
+    warm_up()
+
+def run_job(args, cwd):
+    """ Make a report, in a worker process. Returns the reply for the client. """
+    from multiqc.multiqc import run, run_cli
+    os.chdir(cwd)
+    sys.argv = ['multiqc'] + list(args)
+    try:
+        with run_cli.make_context('multiqc', list(args)) as cctx:
+            params = dict(cctx.params)
+    except click.ClickException as e:
+        return { 'status': 'error', 'message': e.format_message() }
+    except (getattr(click.exceptions, 'Exit', SystemExit), SystemExit):
+        return { 'status': 'error', 'message': 'No report to make' }
+    if params.get('filename') == 'stdout':
+        return { 'status': 'error', 'message': "Reports can't be printed to stdout by multiqc serve" }
+
+    # Options from the main command are arguments of run(), the rest are plugin options
+    run_args = run.__code__.co_varnames[:run.__code__.co_argcount]
+    plugin_options = dict((k, v) for k, v in params.items() if k not in run_args)
+    params = dict((k, v) for k, v in params.items() if k in run_args)
+    try:
+        ctx = run(plugin_options=plugin_options, **params)
+    except Exception:
+        return { 'status': 'error', 'message': traceback.format_exc() }
+
+    # Files that were made
+    outputs = list()
+    fns = [ ctx.config.output_fn, getattr(ctx.config, 'plots_dir', None) ]
+    if ctx.config.data_dir is not None and ctx.config.zip_data_dir:
+        fns.append('{}.{}'.format(ctx.config.data_dir, data_writer.archive_formats.get(ctx.config.zip_data_dir_format, 'zip')))
+    elif ctx.config.data_dir is not None:
+        fns.append(ctx.config.data_dir)
+    for fn in fns:
+        if isinstance(fn, str) and os.path.exists(fn) and os.path.abspath(fn) not in outputs:
+            outputs.append(os.path.abspath(fn))
+    return { 'status': 'done', 'exit_code': ctx.sys_exit_code, 'outputs': outputs }
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """ Reads one job from a client and replies when it has finished """
+    def handle(self):
+        try:
+            job = json.loads(self.rfile.readline().decode('utf-8'))
+            args = [ str(a) for a in job['args'] ]
+            cwd = str(job['cwd'])
+        except (ValueError, KeyError, TypeError) as e:
+            reply = { 'status': 'error', 'message': 'Could not read job: {}'.format(e) }
+        else:
+            reply = self.server.submit(args, cwd)
+        try:
+            self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+        except socket.error:
+            logger.debug("Client went away before the job finished")
+
+class ReportServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Passes jobs from clients to the worker pool. If all workers are busy and
+    the queue is full, jobs are turned away straight away so that clients can
+    try again later, instead of piling up. """
+    daemon_threads = True
+
+    def __init__(self, socket_fn, pool, workers, queue_size):
+        socketserver.UnixStreamServer.__init__(self, socket_fn, JobHandler)
+        self.pool = pool
+        self.max_jobs = workers + queue_size
+        self.jobs = 0
+        self.job_count = 0
+        self.lock = threading.Lock()
+
+    def submit(self, args, cwd):
+        with self.lock:
+            if self.jobs >= self.max_jobs:
+                logger.warning("Turned away job, queue is full: {}".format(' '.join(args)))
+                return { 'status': 'busy', 'message': 'Server is busy, {} jobs running or waiting'.format(self.jobs) }
+            self.jobs += 1
+            self.job_count += 1
+            job_id = self.job_count
+        logger.info("Job {} started: multiqc {}".format(job_id, ' '.join(args)))
+        start = time.time()
+        try:
+            reply = self.pool.apply_async(run_job, (args, cwd)).get()
+        except Exception as e:
+            reply = { 'status': 'error', 'message': 'Worker failed: {}'.format(e) }
+        finally:
+            with self.lock:
+                self.jobs -= 1
+        logger.info("Job {} {} in {:.1f}s".format(job_id, reply['status'], time.time() - start))
+        return reply
+
+def _socket_in_use(socket_fn):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_fn)
+        return True
+    except socket.error:
+        return False
+    finally:
+        s.close()
+
+@click.command( context_settings = dict( help_option_names = ['-h', '--help'] ) )
+@click.option('--socket', 'socket_fn',
+                    type = click.Path(),
+                    help = "Unix socket to listen on. Default: ~/.cache/multiqc/multiqc.sock"
+)
+@click.option('-w', '--workers',
+                    type = int,
+                    help = "Number of reports to make at once. Default: serve_workers config option"
+)
+@click.option('--queue-size', 'queue_size',
+                    type = int,
+                    help = "Number of jobs that can wait for a worker. Default: serve_queue_size config option"
+)
+@click.option('-c', '--config', 'config_file',
+                    type = click.Path(exists=True, readable=True),
+                    multiple = True,
+                    help = "Specific config file to load for the server settings."
+)
+@click.option('-v', '--verbose',
+                    count = True,
+                    default = 0,
+                    help = "Increase output verbosity."
+)
+@util_functions.version_option
+def serve_cli(socket_fn, workers, queue_size, config_file, verbose):
+    """Run a MultiQC report server.
+
+        Keeps MultiQC loaded and makes reports for jobs sent with
+        'multiqc submit', so that each report doesn't have to start
+        MultiQC again.
+    """
+    console = log.console_handler(log.LEVELS.get(min(verbose,1), "INFO"))
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(console)
+    # Runs take these handlers off the logger whilst they log themselves
+    log.handlers.append(console)
+
+    config.mqc_load_userconfig(config_file)
+    socket_fn = socket_fn or config.serve_socket or default_socket()
+    workers = workers or config.serve_workers
+    if queue_size is None:
+        queue_size = config.serve_queue_size
+    if socket_fn is None:
+        raise click.UsageError("No socket given, and ~/.cache/multiqc can't be made")
+    if os.path.exists(socket_fn):
+        if _socket_in_use(socket_fn):
+            raise click.UsageError("A server is already running on {}".format(socket_fn))
+        os.remove(socket_fn)
+
+    start = time.time()
+    failed = warm_up()
+    if len(failed) > 0:
+        logger.warning("Could not import modules: {}".format(', '.join(failed)))
+    logger.debug("Loaded {} modules in {:.2f}s".format(len(config.avail_modules) - len(failed), time.time() - start))
+
+    # Workers are started from this process, so begin with everything loaded
+    import multiqc.multiqc
+    multiqc.multiqc.run_cli = multiqc.multiqc.add_plugin_options(multiqc.multiqc.run_cli)
+    pool = multiprocessing.Pool(workers, _init_worker, maxtasksperchild=config.serve_jobs_per_worker)
+    server = ReportServer(socket_fn, pool, workers, queue_size)
+    logger.info("This is MultiQC v{}".format(config.version))
+    logger.info("Serving on {} with {} workers".format(socket_fn, workers))
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping MultiQC server")
+    finally:
+        server.server_close()
+        pool.terminate()
+        pool.join()
+        if os.path.exists(socket_fn):
+            os.remove(socket_fn)
+
+@click.command( context_settings = dict( help_option_names = ['-h', '--help'], ignore_unknown_options = True ) )
+@click.option('--socket', 'socket_fn',
+                    type = click.Path(),
+                    help = "Unix socket of the server. Default: ~/.cache/multiqc/multiqc.sock"
+)
+@click.option('--wait',
+                    type = float,
+                    default = 0,
+                    help = "If the server is busy, keep trying for this many seconds"
+)
+@click.argument('multiqc_args',
+                    nargs = -1,
+                    type = click.UNPROCESSED,
+                    metavar = "<multiqc options> <analysis directory>"
+)
+def submit_cli(socket_fn, wait, multiqc_args):
+    """Make a report with a running MultiQC server.
+
+        Takes the same options as 'multiqc'. Prints the paths of
+        the files that were made, and exits with the exit code of
+        the report.
+    """
+    socket_fn = socket_fn or config.serve_socket or default_socket()
+    job = json.dumps({ 'args': list(multiqc_args), 'cwd': os.getcwd() }) + '\n'
+    deadline = time.time() + wait
+    delay = 0.5
+    while True:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(socket_fn)
+            s.sendall(job.encode('utf-8'))
+            reply = json.loads(s.makefile('rb').readline().decode('utf-8'))
+        except (socket.error, ValueError) as e:
+            click.echo("Could not get a reply from the MultiQC server on {}: {}".format(socket_fn, e), err=True)
+            sys.exit(1)
+        finally:
+            s.close()
+        if reply['status'] != 'busy' or time.time() + delay > deadline:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 10)
+
+    if reply['status'] == 'done':
+        for fn in reply['outputs']:
+            click.echo(fn)
+        sys.exit(reply['exit_code'])
+    click.echo(reply['message'], err=True)
+    sys.exit(1)
@@ -0,0 +1,284 @@
+////////////////////////////////////////////////
+// MultiQC Plot Data Decoding
+////////////////////////////////////////////////
+
+// Each plot's data is packed by report.encode_plot_data() in Python and
+// written to the report in its own <script class="mqc_plotdata"> block:
+// base64 text of a zlib stream, holding the uint32 length of a JSON index,
+// the JSON index itself and then a buffer of little-endian Float64 values.
+// Lists of numbers in the JSON are replaced by {"mqc_f8": [offset, length]}
+// (or [offset, length, width] for lists of equal-length lists). Keys in the
+// data that look like the marker (mqc_f8, _mqc_f8..) have an extra leading
+// underscore, which is taken off here.
+// With the lzstring codec (config.plot_data_codec) blocks are LZString
+// compressed JSON instead.
+
+var mqc_plotdata_decoders = {
+  'zlib': function(b64_data){ return mqc_decode_plotdata(b64_data); },
+  'lzstring': function(b64_data){ return JSON.parse(LZString.decompressFromBase64($.trim(b64_data))); }
+};
+
+// Set up mqc_plots. A plot's block is only decoded the first time that its
+// data is accessed, usually when plot_graph() first draws it.
+function mqc_load_plotdata(){
+  var plots = {};
+  $('script.mqc_plotdata').each(function(){
+    var block = this;
+    var target = $(block).attr('data-pid');
+    var decode = mqc_plotdata_decoders[$(block).attr('data-codec')];
+    Object.defineProperty(plots, target, {
+      configurable: true,
+      enumerable: true,
+      get: function(){
+        var pdata = decode(block.textContent);
+        // Let the browser free the compressed text
+        block.textContent = '';
+        Object.defineProperty(plots, target, { value: pdata, writable: true, configurable: true, enumerable: true });
+        return pdata;
+      },
+      set: function(new_data){
+        Object.defineProperty(plots, target, { value: new_data, writable: true, configurable: true, enumerable: true });
+      }
+    });
+  });
+  return plots;
+}
+
+function mqc_decode_plotdata(b64_data){
+  var bytes = mqc_inflate(mqc_base64_to_bytes($.trim(b64_data)));
+  var json_len = new DataView(bytes.buffer).getUint32(0, true);
+  var index = JSON.parse(mqc_utf8_decode(bytes.subarray(4, 4 + json_len)));
+  var values = new Float64Array(bytes.buffer, 4 + json_len, (bytes.length - 4 - json_len) / 8);
+  return mqc_unpack_plotdata(index, values);
+}
+
+// Replace Float64 buffer references with plain arrays (NaN becomes null)
+function mqc_unpack_plotdata(obj, values){
+  if(Array.isArray(obj)){
+    for(var i = 0; i < obj.length; i++){
+      obj[i] = mqc_unpack_plotdata(obj[i], values);
+    }
+    return obj;
+  }
+  if(obj === null || typeof obj !== 'object'){
+    return obj;
+  }
+  if(obj['mqc_f8'] !== undefined){
+    var offset = obj['mqc_f8'][0];
+    var length = obj['mqc_f8'][1];
+    var width = obj['mqc_f8'][2];
+    var arr = new Array(length);
+    for(var i = 0; i < length; i++){
+      if(width === undefined){
+        arr[i] = isNaN(values[offset + i]) ? null : values[offset + i];
+      } else {
+        arr[i] = new Array(width);
+        for(var j = 0; j < width; j++){
+          var v = values[offset + (i * width) + j];
+          arr[i][j] = isNaN(v) ? null : v;
+        }
+      }
+    }
+    return arr;
+  }
+  var escaped = false;
+  for(var k in obj){
+    if(obj.hasOwnProperty(k)){
+      obj[k] = mqc_unpack_plotdata(obj[k], values);
+      escaped = escaped || /^_+mqc_f8$/.test(k);
+    }
+  }
+  if(escaped){
+    // Rebuild the object to keep the key order
+    var unescaped = {};
+    for(var k in obj){
+      if(obj.hasOwnProperty(k)){
+        unescaped[/^_+mqc_f8$/.test(k) ? k.substr(1) : k] = obj[k];
+      }
+    }
+    return unescaped;
+  }
+  return obj;
+}
+
+function mqc_base64_to_bytes(b64_data){
+  var bin = atob(b64_data);
+  var bytes = new Uint8Array(bin.length);
+  for(var i = 0; i < bin.length; i++){
+    bytes[i] = bin.charCodeAt(i);
+  }
+  return bytes;
+}
+
+function mqc_utf8_decode(bytes){
+  if(window.TextDecoder !== undefined){
+    return new TextDecoder('utf-8').decode(bytes);
+  }
+  // Older browsers - decode in chunks to stay below argument limits
+  var str = '';
+  for(var i = 0; i < bytes.length; i += 8192){
+    str += String.fromCharCode.apply(null, bytes.subarray(i, i + 8192));
+  }
+  return decodeURIComponent(escape(str));
+}
+
+////////////////////////////////////////////////
+// Inflate (RFC 1950 / RFC 1951) - decompresses the output of Python zlib.compress()
+////////////////////////////////////////////////
+
+var mqc_inflate_tables = undefined;
+
+function mqc_inflate(data){
+  var pos = 2; // Skip the two byte zlib header
+  var bitbuf = 0;
+  var bitcnt = 0;
+  var out = new Uint8Array(Math.max(1024, data.length * 4));
+  var outlen = 0;
+
+  if(mqc_inflate_tables === undefined){
+    mqc_inflate_tables = mqc_inflate_build_tables();
+  }
+  var tb = mqc_inflate_tables;
+
+  function need(n){
+    if(outlen + n > out.length){
+      var new_len = out.length * 2;
+      while(new_len < outlen + n){ new_len *= 2; }
+      var new_out = new Uint8Array(new_len);
+      new_out.set(out.subarray(0, outlen));
+      out = new_out;
+    }
+  }
+  function bits(n){
+    while(bitcnt < n){
+      if(pos >= data.length){ throw new Error('Unexpected end of compressed plot data'); }
+      bitbuf |= data[pos++] << bitcnt;
+      bitcnt += 8;
+    }
+    var v = bitbuf & ((1 << n) - 1);
+    bitbuf >>>= n;
+    bitcnt -= n;
+    return v;
+  }
+  function decode_sym(tree){
+    var sum = 0, cur = 0, len = 0;
+    do {
+      cur = 2 * cur + bits(1);
+      len++;
+      sum += tree.counts[len];
+      cur -= tree.counts[len];
+    } while(cur >= 0);
+    return tree.symbols[sum + cur];
+  }
+
+  var last_block = 0;
+  while(!last_block){
+    last_block = bits(1);
+    var btype = bits(2);
+    if(btype == 0){
+      // Stored block - skip to the byte boundary and copy
+      bitbuf = 0;
+      bitcnt = 0;
+      var len = data[pos] | (data[pos + 1] << 8);
+      pos += 4;
+      need(len);
+      out.set(data.subarray(pos, pos + len), outlen);
+      outlen += len;
+      pos += len;
+      continue;
+    }
+    var lit_tree, dist_tree;
+    if(btype == 1){
+      lit_tree = tb.fixed_lit;
+      dist_tree = tb.fixed_dist;
+    } else if(btype == 2){
+      var hlit = bits(5) + 257;
+      var hdist = bits(5) + 1;
+      var hclen = bits(4) + 4;
+      var cl_lengths = new Uint8Array(19);
+      for(var i = 0; i < hclen; i++){
+        cl_lengths[tb.cl_order[i]] = bits(3);
+      }
+      var cl_tree = mqc_inflate_tree(cl_lengths, 0, 19);
+      var lengths = new Uint8Array(hlit + hdist);
+      var n = 0;
+      while(n < hlit + hdist){
+        var sym = decode_sym(cl_tree);
+        if(sym < 16){
+          lengths[n++] = sym;
+        } else {
+          var prev = 0, rep;
+          if(sym == 16){ prev = lengths[n - 1]; rep = 3 + bits(2); }
+          else if(sym == 17){ rep = 3 + bits(3); }
+          else { rep = 11 + bits(7); }
+          while(rep--){ lengths[n++] = prev; }
+        }
+      }
+      lit_tree = mqc_inflate_tree(lengths, 0, hlit);
+      dist_tree = mqc_inflate_tree(lengths, hlit, hdist);
+    } else {
+      throw new Error('Invalid block type in compressed plot data');
+    }
+    // Decode the compressed block
+    while(true){
+      var sym = decode_sym(lit_tree);
+      if(sym < 256){
+        need(1);
+        out[outlen++] = sym;
+      } else if(sym == 256){
+        break;
+      } else {
+        sym -= 257;
+        var length = tb.len_base[sym] + bits(tb.len_extra[sym]);
+        var dsym = decode_sym(dist_tree);
+        var dist = tb.dist_base[dsym] + bits(tb.dist_extra[dsym]);
+        need(length);
+        for(var i = 0; i < length; i++){
+          out[outlen] = out[outlen - dist];
+          outlen++;
+        }
+      }
+    }
+  }
+  return out.slice(0, outlen);
+}
+
+// Canonical Huffman tree: number of codes of each bit length, and symbols in code order
+function mqc_inflate_tree(lengths, offset, num){
+  var tree = { counts: new Uint16Array(16), symbols: new Uint16Array(num) };
+  var offs = new Uint16Array(16);
+  for(var i = 0; i < num; i++){
+    tree.counts[lengths[offset + i]]++;
+  }
+  tree.counts[0] = 0;
+  for(var i = 0, sum = 0; i < 16; i++){
+    offs[i] = sum;
+    sum += tree.counts[i];
+  }
+  for(var i = 0; i < num; i++){
+    if(lengths[offset + i]){
+      tree.symbols[offs[lengths[offset + i]]++] = i;
+    }
+  }
+  return tree;
+}
+
+function mqc_inflate_build_tables(){
+  var tb = {
+    cl_order: [16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15],
+    len_base: [3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258],
+    len_extra: [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0],
+    dist_base: [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577],
+    dist_extra: [0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]
+  };
+  var lengths = new Uint8Array(288 + 30);
+  for(var i = 0; i < 288; i++){
+    lengths[i] = i < 144 ? 8 : (i < 256 ? 9 : (i < 280 ? 7 : 8));
+  }
+  for(var i = 288; i < 318; i++){
+    lengths[i] = 5;
+  }
+  tb.fixed_lit = mqc_inflate_tree(lengths, 0, 288);
+  tb.fixed_dist = mqc_inflate_tree(lengths, 288, 30);
+  return tb;
+}
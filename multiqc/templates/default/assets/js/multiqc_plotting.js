@@ -23,8 +23,8 @@ $(function () {
   // Show loading warning
   $('.mqc_loading_warning').show();
 
-  // Decompress the JSON plot data
-  mqc_plots = JSON.parse(LZString.decompressFromBase64(mqc_compressed_plotdata));
+  // Find the plot data - each plot is decompressed when first used
+  mqc_plots = mqc_load_plotdata();
 
   // HighCharts Defaults
   window.HCDefaults = $.extend(true, {}, Highcharts.getOptions(), {});
@@ -17,16 +17,22 @@ $(function () {
     var strip_non_numeric = function(node){
       return node.innerText.replace(/[^\d.-]/g, '');
     }
-    $('.mqc_table').tablesorter({sortInitialOrder: 'desc', textExtraction: strip_non_numeric});
+    $('.mqc_table').not('.mqc_table_virtual').tablesorter({sortInitialOrder: 'desc', textExtraction: strip_non_numeric});
 
     // Update tablesorter if samples renamed
     $(document).on('mqc_renamesamples', function(e, f_texts, t_texts, regex_mode){
-      $('.mqc_table').trigger('update');
+      $('.mqc_table').not('.mqc_table_virtual').trigger('update');
     });
 
     // Copy table contents to clipboard
-    var clipboard = new Clipboard('.mqc_table_copy_btn');
+    var clipboard = new Clipboard('.mqc_table_copy_btn:not(.mqc_table_copy_virtual)');
     clipboard.on('success', function(e) { e.clearSelection(); });
+    // Virtual tables only have some rows in the page, so copy from the data
+    var vt_clipboard = new Clipboard('.mqc_table_copy_btn.mqc_table_copy_virtual', {
+      text: function(trigger) {
+        return mqc_vtable_text( $(trigger).data('clipboard-target').substr(1) );
+      }
+    });
     $('.mqc_table_copy_btn').click(function(){
       var btn = $(this);
       btn.addClass('active').html('<span class="glyphicon glyphicon-copy"></span> Copied!');
@@ -80,6 +86,12 @@ $(function () {
           $(target+'_configModal_table .'+cclass).addClass('text-muted');
         }
       });
+      // Virtual tables redraw their rows from the data
+      if(mqc_vtables[target.substr(1)] !== undefined){
+        mqc_vtable_update_cols(target.substr(1));
+        $(target+'_numcols').text( $(target+' thead th:visible').length - 1 );
+        return;
+      }
       // Hide empty rows
       $(target+' tbody tr').show();
       $(target+' tbody tr').each(function(){
@@ -120,8 +132,8 @@ $(function () {
     // highlight samples
     $(document).on('mqc_highlights', function(e, f_texts, f_cols, regex_mode){
       $('.mqc_table_sortHighlight').hide();
-      $('.mqc_table tbody th').removeClass('highlighted').removeData('highlight');
-      $('.mqc_table tbody th').each(function(i){
+      $('.mqc_table:not(.mqc_table_virtual) tbody th').removeClass('highlighted').removeData('highlight');
+      $('.mqc_table:not(.mqc_table_virtual) tbody th').each(function(i){
         var th = $(this);
         var thtext = $(this).text();
         var thiscol = '#333';
@@ -140,6 +152,11 @@ $(function () {
     $('.mqc_table_sortHighlight').click(function(e){
       e.preventDefault();
       var target = $(this).data('target');
+      if(mqc_vtables[target.substr(1)] !== undefined){
+        mqc_vtable_sort_highlight(target.substr(1), $(this).data('direction'));
+        $(this).data('direction', $(this).data('direction') == 'desc' ? 'asc' : 'desc');
+        return;
+      }
       // collect highlighted rows
       var hrows = $(target+' tbody th.highlighted').parent().detach();
       hrows = hrows.sort(function (a, b) {
@@ -157,7 +174,7 @@ $(function () {
 
     // Rename samples
     $(document).on('mqc_renamesamples', function(e, f_texts, t_texts, regex_mode){
-      $(".mqc_table tbody th").each(function(){
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function(){
         var s_name = $(this).data('original-sn');
         $.each(f_texts, function(idx, f_text){
           if(regex_mode){
@@ -175,7 +192,7 @@ $(function () {
     $(document).on('mqc_hidesamples', function(e, f_texts, regex_mode){
 
       // Hide rows in MultiQC tables
-      $(".mqc_table tbody th").each(function(){
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function(){
         var match = false;
         var hfilter = $(this).text();
         $.each(f_texts, function(idx, f_text){
@@ -194,11 +211,13 @@ $(function () {
       });
       $('.mqc_table_numrows').each(function(){
         var tid = $(this).attr('id').replace('_numrows','');
-        $(this).text( $('#'+tid+' tbody tr:visible').length );
+        if(mqc_vtables[tid] === undefined){
+          $(this).text( $('#'+tid+' tbody tr:visible').length );
+        }
       });
 
       // Hide empty columns
-      $('.mqc_table').each(function(){
+      $('.mqc_table:not(.mqc_table_virtual)').each(function(){
         var table = $(this);
         var gsthidx = 0;
         table.find("thead th, tbody tr td").show();
@@ -223,6 +242,34 @@ $(function () {
       });
     });
 
+    // Virtual tables - wait for the plot data to be loaded before drawing
+    setTimeout(function(){
+      $('.mqc_table_virtual').each(function(){
+        mqc_vtable_init( $(this).attr('id') );
+      });
+      // Toolbox listeners, bound after the ones above so that they run last
+      $(document).on('mqc_renamesamples', function(e, f_texts, t_texts, regex_mode){
+        $.each(mqc_vtables, function(tid){
+          mqc_vtable_rename(tid, f_texts, t_texts, regex_mode);
+          mqc_vtable_highlight(tid, window.mqc_highlight_f_texts, window.mqc_highlight_regex_mode);
+          mqc_vtable_hide(tid, window.mqc_hide_f_texts, window.mqc_hide_regex_mode);
+          mqc_vtable_filter(tid);
+        });
+      });
+      $(document).on('mqc_highlights', function(e, f_texts, f_cols, regex_mode){
+        $.each(mqc_vtables, function(tid){
+          mqc_vtable_highlight(tid, f_texts, regex_mode);
+          mqc_vtable_draw(tid);
+        });
+      });
+      $(document).on('mqc_hidesamples', function(e, f_texts, regex_mode){
+        $.each(mqc_vtables, function(tid){
+          mqc_vtable_hide(tid, f_texts, regex_mode);
+          mqc_vtable_filter(tid);
+        });
+      });
+    }, 0);
+
   } // End of check for table
 
   // Table Scatter Modal
@@ -281,7 +328,22 @@ $(function () {
         },
         'datasets': [[]]
       };
-      $(tid+' tbody tr').each(function(e){
+      var vt = mqc_vtables[tid.substr(1)];
+      if(vt !== undefined){
+        var vcol1 = vt['columns'][col1];
+        var vcol2 = vt['columns'][col2];
+        for(var i = 0; i < vt['order'].length; i++){
+          var r = vt['order'][i];
+          if(vcol1 !== undefined && vcol2 !== undefined && isFinite(vcol1['sort'][r]) && isFinite(vcol2['sort'][r])){
+            mqc_plots['tableScatterPlot']['datasets'][0].push({
+              'name': vt['names'][r],
+              'x': vcol1['sort'][r],
+              'y': vcol2['sort'][r]
+            });
+          }
+        }
+      }
+      $(tid+':not(.mqc_table_virtual) tbody tr').each(function(e){
         var s_name = $(this).children('th.rowheader').text();
         var val_1 = $(this).children('td.'+col1).text().replace(/[^\d\.]/g,'');
         var val_2 = $(this).children('td.'+col2).text().replace(/[^\d\.]/g,'');
@@ -347,4 +409,285 @@ function change_mqc_table_col_order(table){
       }
     }
   });
+  // Virtual tables redraw their rows in the new column order
+  if(mqc_vtables[target] !== undefined){
+    mqc_vtable_update_cols(target);
+  }
+}
+
+
+////////////////////////////////////////////////
+// Virtual tables
+// Tables with very many rows are sent as column arrays in mqc_plots.
+// Only the rows scrolled into view are drawn, and sorting / filtering
+// work on typed arrays of row indices.
+////////////////////////////////////////////////
+
+var mqc_vtables = {};
+var mqc_vtable_buffer = 20; // Number of extra rows drawn above and below the view
+
+// Unpack the column arrays for a virtual table and draw it
+function mqc_vtable_init(tid){
+  if(mqc_plots[tid] === undefined || mqc_plots[tid]['plot_type'] !== 'table'){
+    return false;
+  }
+  var pdata = mqc_plots[tid];
+  var n = pdata['samples'].length;
+  var vt = {
+    'n': n,
+    'samples': pdata['samples'],
+    'names': pdata['samples'].slice(),
+    'columns': {},
+    'col_order': [],
+    'sorted': new Uint32Array(n),
+    'order': new Uint32Array(0),
+    'shown': new Uint8Array(n),
+    'highlight': new Int32Array(n),
+    'row_height': 31
+  };
+  for(var i = 0; i < n; i++){ vt['sorted'][i] = i; }
+  $.each(pdata['columns'], function(idx, col){
+    var c = {
+      'has': new Uint8Array(n),
+      'sort': new Float64Array(n),
+      'vals': new Array(n),
+      'pct': col['pct'] === undefined ? undefined : new Float64Array(n),
+      'col': col['col'] === undefined ? undefined : new Array(n)
+    };
+    c['sort'].fill(NaN);
+    for(var j = 0; j < col['idx'].length; j++){
+      var r = col['idx'][j];
+      c['has'][r] = 1;
+      c['vals'][r] = col['vals'][j];
+      if(col['sort'][j] !== null){ c['sort'][r] = col['sort'][j]; }
+      if(c['pct'] !== undefined){
+        c['pct'][r] = col['pct'][j];
+        c['col'][r] = col['col'][j];
+      }
+    }
+    vt['columns'][col['rid']] = c;
+  });
+  mqc_vtables[tid] = vt;
+
+  // Apply any toolbox filters that were loaded before the table
+  mqc_vtable_rename(tid, window.mqc_rename_f_texts, window.mqc_rename_t_texts, window.mqc_rename_regex_mode);
+  mqc_vtable_highlight(tid, window.mqc_highlight_f_texts, window.mqc_highlight_regex_mode);
+  mqc_vtable_hide(tid, window.mqc_hide_f_texts, window.mqc_hide_regex_mode);
+
+  // Redraw when scrolled, at most once per animation frame
+  var container = $('#'+tid).closest('.mqc-table-responsive');
+  var frame_requested = false;
+  container.scroll(function(){
+    if(!frame_requested){
+      frame_requested = true;
+      window.requestAnimationFrame(function(){
+        frame_requested = false;
+        mqc_vtable_draw(tid);
+      });
+    }
+  });
+
+  // Sort when a header is clicked
+  $('#'+tid+' thead th').click(function(){
+    var dir = $(this).hasClass('headerSortUp') ? 'asc' : 'desc';
+    $('#'+tid+' thead th').removeClass('headerSortUp headerSortDown');
+    $(this).addClass(dir == 'desc' ? 'headerSortUp' : 'headerSortDown');
+    var rid = $(this).hasClass('rowheader') ? null : $(this).attr('id').replace(/^header_/, '');
+    mqc_vtable_sort(tid, rid, dir);
+  });
+
+  mqc_vtable_update_cols(tid);
+}
+
+// Read the column order and visibility from the table header, then redraw
+function mqc_vtable_update_cols(tid){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  vt['col_order'] = [];
+  vt['col_hidden'] = {};
+  $('#'+tid+' thead th').each(function(){
+    var th_id = $(this).attr('id');
+    if(th_id !== undefined && th_id.indexOf('header_') === 0){
+      var rid = th_id.substr(7);
+      vt['col_order'].push(rid);
+      vt['col_hidden'][rid] = $(this).hasClass('hidden');
+    }
+  });
+  mqc_vtable_filter(tid);
+}
+
+// Work out which rows are shown, in sort order, then redraw
+function mqc_vtable_filter(tid){
+  var vt = mqc_vtables[tid];
+  // Rows without any value in a visible column are not shown
+  var has_val = new Uint8Array(vt['n']);
+  $.each(vt['col_order'], function(idx, rid){
+    var c = vt['columns'][rid];
+    if(c === undefined || vt['col_hidden'][rid]){ return true; }
+    for(var r = 0; r < vt['n']; r++){ has_val[r] |= c['has'][r]; }
+  });
+  var order = new Uint32Array(vt['n']);
+  var num = 0;
+  for(var i = 0; i < vt['n']; i++){
+    var r = vt['sorted'][i];
+    if(vt['shown'][r] && has_val[r]){
+      order[num] = r;
+      num++;
+    }
+  }
+  vt['order'] = order.subarray(0, num);
+  $('#'+tid+'_numrows').text(num);
+  mqc_vtable_draw(tid);
+}
+
+// Draw the rows that are currently scrolled into view
+function mqc_vtable_draw(tid){
+  var vt = mqc_vtables[tid];
+  var container = $('#'+tid).closest('.mqc-table-responsive');
+  var num = vt['order'].length;
+  var first = Math.floor(container.scrollTop() / vt['row_height']) - mqc_vtable_buffer;
+  var last = Math.ceil((container.scrollTop() + container.height()) / vt['row_height']) + mqc_vtable_buffer;
+  first = Math.max(0, Math.min(first, num));
+  last = Math.max(first, Math.min(last, num));
+  var ncols = vt['col_order'].length + 1;
+  var html = [];
+  html.push('<tr class="mqc_vtable_spacer" style="height:'+(first * vt['row_height'])+'px;"><td colspan="'+ncols+'"></td></tr>');
+  for(var i = first; i < last; i++){
+    var r = vt['order'][i];
+    var h = vt['highlight'][r];
+    var th_col = h >= 0 ? window.mqc_highlight_f_cols[h] : '#333';
+    var hclass = h >= 0 ? ' highlighted' : '';
+    html.push('<tr><th class="rowheader'+hclass+'" data-original-sn="'+vt['samples'][r]+'" style="color:'+th_col+';">'+vt['names'][r]+'</th>');
+    for(var j = 0; j < vt['col_order'].length; j++){
+      var rid = vt['col_order'][j];
+      var c = vt['columns'][rid];
+      var hide = vt['col_hidden'][rid] ? 'hidden' : '';
+      if(c === undefined || !c['has'][r]){
+        html.push('<td class="data-coloured '+rid+' '+hide+'"></td>');
+      } else if(c['pct'] === undefined){
+        html.push('<td class="'+rid+' '+hide+'">'+c['vals'][r]+'</td>');
+      } else {
+        html.push('<td class="data-coloured '+rid+' '+hide+'"><div class="wrapper"><span class="bar" style="width:'+c['pct'][r]+'%; background-color:'+c['col'][r]+';"></span><span class="val">'+c['vals'][r]+'</span></div></td>');
+      }
+    }
+    html.push('</tr>');
+  }
+  html.push('<tr class="mqc_vtable_spacer" style="height:'+((num - last) * vt['row_height'])+'px;"><td colspan="'+ncols+'"></td></tr>');
+  $('#'+tid+' tbody').html(html.join(''));
+
+  // Measure the real row height once, and redraw if our guess was wrong
+  if(!vt['row_height_measured'] && last > first){
+    vt['row_height_measured'] = true;
+    var row_height = $('#'+tid+' tbody tr:not(.mqc_vtable_spacer)').first().outerHeight();
+    if(row_height > 0 && row_height != vt['row_height']){
+      vt['row_height'] = row_height;
+      mqc_vtable_draw(tid);
+    }
+  }
+}
+
+// Sort rows by a column (or by sample name if rid is null)
+function mqc_vtable_sort(tid, rid, dir){
+  var vt = mqc_vtables[tid];
+  var sign = dir == 'desc' ? -1 : 1;
+  var c = rid === null ? undefined : vt['columns'][rid];
+  var cmp;
+  if(c !== undefined && c['sort'].some(function(v){ return !isNaN(v); })){
+    // Numeric column - missing values always go last
+    var sv = c['sort'];
+    cmp = function(a, b){
+      var a_nan = isNaN(sv[a]), b_nan = isNaN(sv[b]);
+      if(a_nan || b_nan){ return a_nan - b_nan; }
+      return sign * (sv[a] - sv[b]);
+    };
+  } else {
+    var labels = c === undefined ? vt['names'] : c['vals'];
+    cmp = function(a, b){
+      var a_l = labels[a] === undefined ? '' : String(labels[a]);
+      var b_l = labels[b] === undefined ? '' : String(labels[b]);
+      return sign * a_l.localeCompare(b_l);
+    };
+  }
+  vt['sorted'].sort(cmp);
+  mqc_vtable_filter(tid);
+}
+
+// Move highlighted rows to the top (desc) or bottom (asc) of the table
+function mqc_vtable_sort_highlight(tid, dir){
+  var vt = mqc_vtables[tid];
+  var rows = Array.prototype.slice.call(vt['sorted']);
+  var hrows = rows.filter(function(r){ return vt['highlight'][r] >= 0; });
+  var others = rows.filter(function(r){ return vt['highlight'][r] < 0; });
+  hrows.sort(function(a, b){ return vt['highlight'][a] - vt['highlight'][b]; });
+  vt['sorted'].set(dir == 'desc' ? hrows.reverse().concat(others) : others.concat(hrows));
+  mqc_vtable_filter(tid);
+}
+
+// Check a sample name against toolbox filter strings. Returns the index of the last match, or -1
+function mqc_vtable_match(s_name, f_texts, regex_mode){
+  var match = -1;
+  $.each(f_texts || [], function(idx, f_text){
+    if((regex_mode && s_name.match(f_text)) || (!regex_mode && s_name.indexOf(f_text) > -1)){
+      match = idx;
+    }
+  });
+  return match;
+}
+
+function mqc_vtable_rename(tid, f_texts, t_texts, regex_mode){
+  var vt = mqc_vtables[tid];
+  for(var r = 0; r < vt['n']; r++){
+    var s_name = vt['samples'][r];
+    $.each(f_texts || [], function(idx, f_text){
+      if(regex_mode){
+        s_name = s_name.replace(new RegExp(f_text, 'g'), t_texts[idx]);
+      } else {
+        s_name = s_name.replace(f_text, t_texts[idx]);
+      }
+    });
+    vt['names'][r] = s_name;
+  }
+}
+
+function mqc_vtable_highlight(tid, f_texts, regex_mode){
+  var vt = mqc_vtables[tid];
+  var any_highlighted = false;
+  for(var r = 0; r < vt['n']; r++){
+    vt['highlight'][r] = mqc_vtable_match(vt['names'][r], f_texts, regex_mode);
+    any_highlighted = any_highlighted || vt['highlight'][r] >= 0;
+  }
+  if(any_highlighted){
+    $('.mqc_table_sortHighlight[data-target="#'+tid+'"]').show();
+  }
+}
+
+function mqc_vtable_hide(tid, f_texts, regex_mode){
+  var vt = mqc_vtables[tid];
+  for(var r = 0; r < vt['n']; r++){
+    var match = mqc_vtable_match(vt['names'][r], f_texts, regex_mode) >= 0;
+    if(window.mqc_hide_mode == 'show'){
+      match = !match;
+    }
+    vt['shown'][r] = match ? 0 : 1;
+  }
+}
+
+// Tab-separated text of the shown rows and visible columns, for copying
+function mqc_vtable_text(tid){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return ''; }
+  var cols = vt['col_order'].filter(function(rid){ return !vt['col_hidden'][rid]; });
+  var lines = [ [$('#'+tid+' thead th.rowheader').text()].concat(cols.map(function(rid){
+    return $('#'+tid+' #header_'+rid).text();
+  })).join('\t') ];
+  for(var i = 0; i < vt['order'].length; i++){
+    var r = vt['order'][i];
+    var line = [vt['names'][r]];
+    $.each(cols, function(idx, rid){
+      var c = vt['columns'][rid];
+      line.push(c !== undefined && c['has'][r] ? $('<div>'+c['vals'][r]+'</div>').text() : '');
+    });
+    lines.push(line.join('\t'));
+  }
+  return lines.join('\n');
 }
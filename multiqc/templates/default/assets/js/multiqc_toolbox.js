@@ -317,8 +317,13 @@ $(function () {
   }
 
   /// SAVING STUFF
+  // Split reports - use the same toolbox settings as the last page viewed
+  var split_state_loaded = mqc_split_load_state();
+  if(window.mqc_split_report_id !== undefined){
+    $(document).on('mqc_highlights mqc_renamesamples mqc_hidesamples', mqc_split_save_state);
+  }
   // Load the saved setting names
-  populate_mqc_saveselect();
+  populate_mqc_saveselect(!split_state_loaded);
   // Save config
   $('#mqc_saveconfig_form').submit(function(e){
     e.preventDefault();
@@ -697,12 +702,9 @@ function apply_mqc_hidesamples(){
 // SAVE TOOLBOX SETTINGS
 //////////////////////////////////////////////////////
 
-// Save the current configuration setup
-function mqc_save_config(name, clear, as_default){
-  if(name === undefined){ return false; }
+// Collect the current toolbox settings
+function mqc_toolbox_config(){
   var config = {};
-
-  // Collect the toolbox vars
   config['highlights_f_texts'] =  window.mqc_highlight_f_texts;
   config['highlights_f_cols'] =   window.mqc_highlight_f_cols;
   config['highlight_regex'] =     window.mqc_highlight_regex_mode;
@@ -712,6 +714,13 @@ function mqc_save_config(name, clear, as_default){
   config['hidesamples_mode'] =    window.mqc_hide_mode;
   config['hidesamples_f_texts'] = window.mqc_hide_f_texts;
   config['hidesamples_regex'] =   window.mqc_hide_regex_mode;
+  return config;
+}
+
+// Save the current configuration setup
+function mqc_save_config(name, clear, as_default){
+  if(name === undefined){ return false; }
+  var config = mqc_toolbox_config();
 
   var prev_config = {};
   // Load existing configs (inc. from other reports)
@@ -803,7 +812,7 @@ function mqc_clear_default_config() {
 //////////////////////////////////////////////////////
 // LOAD TOOLBOX SAVE NAMES
 //////////////////////////////////////////////////////
-function populate_mqc_saveselect(){
+function populate_mqc_saveselect(load_default){
   var default_config = '';
   try {
     var local_config = localStorage.getItem("mqc_config");
@@ -812,8 +821,10 @@ function populate_mqc_saveselect(){
       default_name = false;
       for (var name in local_config){
         if (local_config[name]['default']) {
-          console.log('Loaded default config!');
-          load_mqc_config(name);
+          if(load_default !== false){
+            console.log('Loaded default config!');
+            load_mqc_config(name);
+          }
           default_config = name;
           name = name+' [default]';
           default_name = name;
@@ -856,6 +867,11 @@ function load_mqc_config(name){
       }
     }
   } catch(e){ console.log('Could not load local config: '+e); }
+  apply_mqc_config(config);
+}
+
+// Apply a set of toolbox settings to the report
+function apply_mqc_config(config){
 
   // Apply config - rename samples
   if(notEmptyObj(config['rename_regex'])){
@@ -930,3 +946,41 @@ function load_mqc_config(name){
   $(document).trigger('mqc_config_loaded');
 
 }
+
+//////////////////////////////////////////////////////
+// SPLIT REPORTS - SHARE SETTINGS BETWEEN PAGES
+//////////////////////////////////////////////////////
+
+// Remember the toolbox settings so that other pages of the report can use them
+function mqc_split_save_state(){
+  if(window.mqc_split_report_id === undefined){ return false; }
+  try {
+    var states = JSON.parse(localStorage.getItem("mqc_split_state") || '{}');
+    var config = mqc_toolbox_config();
+    config['last_updated'] = Date.now();
+    states[window.mqc_split_report_id] = config;
+    // Forget reports which haven't been looked at for 30 days
+    for (var id in states){
+      if(states.hasOwnProperty(id) && Date.now() - states[id]['last_updated'] > 30*24*60*60*1000){
+        delete states[id];
+      }
+    }
+    localStorage.setItem("mqc_split_state", JSON.stringify(states));
+  } catch(e){ console.log('Could not save split report settings to localStorage: '+e); }
+}
+
+// Load the toolbox settings saved by another page of this report
+function mqc_split_load_state(){
+  if(window.mqc_split_report_id === undefined){ return false; }
+  try {
+    var states = JSON.parse(localStorage.getItem("mqc_split_state") || '{}');
+    var config = states[window.mqc_split_report_id];
+    if(config === undefined){ return false; }
+    // Nothing to do if all filters were cleared
+    if(notEmptyObj(config['highlights_f_texts']) || notEmptyObj(config['rename_from_texts']) || notEmptyObj(config['hidesamples_f_texts'])){
+      apply_mqc_config(config);
+    }
+    return true;
+  } catch(e){ console.log('Could not load split report settings from localStorage: '+e); }
+  return false;
+}
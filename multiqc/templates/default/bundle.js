@@ -0,0 +1,10 @@
+{# Shared JavaScript for the pages of a split report - see assets.html #}
+{%- from 'assets.html' import js_files %}
+{% for js_href in js_files %}
+{{ include_file(js_href) }}
+;
+{% endfor %}
+{%- for m in report.modules_output %}{% if m.js and m.js|length > 0 %}{% for js_href in m.js.values() %}
+{{ include_file(js_href, None) }}
+;
+{% endfor %}{% endif %}{% endfor %}
@@ -5,50 +5,52 @@ config variables to be used across all other modules """
 
 from __future__ import print_function
 from datetime import datetime
-import inspect
 import collections
 import os
-import pkg_resources
-import subprocess
 import sys
 import yaml
 
 import multiqc
+from multiqc.utils import registry
 
 # Default logger will be replaced by caller
 import logging
 logger = logging.getLogger(__name__)
 
-# Get the MultiQC version
-version = pkg_resources.get_distribution("multiqc").version
-short_version = pkg_resources.get_distribution("multiqc").version
-script_path = os.path.dirname(os.path.realpath(__file__))
-git_hash = None
-git_hash_short = None
-try:
-    git_hash = subprocess.check_output( ['git', 'rev-parse', 'HEAD'],
-                                        cwd=script_path,
-                                        stderr=subprocess.STDOUT,
-                                        universal_newlines=True ).strip()
-    git_hash_short = git_hash[:7]
-    version = '{} ({})'.format(version, git_hash_short)
-except:
-    pass
-
 # Constants
-MULTIQC_DIR = os.path.dirname(os.path.realpath(inspect.getfile(multiqc)))
+MULTIQC_DIR = os.path.dirname(os.path.realpath(multiqc.__file__))
+
+# YAML loader for config files - uses the C parser if available
+yaml_loader = registry.yaml_loader
 
 ##### MultiQC Defaults
-# Default MultiQC config
-searchp_fn = os.path.join( MULTIQC_DIR, 'utils', 'config_defaults.yaml')
-with open(searchp_fn) as f:
-    configs = yaml.load(f)
-    for c, v in configs.items():
-        globals()[c] = v
-# Module filename search patterns
+# Get the MultiQC version, default config and module filename search patterns.
+# Cached along with the installed modules and templates, see registry.py
+defaults_fn = os.path.join( MULTIQC_DIR, 'utils', 'config_defaults.yaml')
 searchp_fn = os.path.join( MULTIQC_DIR, 'utils', 'search_patterns.yaml')
-with open(searchp_fn) as f:
-    sp = yaml.load(f)
+short_version, (configs, sp) = registry.load(MULTIQC_DIR, [defaults_fn, searchp_fn])
+for c, v in configs.items():
+    globals()[c] = v
+
+script_path = os.path.dirname(os.path.realpath(__file__))
+
+# Add the git commit hash to the version if running from a clone of the repository.
+# On Python 3.7+, the .git directory is only read when version, git_hash or
+# git_hash_short is first used (see __getattr__ below)
+def git_version():
+    """ The version, git_hash and git_hash_short config variables """
+    git_hash = registry.git_hash(os.path.dirname(MULTIQC_DIR))
+    if not git_hash:
+        return { 'version': short_version, 'git_hash': None, 'git_hash_short': None }
+    return { 'version': '{} ({})'.format(short_version, git_hash[:7]), 'git_hash': git_hash, 'git_hash_short': git_hash[:7] }
+
+def __getattr__(name):
+    if name in ['version', 'git_hash', 'git_hash_short']:
+        return git_version()[name]
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+if sys.version_info < (3, 7):
+    globals().update(git_version())
 
 # Other defaults that can't be set in YAML
 data_tmp_dir = '/tmp' # will be overwritten by core script
@@ -63,17 +65,15 @@ megaqc_access_token = os.environ.get('MEGAQC_ACCESS_TOKEN')
 # Modules must be listed in setup.py under entry_points['multiqc.modules.v1']
 # Get all modules, including those from other extension packages
 avail_modules = dict()
-for entry_point in pkg_resources.iter_entry_points('multiqc.modules.v1'):
-    nicename = str(entry_point).split('=')[0].strip()
-    avail_modules[nicename] = entry_point
+for entry_point in registry.entry_points('multiqc.modules.v1'):
+    avail_modules[entry_point.name] = entry_point
 
 ##### Available templates
 # Templates must be listed in setup.py under entry_points['multiqc.templates.v1']
 # Get all templates, including those from other extension packages
 avail_templates = {}
-for entry_point in pkg_resources.iter_entry_points('multiqc.templates.v1'):
-    nicename = str(entry_point).split('=')[0].strip()
-    avail_templates[nicename] = entry_point
+for entry_point in registry.entry_points('multiqc.templates.v1'):
+    avail_templates[entry_point.name] = entry_point
 
 ##### Check we have modules & templates
 # Check that we were able to find some modules and templates
@@ -118,12 +118,16 @@ def mqc_load_config(yaml_config):
     if os.path.isfile(yaml_config):
         try:
             with open(yaml_config) as f:
-                new_config = yaml.load(f)
+                new_config = yaml.load(f, Loader=yaml_loader)
                 logger.debug("Loading config settings from: {}".format(yaml_config))
                 mqc_add_config(new_config, yaml_config)
         except (IOError, AttributeError) as e:
             logger.debug("Config error: {}".format(e))
-        except yaml.scanner.ScannerError as e:
+        except yaml.constructor.ConstructorError as e:
+            # Config files are loaded with the safe loader, so Python tags don't work
+            logger.error("Error parsing config YAML (Python tags such as !!python/ are not allowed): {}".format(e))
+            sys.exit(1)
+        except yaml.YAMLError as e:
             logger.error("Error parsing config YAML: {}".format(e))
             sys.exit(1)
     else:
@@ -132,13 +136,13 @@ def mqc_load_config(yaml_config):
 def mqc_cl_config(cl_config):
     for clc_str in cl_config:
         try:
-            parsed_clc = yaml.load(clc_str)
+            parsed_clc = yaml.load(clc_str, Loader=yaml_loader)
             # something:var fails as it needs a space. Fix this (a common mistake)
             if isinstance(parsed_clc, str) and ':' in clc_str:
                 clc_str = ': '.join(clc_str.split(':'))
-                parsed_clc = yaml.load(clc_str)
+                parsed_clc = yaml.load(clc_str, Loader=yaml_loader)
             assert(isinstance(parsed_clc, dict))
-        except yaml.scanner.ScannerError as e:
+        except yaml.YAMLError as e:
             logger.error("Could not parse command line config: {}\n{}".format(clc_str, e))
         except AssertionError:
             logger.error("Could not parse command line config: {}".format(clc_str))
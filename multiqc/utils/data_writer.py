@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+""" MultiQC data file writing. Files for the data directory are either
+written to the directory itself or, with --zip-data-dir, straight into a
+zip or tar.gz archive, so that each file is only written once. """
+
+from __future__ import print_function
+import io
+import logging
+import os
+import shutil
+import sys
+import tarfile
+import time
+import zipfile
+
+from multiqc import config
+
+logger = logging.getLogger(__name__)
+
+# Archive file extensions
+archive_formats = { 'zip': 'zip', 'tar.gz': 'tar.gz' }
+
+# The open archive, if the data directory is being zipped
+_archive = None
+
+class ZipArchive(object):
+    """ Zip file. Entries are compressed as they are written (Python 3.6+) """
+    def __init__(self, fn, level):
+        kwargs = dict()
+        if sys.version_info >= (3, 7):
+            kwargs['compresslevel'] = level
+        self.level = level
+        self.fh = zipfile.ZipFile(fn, 'w', zipfile.ZIP_DEFLATED, allowZip64=True, **kwargs)
+
+    def open(self, name):
+        """ Binary file handle for a new entry, or None if this Python
+        can't stream into zip files """
+        if sys.version_info < (3, 6):
+            return None
+        zinfo = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0o644 << 16
+        zinfo._compresslevel = self.level # Used by Python 3.7+
+        return self.fh.open(zinfo, 'w', force_zip64=True)
+
+    def add(self, path, name):
+        self.fh.write(path, name)
+
+    def close(self):
+        self.fh.close()
+
+class TarArchive(object):
+    """ Gzipped tar file. Tar headers need the file size, so entries
+    are written to disk and then added when they are complete """
+    def __init__(self, fn, level):
+        self.fh = tarfile.open(fn, 'w:gz', compresslevel=level)
+
+    def open(self, name):
+        return None
+
+    def add(self, path, name):
+        self.fh.add(path, name)
+
+    def close(self):
+        self.fh.close()
+
+class _StagedFile(io.FileIO):
+    """ File in the data directory which is moved into the archive when closed """
+    def __init__(self, path, name, archive):
+        super(_StagedFile, self).__init__(path, 'wb')
+        self._mqc_path = path
+        self._mqc_name = name
+        self._mqc_archive = archive
+
+    def close(self):
+        if not self.closed:
+            super(_StagedFile, self).close()
+            self._mqc_archive.add(self._mqc_path, self._mqc_name)
+            os.remove(self._mqc_path)
+
+def start_archive(data_dir, archive_format='zip', level=6):
+    """ Write data files into an archive next to data_dir instead
+    of into the directory. Returns the archive filename. """
+    global _archive
+    if archive_format not in archive_formats:
+        logger.warning("Unknown data directory archive format '{}', using zip".format(archive_format))
+        archive_format = 'zip'
+    fn = '{}.{}'.format(data_dir, archive_formats[archive_format])
+    if archive_format == 'tar.gz':
+        _archive = TarArchive(fn, level)
+    else:
+        _archive = ZipArchive(fn, level)
+    _archive.data_dir = data_dir
+    _archive.fn = fn
+    logger.debug("Writing data files to archive '{}'".format(fn))
+    return fn
+
+def open_file(fn):
+    """ Open a text file in the data directory for writing. Returns a
+    file handle, which can be used in a with statement. Unencodable
+    characters are dropped. """
+    path = os.path.join(config.data_dir, fn)
+    if _archive is None:
+        return io.open(path, 'w', encoding='utf-8', errors='ignore')
+    fh = _archive.open(fn)
+    if fh is None:
+        fh = io.BufferedWriter(_StagedFile(path, fn, _archive))
+    return io.TextIOWrapper(fh, encoding='utf-8', errors='ignore')
+
+def discard_archive():
+    """ Close the archive if a run stopped before it was finished """
+    global _archive
+    if _archive is not None:
+        _archive.close()
+        _archive = None
+
+def finish_archive(dest_dir):
+    """ Add any files that were saved straight to the data directory
+    (eg. SQLite databases), close the archive and move it next to
+    dest_dir. Returns the final archive filename. """
+    global _archive
+    archive = _archive
+    _archive = None
+    for root, dirs, files in os.walk(archive.data_dir):
+        for f in sorted(files):
+            path = os.path.join(root, f)
+            archive.add(path, os.path.relpath(path, archive.data_dir))
+    archive.close()
+    dest_fn = '{}{}'.format(dest_dir, archive.fn[len(archive.data_dir):])
+    shutil.move(archive.fn, dest_fn)
+    return dest_fn
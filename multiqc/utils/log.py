@@ -4,16 +4,82 @@
 Code to initilise the MultiQC logging
 """
 
+from collections import OrderedDict
+import atexit
 import logging
 import os
 import shutil
+import sys
 import tempfile
+import threading
+import time
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+    import queue
+except ImportError:
+    QueueHandler = None # Python 2 - log file is written directly
 
 from multiqc.utils import config, util_functions
 
 LEVELS = {0: 'INFO', 1: 'DEBUG'}
 log_tmp_dir = None
 log_tmp_fn = '/dev/null'
+file_handler = None
+file_listener = None
+# Handlers added by init_log(), removed by close_log()
+handlers = list()
+# Level of the console log, eg. 'INFO'
+console_level = None
+
+# Counts of repeated debug messages, see debug_repeated()
+repeated_counts = OrderedDict()
+_repeated_lock = threading.Lock()
+
+if QueueHandler is not None:
+    class BlockingQueueHandler(QueueHandler):
+        """ Passes log records to the log file writing thread. Records are
+        formatted here by QueueHandler.prepare(), so that arguments which
+        change after the logging call are logged as they were. The writer
+        only writes the message. Logging waits if the queue is full. """
+        def enqueue(self, record):
+            self.queue.put(record)
+
+class QueueStream(object):
+    """ File-like object from get_log_stream() when the log file is written
+    by a background thread. Each line written is sent through the log queue,
+    so it can't be mixed up with log records being written at the same time. """
+    def __init__(self, log_queue):
+        self.log_queue = log_queue
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self._put(line)
+
+    def flush(self):
+        if self.buffer:
+            self._put(self.buffer)
+            self.buffer = ''
+
+    def _put(self, line):
+        self.log_queue.put(logging.makeLogRecord({ 'msg': line, 'levelno': logging.DEBUG, 'levelname': 'DEBUG' }))
+
+# Logging templates
+debug_template = '[%(asctime)s] %(name)-50s [%(levelname)-7s]  %(message)s'
+info_template = '[%(levelname)-7s] %(module)15s : %(message)s'
+
+def console_handler(loglevel):
+    """ Log handler for the console """
+    console = logging.StreamHandler()
+    console.setLevel(getattr(logging, loglevel))
+    if loglevel == 'DEBUG':
+        console.setFormatter(logging.Formatter(debug_template))
+    else:
+        console.setFormatter(logging.Formatter(info_template))
+    return console
 
 def init_log(logger, loglevel=0):
     """
@@ -26,31 +92,122 @@ def init_log(logger, loglevel=0):
         loglevel (str): Determines the level of the log output.
     """
     # File for logging
-    global log_tmp_dir, log_tmp_fn
+    global log_tmp_dir, log_tmp_fn, console_level
     log_tmp_dir = tempfile.mkdtemp()
     log_tmp_fn = os.path.join(log_tmp_dir, 'multiqc.log')
 
-    # Logging templates
-    debug_template = '[%(asctime)s] %(name)-50s [%(levelname)-7s]  %(message)s'
-    info_template = '[%(levelname)-7s] %(module)15s : %(message)s'
-
     # Base level setup
     logger.setLevel(getattr(logging, 'DEBUG'))
 
     # Set up the console logging stream
-    console = logging.StreamHandler()
-    console.setLevel(getattr(logging, loglevel))
-    if loglevel == 'DEBUG':
-        console.setFormatter(logging.Formatter(debug_template))
-    else:
-        console.setFormatter(logging.Formatter(info_template))
+    console = console_handler(loglevel)
+    console_level = loglevel
     logger.addHandler(console)
+    handlers.append(console)
 
     # Now set up the file logging stream if we have a data directory
+    # This is written by a background thread, so that busy debug logging
+    # doesn't slow down the run
+    global file_handler, file_listener
     file_handler = logging.FileHandler(log_tmp_fn, encoding='utf-8')
     file_handler.setLevel(getattr(logging, 'DEBUG')) # always DEBUG for the file
-    file_handler.setFormatter(logging.Formatter(debug_template))
-    logger.addHandler(file_handler)
+    if QueueHandler is None:
+        file_handler.setFormatter(logging.Formatter(debug_template))
+        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    else:
+        # Records are formatted before they are queued
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        log_queue = queue.Queue(maxsize=config.log_queue_size)
+        queue_handler = BlockingQueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter(debug_template))
+        queue_handler.setLevel(getattr(logging, 'DEBUG'))
+        logger.addHandler(queue_handler)
+        handlers.append(queue_handler)
+        file_listener = QueueListener(log_queue, file_handler)
+        file_listener.start()
+
+def stop_file_listener():
+    """ Write any queued log messages to the log file and stop the writer thread """
+    global file_listener
+    if file_listener is not None:
+        file_listener.stop()
+        file_listener = None
+atexit.register(stop_file_listener)
+
+def close_log(logger):
+    """ Remove the handlers added by init_log() and close the log file,
+    so that the next run starts afresh """
+    stop_file_listener()
+    for handler in handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    del handlers[:]
+    if file_handler is not None:
+        file_handler.close()
+
+def debug_repeated(logger, message, detail):
+    """ Log a debug message that may be repeated a great many times, such as
+    for each ignored file. Only the first few of each message are logged with
+    their detail, after that they are counted and summarised by
+    log_repeated_summary(). Can be used from more than one thread. """
+    key = (logger.name, message)
+    with _repeated_lock:
+        count = repeated_counts.get(key, 0) + 1
+        repeated_counts[key] = count
+    if count <= config.log_repeated_limit:
+        logger.debug("{}: {}".format(message, detail))
+
+def log_repeated_summary():
+    """ Log how many of each repeated debug message were not shown """
+    for (name, message), count in repeated_counts.items():
+        if count > config.log_repeated_limit:
+            logging.getLogger(name).debug("{}: {} more not shown ({} in total)".format(
+                message, count - config.log_repeated_limit, count))
+    repeated_counts.clear()
+
+def format_bytes(num_bytes):
+    """ Human readable size, eg. 1.5 GB """
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if abs(num_bytes) < 1024 or unit == 'TB':
+            break
+        num_bytes /= 1024.0
+    return '{:.0f} {}'.format(num_bytes, unit) if unit == 'B' else '{:.1f} {}'.format(num_bytes, unit)
+
+class Progress(object):
+    """ Progress line on stderr, with counts of files and bytes and the rate
+    of each. Only shown if stderr is a terminal and the console log is at the
+    normal INFO level, and redrawn at most every config.progress_interval
+    seconds, so that it costs next to nothing with millions of files. """
+    def __init__(self, label, stream=None):
+        self.label = label
+        self.stream = stream or sys.stderr
+        isatty = getattr(self.stream, 'isatty', None)
+        self.enabled = bool(isatty and isatty() and console_level == 'INFO' and config.progress_interval)
+        self.start = time.time()
+        self.last = 0
+        self.width = 0
+
+    def update(self, num_files, num_bytes, force=False):
+        if not self.enabled:
+            return
+        now = time.time()
+        if not force and now - self.last < config.progress_interval:
+            return
+        self.last = now
+        secs = max(now - self.start, 0.001)
+        line = '{}: {} files, {} ({:.0f} files/s, {}/s)'.format(
+            self.label, num_files, format_bytes(num_bytes), num_files / secs, format_bytes(num_bytes / secs))
+        # Pad with spaces to cover a longer previous line
+        self.stream.write('\r' + line.ljust(self.width))
+        self.stream.flush()
+        self.width = len(line)
+
+    def finish(self, num_files, num_bytes):
+        if self.enabled:
+            self.update(num_files, num_bytes, force=True)
+            self.stream.write('\n')
+            self.stream.flush()
 
 def move_tmp_log(logger):
     """ Move the temporary log file to the MultiQC data directory
@@ -58,7 +215,7 @@ def move_tmp_log(logger):
 
     try:
         # https://stackoverflow.com/questions/15435652/python-does-not-release-filehandles-to-logfile
-        logging.shutdown()
+        close_log(logger)
         shutil.move(log_tmp_fn, os.path.join(config.data_dir, 'multiqc.log'))
         util_functions.robust_rmtree(log_tmp_dir)
     except (AttributeError, TypeError, IOError):
@@ -68,7 +225,9 @@ def move_tmp_log(logger):
 def get_log_stream(logger):
     """
     Returns a stream to the root log file.
-    If there is no logfile return the stderr log stream
+    If there is no logfile return the stderr log stream.
+    If the log file is written by a background thread, the stream
+    sends each line written to it through the log queue.
 
     Returns:
         A stream to the root log file or stderr stream.
@@ -79,6 +238,8 @@ def get_log_stream(logger):
     for handler in logger.handlers:
         if isinstance(handler, logging.FileHandler):
             file_stream = handler.stream
+        elif QueueHandler is not None and isinstance(handler, QueueHandler):
+            file_stream = QueueStream(handler.queue)
         else:
             log_stream = handler.stream
 
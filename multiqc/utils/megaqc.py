@@ -4,23 +4,37 @@
 
 from __future__ import print_function
 import gzip
-import io
 import json
 import os
-import requests
+import tempfile
+import time
+import uuid
 
 from multiqc import config
+from multiqc.utils import data_writer
+from multiqc.utils.util_functions import MQCJSONEncoder, iter_json
 log = config.logger
 
-# Custom encoder to handle lambda functions
-class MQCJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if callable(obj):
-            try:
-                return obj(1)
-            except:
-                return None
-        return json.JSONEncoder.default(self, obj)
+try:
+    json_scalar_types = (unicode, str, int, long, float) # Python 2
+except NameError:
+    json_scalar_types = (str, int, float)
+
+def check_json(obj):
+    """ Check that MQCJSONEncoder can encode an object, without encoding it.
+    Raises a TypeError if not. """
+    if obj is None or isinstance(obj, json_scalar_types) or callable(obj):
+        return
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k is not None and not isinstance(k, json_scalar_types):
+                raise TypeError("Key {} is not JSON serializable".format(repr(k)))
+            check_json(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            check_json(v)
+    else:
+        raise TypeError("{} is not JSON serializable".format(repr(obj)))
 
 def multiqc_dump_json(report):
     exported_data = dict()
@@ -54,7 +68,7 @@ def multiqc_dump_json(report):
                     d = {'{}_{}'.format(s, k): getattr(config, k)}
                 elif s == 'report':
                     d = {'{}_{}'.format(s, k): getattr(report, k)}
-                json.dumps(d, cls=MQCJSONEncoder, ensure_ascii=False) # Test that exporting to JSON works
+                check_json(d) # Test that exporting to JSON works
                 exported_data.update(d)
             except (TypeError, KeyError, AttributeError):
                 log.warn("Couldn't export data key '{}.{}'".format(s, k))
@@ -68,31 +82,102 @@ def multiqc_dump_json(report):
     return exported_data
 
 
-def multiqc_api_post(exported_data):
-    headers = { 'Content-Type': 'application/json', 'content-encoding': 'gzip' }
+def write_json_dump(exported_data, data_fn=None, upload=False):
+    """ Encode the exported data as JSON once, streaming it to the data file
+    data_fn in the data directory (multiqc_data.json) and / or through gzip
+    for a MegaQC upload.
+    Returns the gzipped upload request body as a file object, or None. """
+    data_fh = None
+    gz_fh = None
+    request_body = None
+    try:
+        if data_fn is not None:
+            data_fh = data_writer.open_file(data_fn)
+        if upload:
+            # Kept in memory unless it gets big
+            request_body = tempfile.SpooledTemporaryFile(max_size=64*1024*1024)
+            gz_fh = gzip.GzipFile(fileobj=request_body, mode='wb')
+            gz_fh.write(b'{"data": ')
+        for batch in iter_json(exported_data, indent=4):
+            if data_fh is not None:
+                data_fh.write(batch)
+            if gz_fh is not None:
+                gz_fh.write(batch.encode('utf-8', 'ignore'))
+        if data_fh is not None:
+            data_fh.write(u'\n')
+        if gz_fh is not None:
+            gz_fh.write(b'}')
+    finally:
+        if data_fh is not None:
+            data_fh.close()
+        if gz_fh is not None:
+            gz_fh.close()
+    if request_body is not None:
+        request_body.seek(0)
+    return request_body
+
+
+def multiqc_api_post(exported_data, request_body=None):
+    """ Send the exported data to MegaQC. request_body is the gzipped
+    JSON from write_json_dump(), made here if not given. The body is sent
+    in chunks and the upload is retried with exponential backoff if the
+    connection fails or the server gives a 5xx error. MegaQC can't resume
+    an upload, so every attempt sends the whole body again. Every attempt
+    has the same upload id, so that the server can spot repeated uploads. """
+    headers = {
+        'Content-Type': 'application/json',
+        'content-encoding': 'gzip',
+        'X-MultiQC-Upload-Id': uuid.uuid4().hex
+    }
     if config.megaqc_access_token is not None:
         headers['access_token'] = config.megaqc_access_token
-    post_data = json.dumps({'data': exported_data}, cls=MQCJSONEncoder, ensure_ascii=False, indent=2)
-    post_data = post_data.encode('utf-8', 'ignore')
-
-    # Gzip the JSON for massively decreased filesize
-    sio_obj = io.BytesIO()
-    gzfh = gzip.GzipFile(fileobj=sio_obj, mode='w')
-    gzfh.write(post_data)
-    gzfh.close()
-    request_body = sio_obj.getvalue()
+    if request_body is None:
+        request_body = write_json_dump(exported_data, upload=True)
 
+    import requests # slow to import, so only when needed
     log.info("Sending data to MegaQC")
     log.debug("MegaQC URL: {}".format(config.megaqc_url))
-    try:
-        r = requests.post(config.megaqc_url, headers=headers, data=request_body, timeout=config.megaqc_timeout)
-    except (requests.exceptions.ConnectTimeout, requests.exceptions.ReadTimeout) as e:
-        log.error("Timed out when sending data: {}".format(e))
-    except requests.exceptions.ConnectionError:
-        log.error("Couldn't connect to MegaQC URL {}".format(config.megaqc_url))
-    except Exception as e:
-        log.error("Error sending data: {}".format(e))
-    else:
+    log.debug("MegaQC upload id: {}".format(headers['X-MultiQC-Upload-Id']))
+    attempts = max(int(config.megaqc_retries), 0) + 1
+    for attempt in range(1, attempts + 1):
+        if attempt > 1:
+            wait = config.megaqc_retry_backoff * 2 ** (attempt - 2)
+            log.warning("Retrying MegaQC upload in {} seconds (attempt {} of {})".format(wait, attempt, attempts))
+            time.sleep(wait)
+        request_body.seek(0)
+        sent = [0]
+        def body_chunks():
+            while True:
+                chunk = request_body.read(config.megaqc_chunk_size)
+                if not chunk:
+                    break
+                sent[0] += len(chunk)
+                yield chunk
+        start = time.time()
+        try:
+            r = requests.post(config.megaqc_url, headers=headers, data=body_chunks(), timeout=config.megaqc_timeout)
+        except (requests.exceptions.ConnectTimeout, requests.exceptions.ReadTimeout) as e:
+            log.error("Timed out when sending data: {}".format(e))
+            continue
+        except requests.exceptions.ConnectionError:
+            log.error("Couldn't connect to MegaQC URL {}".format(config.megaqc_url))
+            continue
+        except (requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema, requests.exceptions.InvalidURL) as e:
+            log.error("Invalid MegaQC URL: {}".format(e))
+            return None
+        except requests.exceptions.RequestException as e:
+            # eg. ChunkedEncodingError if the connection drops mid-upload
+            log.error("Error sending data: {}".format(e))
+            continue
+        except Exception as e:
+            log.error("Error sending data: {}".format(e))
+            return None
+        elapsed = max(time.time() - start, 0.001)
+        log.info("Sent {:.2f} MB to MegaQC in {:.2f} seconds ({:.2f} MB/s)".format(
+            sent[0] / 1048576.0, elapsed, sent[0] / 1048576.0 / elapsed))
+        if r.status_code >= 500:
+            log.error("MegaQC server error (status code: {})".format(r.status_code))
+            continue
         try:
             api_r = json.loads(r.text)
         except Exception as e:
@@ -112,3 +197,5 @@ def multiqc_api_post(exported_data):
             else:
                 log.debug("MegaQC API status code was {}".format(r.status_code))
                 log.error('Error - {}'.format(api_r.get('message', 'Unknown problem')))
+        return None
+    log.error("Giving up sending data to MegaQC after {} attempts".format(attempts))
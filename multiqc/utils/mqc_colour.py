@@ -12,18 +12,23 @@ import re
 import logging
 logger = logging.getLogger(__name__)
 
+non_numeric_re = re.compile(r'[^0-9\.]')
+
 
 class mqc_colour_scale(object):
 	""" Class to hold a colour scheme. """
 
+	# Number of interpolated colours precomputed for each scale
+	lut_size = 256
+
 	def __init__(self, name='GnBu', minval=0, maxval=100):
 		""" Initialise class with a colour scale """
 
 		self.colours = self.get_colours(name)
 
 		# Sanity checks
-		minval = re.sub("[^0-9\.]", "", str(minval))
-		maxval = re.sub("[^0-9\.]", "", str(maxval))
+		minval = non_numeric_re.sub('', str(minval))
+		maxval = non_numeric_re.sub('', str(maxval))
 		if minval == '':
 			minval = 0
 		if maxval == '':
@@ -31,38 +36,69 @@ class mqc_colour_scale(object):
 		if float(minval) == float(maxval):
 			self.minval = float(minval)
 			self.maxval = float(minval) + 1.0
-		elif minval > maxval:
+		elif float(minval) > float(maxval):
 			self.minval = float(maxval)
 			self.maxval = float(minval)
 		else:
 			self.minval = float(minval)
 			self.maxval = float(maxval)
 
-	def get_colour(self, val, colformat='hex'):
-		""" Given a value, return a colour within the colour scale """
-		try:
-			# Sanity checks
-			val = re.sub("[^0-9\.]", "", str(val))
-			if val == '':
-				val = self.minval
-			val = float(val)
-			val = max(val, self.minval)
-			val = min(val, self.maxval)
+		# Build the colour lookup table once, instead of for every value
+		self.lut = self.build_lut()
 
-			domain_nums = list( np.linspace(self.minval, self.maxval, len(self.colours)) )
-			my_scale = spectra.scale(self.colours).domain(domain_nums)
+	def build_lut(self):
+		""" Interpolate the colour scale into a list of lut_size hex colours,
+		evenly spaced between minval and maxval """
+		try:
+			domain_nums = np.linspace(self.minval, self.maxval, len(self.colours))
+			steps = np.linspace(self.minval, self.maxval, self.lut_size)
+			scale_rgb = np.array([ spectra.html(c).rgb for c in self.colours ])
+			lut_rgb = np.column_stack([ np.interp(steps, domain_nums, scale_rgb[:,i]) for i in range(3) ])
 
 			# Weird, I know. I ported this from the original JavaScript for continuity
 			# Seems to work better than adjusting brightness / saturation / luminosity
-			rgb_converter = lambda x: max(0, min(1, 1+((x-1)*0.3)))
-			thecolour = spectra.rgb( *[rgb_converter(v) for v in my_scale(val).rgb] )
-
-			return thecolour.hexcode
+			lut_rgb = np.clip(1 + ((lut_rgb - 1) * 0.3), 0, 1)
+
+			lut_rgb = np.floor(0.5 + lut_rgb * 255).astype(int)
+			return [ '#{:02x}{:02x}{:02x}'.format(*c) for c in lut_rgb ]
+		except Exception as e:
+			logger.debug("Could not build colour scale: {}".format(e))
+			return None
+
+	def clean_val(self, val):
+		""" Strip non-numeric characters from a value and return it as a float """
+		val = non_numeric_re.sub('', str(val))
+		if val == '':
+			return self.minval
+		return float(val)
+
+	def lut_idx(self, vals):
+		""" Given a numpy array of floats, return their lookup table indices """
+		vals = np.clip(vals, self.minval, self.maxval)
+		return np.rint((vals - self.minval) / (self.maxval - self.minval) * (self.lut_size - 1)).astype(int)
 
+	def get_colour(self, val, colformat='hex'):
+		""" Given a value, return a colour within the colour scale """
+		try:
+			return self.lut[ self.lut_idx(self.clean_val(val)) ]
 		except:
 			# Shouldn't crash all of MultiQC just for colours
 			return ''
 
+	def get_colours_for_values(self, vals, colformat='hex'):
+		""" Given a list of values, return a list of colours within the colour
+		scale. Values that can't be coloured get an empty string. """
+		if self.lut is None:
+			return [''] * len(vals)
+		cleaned = np.empty(len(vals))
+		for i, val in enumerate(vals):
+			try:
+				cleaned[i] = self.clean_val(val)
+			except ValueError:
+				cleaned[i] = np.nan
+		valid = ~np.isnan(cleaned)
+		idxs = self.lut_idx(np.where(valid, cleaned, self.minval))
+		return [ self.lut[idx] if ok else '' for idx, ok in zip(idxs, valid) ]
 
 	def get_colours(self, name='GnBu'):
 		""" Function to get a colour scale by name
@@ -2,20 +2,53 @@
 
 """ MultiQC plugin hooks. Enables MultiQC plugins
 to run their own custom subroutines at predefined
-trigger points during MultiQC execution. """
+trigger points during MultiQC execution.
 
-import pkg_resources
+Hooks from the multiqc.hooks.v1 entry point group are called with
+no arguments. Hooks from multiqc.hooks.v2 are called with the run
+context, plus keyword arguments for some trigger points (eg. the
+module name for before_module). Every hook is timed, and the times
+are kept in the telemetry of the run context. """
 
-# Load the hooks
+import time
+
+from multiqc.utils import config, registry, run_context
+
+logger = config.logger
+
+# Find the hooks. These are only loaded when first triggered.
+hook_entry_points = {}
+for version in [1, 2]:
+  for entry_point in registry.entry_points('multiqc.hooks.v{}'.format(version)):
+    try:
+      hook_entry_points[entry_point.name].append((version, entry_point))
+    except KeyError:
+      hook_entry_points[entry_point.name] = [(version, entry_point)]
 hook_functions = {}
-for entry_point in pkg_resources.iter_entry_points('multiqc.hooks.v1'):
-  nicename = str(entry_point).split('=')[0].strip()
-  try:
-    hook_functions[nicename].append(entry_point.load())
-  except KeyError:
-    hook_functions[nicename] = [entry_point.load()]
 
 # Function to run the hooks
-def mqc_trigger (trigger):
-  for hook in hook_functions.get(trigger, []):
-    hook()
+def mqc_trigger (trigger, **kwargs):
+  """ Run the hooks for a trigger point. Returns the first value
+  returned by a v2 hook that isn't None, or None. """
+  if trigger not in hook_functions:
+    hook_functions[trigger] = [
+      (version, '{}:{}'.format(ep.module_name, '.'.join(ep.attrs)), ep.load())
+      for version, ep in hook_entry_points.get(trigger, [])
+    ]
+  ctx = run_context.current()
+  result = None
+  for version, name, hook in hook_functions[trigger]:
+    start = time.time()
+    if version == 1:
+      hook()
+    else:
+      returned = hook(ctx, **kwargs)
+      if result is None:
+        result = returned
+    seconds = time.time() - start
+    if ctx is not None:
+      ctx.add_hook_time(trigger, name, seconds)
+      ctx.count('hook_calls')
+    if seconds > config.slow_hook_seconds:
+      logger.info("Plugin hook {} ({}) took {:.1f}s".format(trigger, name, seconds))
+  return result
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+""" MultiQC registry of installed entry points (modules, templates, plugin
+hooks and command line options), plus the parsed default config.
+
+Finding entry points with pkg_resources means reading the metadata of every
+installed package, which can take seconds in large environments. The results
+are cached for each MultiQC version and Python version, and found again if
+any packages are installed or removed. """
+
+from __future__ import print_function
+import importlib
+import io
+import os
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+import yaml
+
+# Use the fast C YAML parser if PyYAML was built with it
+try:
+    yaml_loader = yaml.CSafeLoader
+except AttributeError:
+    yaml_loader = yaml.SafeLoader
+
+entry_point_groups = [
+    'multiqc.modules.v1',
+    'multiqc.templates.v1',
+    'multiqc.hooks.v1',
+    'multiqc.hooks.v2',
+    'multiqc.cli_options.v1'
+]
+
+# Bump if the contents of the cache change
+_cache_format = 2
+_registry = None
+_git_hashes = dict()
+
+class EntryPoint(object):
+    """ Entry point from the registry. The object is only imported when loaded. """
+    def __init__(self, name, module_name, attrs):
+        self.name = name
+        self.module_name = module_name
+        self.attrs = tuple(attrs)
+
+    def load(self):
+        obj = importlib.import_module(self.module_name)
+        for attr in self.attrs:
+            obj = getattr(obj, attr)
+        return obj
+
+    def __str__(self):
+        if self.attrs:
+            return '{} = {}:{}'.format(self.name, self.module_name, '.'.join(self.attrs))
+        return '{} = {}'.format(self.name, self.module_name)
+
+def cache_dir():
+    """ Default MultiQC cache directory, or None if it can't be made """
+    cdir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'multiqc')
+    try:
+        if not os.path.isdir(cdir):
+            os.makedirs(cdir)
+    except OSError:
+        return None
+    return cdir
+
+def cache_fn():
+    """ Registry cache filename, or None if the cache directory can't be made """
+    cdir = cache_dir()
+    if cdir is None:
+        return None
+    return os.path.join(cdir, 'registry_py{}.{}.pickle'.format(*sys.version_info[:2]))
+
+def _stamp(multiqc_dir, yaml_fns):
+    """ Details that change when packages are installed or removed, or the
+    default config is edited. Editable installs are found outside of
+    site-packages, so their entry point files are checked too. sys.path[0] (the
+    script directory, or the working directory for `python -c` / `-m`) and
+    other entries with no packages installed in them are left out, so that
+    `multiqc` and eg. `python -c` don't each make the cache stale. """
+    stamp = [ _cache_format, multiqc_dir, sys.executable ]
+    for fn in yaml_fns:
+        stamp.append((fn, os.stat(fn).st_mtime))
+    for path in sys.path[1:]:
+        if not path or not os.path.isdir(path):
+            continue
+        if os.path.basename(path) in ['site-packages', 'dist-packages']:
+            stamp.append((path, os.stat(path).st_mtime))
+            continue
+        dists = [ fn for fn in sorted(os.listdir(path)) if fn.endswith(('.egg-info', '.dist-info')) ]
+        if len(dists) == 0:
+            continue
+        stamp.append((path, os.stat(path).st_mtime))
+        for fn in dists:
+            ep_fn = os.path.join(path, fn, 'entry_points.txt')
+            if os.path.isfile(ep_fn):
+                stamp.append((ep_fn, os.stat(ep_fn).st_mtime))
+    return stamp
+
+def _find(yaml_fns):
+    """ Find the entry points and parse the default config """
+    import pkg_resources
+    found = {
+        'version': pkg_resources.get_distribution("multiqc").version,
+        'entry_points': dict(),
+        'yaml': list()
+    }
+    for group in entry_point_groups:
+        found['entry_points'][group] = [
+            (ep.name, ep.module_name, list(ep.attrs)) for ep in pkg_resources.iter_entry_points(group)
+        ]
+    for fn in yaml_fns:
+        with io.open(fn, 'r', encoding='utf-8') as f:
+            found['yaml'].append(yaml.load(f, Loader=yaml_loader))
+    return found
+
+def load(multiqc_dir, yaml_fns):
+    """ Load the registry, from the cache if it is up to date.
+    Returns the MultiQC version and the parsed YAML files. """
+    global _registry
+    stamp = _stamp(multiqc_dir, yaml_fns)
+    fn = cache_fn()
+    if fn is not None and os.path.isfile(fn):
+        try:
+            with io.open(fn, 'rb') as f:
+                cached = pickle.load(f)
+            if cached['stamp'] == stamp:
+                _registry = cached
+        except Exception:
+            pass # Found again below
+    if _registry is None:
+        _registry = _find(yaml_fns)
+        _registry['stamp'] = stamp
+        if fn is not None:
+            # Write to a temporary file first so that parallel runs never see half a file
+            tmp_fn = None
+            try:
+                fh, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(fn), suffix='.tmp')
+                with io.open(fh, 'wb') as f:
+                    pickle.dump(_registry, f, protocol=2)
+                os.rename(tmp_fn, fn)
+            except (OSError, IOError):
+                if tmp_fn is not None and os.path.exists(tmp_fn):
+                    os.remove(tmp_fn)
+    return _registry['version'], _registry['yaml']
+
+def entry_points(group):
+    """ List of EntryPoint objects for an entry point group """
+    return [ EntryPoint(*ep) for ep in _registry['entry_points'].get(group, []) ]
+
+def git_hash(repo_dir):
+    """ Commit hash of a MultiQC source checkout, or None if not installed
+    from one. Only looked up once for each directory. """
+    if repo_dir not in _git_hashes:
+        _git_hashes[repo_dir] = _find_git_hash(repo_dir)
+    return _git_hashes[repo_dir]
+
+def _find_git_hash(repo_dir):
+    """ Read from the .git directory where possible, as starting a
+    git process is slow """
+    git_dir = os.path.join(repo_dir, '.git')
+    if not os.path.exists(git_dir):
+        return None
+    try:
+        with io.open(os.path.join(git_dir, 'HEAD'), 'r') as f:
+            head = f.read().strip()
+        if not head.startswith('ref:'):
+            return head
+        ref = head[4:].strip()
+        if os.path.isfile(os.path.join(git_dir, ref)):
+            with io.open(os.path.join(git_dir, ref), 'r') as f:
+                return f.read().strip()
+        with io.open(os.path.join(git_dir, 'packed-refs'), 'r') as f:
+            for l in f:
+                s = l.strip().split(' ')
+                if len(s) == 2 and s[1] == ref and re.match(r'^[0-9a-f]{40}', s[0]):
+                    return s[0]
+    except (OSError, IOError):
+        pass
+    # Worktrees, submodules and anything else unusual
+    try:
+        return subprocess.check_output( ['git', 'rev-parse', 'HEAD'],
+                                        cwd=repo_dir,
+                                        stderr=subprocess.STDOUT,
+                                        universal_newlines=True ).strip()
+    except:
+        return None
@@ -6,18 +6,35 @@ helper functions to generate markup for report. """
 
 from __future__ import print_function
 from collections import defaultdict, OrderedDict
-import click
+import base64
 import fnmatch
 import io
 import json
 import inspect
+import linecache
 import lzstring
+import math
 import mimetypes
+import numbers
 import os
 import re
+import struct
+import sys
+import threading
+import time
 import yaml
+try:
+    import queue # Python 3
+except ImportError:
+    import Queue as queue # Python 2
+try:
+    import zlib
+except ImportError:
+    zlib = None # Python built without zlib - use lzstring instead
 
 from multiqc import config
+from multiqc.utils import data_writer, log, util_functions
+from multiqc.utils.spill import SpillDict
 logger = config.logger
 
 # Treat defaultdict and OrderedDict as normal dicts for YAML output
@@ -35,20 +52,101 @@ general_stats_headers = list()
 general_stats_html = ''
 data_sources = defaultdict(lambda:defaultdict(lambda:defaultdict()))
 plot_data = dict()
-html_ids = list()
+plot_compressed_chunks = OrderedDict()
+plot_data_codec = None
+module_plot_ids = dict()
+html_ids = set()
+html_id_counters = dict()
 lint_errors = list()
 num_hc_plots = 0
 num_mpl_plots = 0
 saved_raw_data = dict()
 last_found_file = None
 
-# Make a dict of discovered files for each seach key
+# Directory names are shared by every file in the directory
+try:
+    _intern = sys.intern # Python 3
+except AttributeError:
+    _intern = intern # Python 2
+
+class SearchFile(object):
+    """ A file found in the analysis directories. Modules use these like
+    dicts (f['fn'], f['root'], f['s_name'], f['f']), but they only have room
+    for those fields, to save memory when searching millions of files.
+    Any other keys that a module sets are kept in a dict of their own. """
+    __slots__ = ('fn', 'root', 'filesize', 's_name', 'f', '_extra')
+
+    def __init__(self, fn, root):
+        self.fn = fn
+        try:
+            self.root = _intern(root)
+        except TypeError:
+            self.root = root # Unicode on Python 2
+
+    def __getitem__(self, key):
+        try:
+            if key in self.__slots__ and key != '_extra':
+                return getattr(self, key)
+            return self._extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.__slots__ and key != '_extra':
+            setattr(self, key, value)
+        else:
+            try:
+                self._extra[key] = value
+            except AttributeError:
+                self._extra = { key: value }
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = [ k for k in self.__slots__[:-1] if hasattr(self, k) ]
+        return keys + list(getattr(self, '_extra', {}).keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return repr(dict((k, self[k]) for k in self.keys()))
+
+# Files to search, and the discovered files for each search key. The same
+# SearchFile is used in both. searchfiles is only made if an old-style
+# find_log_files() needs it, see get_searchfiles().
 searchfiles = list()
+listed_files = list() # Given with --file-list
 files = dict()
+def load_spilled_data():
+    """ With lean_memory, put the plot data and raw data that were moved to
+    disk back into memory. Done before the temporary directory is removed, so
+    that they can still be used at the end of the run and afterwards. """
+    global plot_data, saved_raw_data
+    if isinstance(plot_data, SpillDict):
+        plot_data = plot_data.unspill()
+    if isinstance(saved_raw_data, SpillDict):
+        saved_raw_data = saved_raw_data.unspill()
+
 def get_filelist(run_module_names):
     """
     Go through all supplied search directories and assembly a master
     list of files to search. Then fire search functions for each file.
+    Returns the number of files that were searched.
     """
     # Prep search patterns
     spatterns = [{},{},{},{},{},{},{}]
@@ -88,31 +186,32 @@ def get_filelist(run_module_names):
     if len(ignored_patterns) > 0:
         logger.debug("Ignored search patterns as didn't match running modules: {}".format(', '.join(ignored_patterns)))
 
-    def add_file(fn, root):
+    def add_file(f):
         """
         Function applied to each file found when walking the analysis
-        directories. Runs through all search patterns and returns True
-        if a match is found.
+        directories. Runs through all search patterns. Returns True if
+        the file was searched, or False if it was skipped (eg. too big).
         """
-        f = {'fn': fn, 'root': root}
+        fn = f.fn
+        root = f.root
 
         # Check that this is a file and not a pipe or anything weird
         if not os.path.isfile(os.path.join(root, fn)):
-            return None
+            return False
 
         # Check that we don't want to ignore this file
         i_matches = [n for n in config.fn_ignore_files if fnmatch.fnmatch(fn, n)]
         if len(i_matches) > 0:
-            logger.debug("Ignoring file as matched an ignore pattern: {}".format(fn))
-            return None
+            log.debug_repeated(logger, "Ignoring file as matched ignore pattern '{}'".format(i_matches[0]), fn)
+            return False
 
         # Limit search to small files, to avoid 30GB FastQ files etc.
         try:
-            f['filesize'] = os.path.getsize(os.path.join(root,fn))
+            f.filesize = os.path.getsize(os.path.join(root,fn))
         except (IOError, OSError, ValueError, UnicodeDecodeError):
-            logger.debug("Couldn't read file when checking filesize: {}".format(fn))
+            log.debug_repeated(logger, "Couldn't read file when checking filesize", fn)
         else:
-            if f['filesize'] > config.log_filesize_limit:
+            if f.filesize > config.log_filesize_limit:
                 return False
 
         # Test file for each search pattern
@@ -124,15 +223,90 @@ def get_filelist(run_module_names):
                         files[key].append(f)
                         # Don't keep searching this file for other modules
                         if not sp.get('shared', False):
-                            return
+                            return True
                         # Don't look at other patterns for this module
                         else:
                             break
-
-    # Go through the analysis directories and get file list
+        return True
+
+    # Files are found by a background thread and searched as they come
+    # in, so searching starts straight away and no full list is made
+    start = time.time()
+    num_files = 0
+    num_bytes = 0
+    progress = log.Progress('Searching')
+    for batch in _background_batches(walk_searchfiles()):
+        for f in batch:
+            num_files += 1
+            # Only count the bytes of files that were searched
+            if add_file(f):
+                num_bytes += getattr(f, 'filesize', 0)
+        progress.update(num_files, num_bytes)
+    progress.finish(num_files, num_bytes)
+    summary = "Searched {} files ({}) in {:.1f}s".format(num_files, log.format_bytes(num_bytes), time.time() - start)
+    if progress.enabled:
+        logger.debug(summary)
+    else:
+        logger.info(summary)
+    log.log_repeated_summary()
+    return num_files
+
+def _background_batches(items, batch_size=100, max_batches=64):
+    """ Run a generator in a background thread, yielding its items in lists
+    of batch_size as they are made. At most max_batches wait to be used, so
+    the thread can't get too far ahead. """
+    batches = queue.Queue(max_batches)
+    stop = threading.Event()
+    def put(batch):
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+    def produce():
+        batch = list()
+        try:
+            for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    put(batch)
+                    batch = list()
+                    if stop.is_set():
+                        return
+            put(batch)
+            put(None)
+        except Exception as e:
+            put(e)
+    thread = threading.Thread(target=produce, name='find_files')
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+        thread.join()
+
+def get_searchfiles():
+    """ List of all files to search, as SearchFile objects. This is only
+    needed for old-style find_log_files() searches, so is made when first used. """
+    if len(searchfiles) == 0:
+        searchfiles.extend(walk_searchfiles())
+    return searchfiles
+
+def walk_searchfiles():
+    """ Go through the analysis directories, yielding a SearchFile for each file """
+    for path in listed_files:
+        yield SearchFile(os.path.basename(path), os.path.dirname(path))
     for path in config.analysis_dir:
         if os.path.isfile(path):
-            searchfiles.append([os.path.basename(path), os.path.dirname(path)])
+            yield SearchFile(os.path.basename(path), os.path.dirname(path))
         elif os.path.isdir(path):
             for root, dirnames, filenames in os.walk(path, followlinks=True, topdown=True):
                 bname = os.path.basename(root)
@@ -143,30 +317,26 @@ def get_filelist(run_module_names):
                     dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(d, n.rstrip(os.sep))]
                     if len(orig_dirnames) != len(dirnames):
                         removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
-                        logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(", ".join(removed_dirs)))
+                        log.debug_repeated(logger, "Ignoring directory as matched fn_ignore_dirs '{}'".format(n), ", ".join(removed_dirs))
                         orig_dirnames = dirnames[:]
                 for n in config.fn_ignore_paths:
                     dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(os.path.join(root, d), n.rstrip(os.sep))]
                     if len(orig_dirnames) != len(dirnames):
                         removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
-                        logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(", ".join(removed_dirs)))
+                        log.debug_repeated(logger, "Ignoring directory as matched fn_ignore_paths '{}'".format(n), ", ".join(removed_dirs))
 
                 # Skip *this* directory if matches ignore params
                 d_matches = [n for n in config.fn_ignore_dirs if fnmatch.fnmatch(bname, n.rstrip(os.sep))]
                 if len(d_matches) > 0:
-                    logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(bname))
+                    log.debug_repeated(logger, "Ignoring directory as matched fn_ignore_dirs '{}'".format(d_matches[0]), bname)
                     continue
                 p_matches = [n for n in config.fn_ignore_paths if fnmatch.fnmatch(root, n.rstrip(os.sep))]
                 if len(p_matches) > 0:
-                    logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(root))
+                    log.debug_repeated(logger, "Ignoring directory as matched fn_ignore_paths '{}'".format(p_matches[0]), root)
                     continue
                 # Search filenames in this directory
                 for fn in filenames:
-                    searchfiles.append([fn, root])
-    # Search through collected files
-    with click.progressbar(searchfiles, label="Searching {} files..".format(len(searchfiles))) as sfiles:
-        for sf in sfiles:
-            add_file(sf[0], sf[1])
+                    yield SearchFile(fn, root)
 
 def search_file (pattern, f):
     """
@@ -234,8 +404,17 @@ def search_file (pattern, f):
     return fn_matched and contents_matched
 
 def data_sources_tofile ():
+    if config.data_format == 'sqlite':
+        rows = list()
+        for mod in data_sources:
+            for sec in data_sources[mod]:
+                for s_name, source in data_sources[mod][sec].items():
+                    rows.append([mod, sec, s_name, source])
+        columns = [ ('Module', 'TEXT'), ('Section', 'TEXT'), ('Sample', 'TEXT'), ('Source', 'TEXT') ]
+        util_functions.write_sqlite_rows('multiqc_sources', columns, rows, index_cols=['Sample'])
+        return
     fn = 'multiqc_sources.{}'.format(config.data_format_extensions[config.data_format])
-    with io.open (os.path.join(config.data_dir, fn), 'w', encoding='utf-8') as f:
+    with data_writer.open_file(fn) as f:
         if config.data_format == 'json':
             jsonstr = json.dumps(data_sources, indent=4, ensure_ascii=False)
             print( jsonstr.encode('utf-8', 'ignore').decode('utf-8'), file=f)
@@ -250,10 +429,21 @@ def data_sources_tofile ():
             body = '\n'.join(["\t".join(l) for l in lines])
             print( body.encode('utf-8', 'ignore').decode('utf-8'), file=f)
 
+def _lint_caller():
+    """ The module file and line of code that called save_htmlid(), for
+    lint messages. Only looked up when there is something to report. """
+    frame = inspect.currentframe()
+    while frame is not None:
+        fn = frame.f_code.co_filename
+        if 'multiqc/modules/' in fn and 'base_module.py' not in fn:
+            callpath = fn.split('multiqc/modules/',1)[-1]
+            return '>{}< '.format(callpath), linecache.getline(fn, frame.f_lineno).strip()
+        frame = frame.f_back
+    return '', ''
+
 def save_htmlid(html_id, skiplint=False):
     """ Take a HTML ID, sanitise for HTML, check for duplicates and save.
     Returns sanitised, unique ID """
-    global html_ids
     global lint_errors
 
     # Trailing whitespace
@@ -270,34 +460,29 @@ def save_htmlid(html_id, skiplint=False):
     html_id_clean = re.sub('[^a-zA-Z0-9_-]+', '_', html_id_clean)
 
     # Validate if linting
-    if config.lint and not skiplint:
-        modname = ''
-        codeline = ''
-        callstack = inspect.stack()
-        for n in callstack:
-            if 'multiqc/modules/' in n[1] and 'base_module.py' not in n[1]:
-                callpath = n[1].split('multiqc/modules/',1)[-1]
-                modname = '>{}< '.format(callpath)
-                codeline = n[4][0].strip()
-                break
     if config.lint and not skiplint and html_id != html_id_clean:
+        modname, codeline = _lint_caller()
         errmsg = "LINT: {}HTML ID was not clean ('{}' -> '{}') ## {}".format(modname, html_id, html_id_clean, codeline)
         logger.error(errmsg)
         lint_errors.append(errmsg)
 
-    # Check for duplicates
-    i = 1
-    html_id_base = html_id_clean
-    while html_id_clean in html_ids:
-        html_id_clean = '{}-{}'.format(html_id_base, i)
-        i += 1
+    # Check for duplicates. Each base ID remembers the last number it
+    # was given, so that many duplicates don't all count up from 1.
+    if html_id_clean in html_ids:
+        html_id_base = html_id_clean
+        i = html_id_counters.get(html_id_base, 0)
+        while html_id_clean in html_ids:
+            i += 1
+            html_id_clean = '{}-{}'.format(html_id_base, i)
+        html_id_counters[html_id_base] = i
         if config.lint and not skiplint:
+            modname, codeline = _lint_caller()
             errmsg = "LINT: {}HTML ID was a duplicate ({}) ## {}".format(modname, html_id_clean, codeline)
             logger.error(errmsg)
             lint_errors.append(errmsg)
 
     # Remember and return
-    html_ids.append(html_id_clean)
+    html_ids.add(html_id_clean)
     return html_id_clean
 
 
@@ -308,3 +493,161 @@ def compress_json(data):
     json_string = json_string.replace('NaN', 'null');
     x = lzstring.LZString()
     return x.compressToBase64(json_string)
+
+
+# Dict keys that need escaping in encode_plot_data()
+marker_key_re = re.compile(r'^_*mqc_f8$')
+
+def encode_plot_data(data, min_array_len=16):
+    """ Take the report plot data and pack it for the report. Lists of numbers
+    are moved out of the JSON into one buffer of little-endian Float64 values,
+    leaving a small {'mqc_f8': [offset, length(, width)]} reference in their
+    place. multiqc_plotdata.js turns them back into arrays when a plot needs them.
+
+    The packed payload is the uint32 length of the JSON index, the JSON index
+    (padded with spaces so that the values start on a multiple of 8 bytes) and
+    then the Float64 values. It is zlib-compressed and base64-encoded.
+
+    Dict keys in the data that could be mistaken for the reference marker
+    (mqc_f8, _mqc_f8 etc.) get an extra leading underscore, which the report
+    takes off again. Dict key order is kept.
+    """
+    chunks = list()
+    num_values = [0]
+
+    def is_number(v):
+        return v is None or (isinstance(v, numbers.Real) and not isinstance(v, bool))
+
+    def add_values(vals):
+        """ Append values to the buffer, returning their offset """
+        offset = num_values[0]
+        vals = [ float('nan') if v is None else float(v) for v in vals ]
+        chunks.append(struct.pack('<{}d'.format(len(vals)), *vals))
+        num_values[0] += len(vals)
+        return offset
+
+    def pack_key(k):
+        if isinstance(k, (str, type(u''))) and marker_key_re.match(k):
+            return '_' + k
+        return k
+
+    def pack(obj):
+        if isinstance(obj, dict):
+            return OrderedDict([ (pack_key(k), pack(v)) for k, v in obj.items() ])
+        if isinstance(obj, (list, tuple)):
+            if len(obj) >= min_array_len and all([ is_number(v) for v in obj ]):
+                try:
+                    return { 'mqc_f8': [add_values(obj), len(obj)] }
+                except OverflowError:
+                    pass
+            # Lists of equal-length number lists, such as [x, y] pairs
+            if len(obj) > 0 and all([ isinstance(v, (list, tuple)) for v in obj ]):
+                width = len(obj[0])
+                if width > 0 and len(obj) * width >= min_array_len and \
+                        all([ len(v) == width and all([ is_number(x) for x in v ]) for v in obj ]):
+                    try:
+                        return { 'mqc_f8': [add_values([ x for v in obj for x in v ]), len(obj), width] }
+                    except OverflowError:
+                        pass
+            return [ pack(v) for v in obj ]
+        # JSON.parse() doesn't handle `NaN`, but it does handle `null`.
+        if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
+            return None
+        return obj
+
+    index = json.dumps(pack(data)).encode('utf-8', 'ignore')
+    padding = b' ' * (-(4 + len(index)) % 8)
+    payload = b''.join([ struct.pack('<I', len(index) + len(padding)), index, padding ] + chunks)
+    return base64.b64encode(zlib.compress(payload, config.plot_data_compress_level)).decode('ascii')
+
+def encode_plot_data_chunks(data):
+    """ Pack each plot separately, so that the report only has to
+    decompress the data for a plot when that plot is first drawn.
+    Returns the name of the codec used and an OrderedDict of plot ID: packed plot data.
+    """
+    codec = config.plot_data_codec
+    if codec not in plot_data_codecs:
+        logger.warning("Plot data codec '{}' not recognised, using 'zlib'".format(codec))
+        codec = 'zlib'
+    if codec == 'zlib' and zlib is None:
+        logger.warning("Python zlib module not available, using 'lzstring' to compress plot data")
+        codec = 'lzstring'
+    encode = plot_data_codecs[codec]
+    # Plots are read one at a time, as with lean_memory they are loaded from disk
+    return codec, OrderedDict([ (pid, encode(data[pid])) for pid in sorted(data.keys()) ])
+
+# Functions to compress a plot's data for the report. The report
+# decodes each with the function of the same name in mqc_plotdata_decoders
+plot_data_codecs = {
+    'zlib': encode_plot_data,
+    'lzstring': compress_json
+}
+
+def compress_plot_data():
+    """ Compress the report plot data in a background thread, so that it can
+    run whilst the report template is being prepared. Returns a function which
+    waits for the thread to finish, sets plot_compressed_chunks and returns the
+    number of seconds the compression took.
+    """
+    result = dict()
+    def run():
+        start = time.time()
+        try:
+            result['chunks'] = encode_plot_data_chunks(plot_data)
+        except Exception as e:
+            result['error'] = e
+        result['seconds'] = time.time() - start
+    thread = threading.Thread(target=run, name='compress_plot_data')
+    thread.daemon = True
+    thread.start()
+
+    def finish():
+        global plot_data_codec, plot_compressed_chunks
+        thread.join()
+        if 'error' in result:
+            raise result['error']
+        plot_data_codec, plot_compressed_chunks = result['chunks']
+        return result['seconds']
+    return finish
+
+class CompressedPlotJson(object):
+    """ Deprecated: all of the plot data as one lz-string compressed JSON
+    string, as used by templates before plot_compressed_chunks. Only made
+    if a template prints it, so that other reports don't pay for it. """
+    def __str__(self):
+        logger.debug("Template uses deprecated report.plot_compressed_json, compressing all plot data")
+        return compress_json(plot_data)
+    __unicode__ = __str__ # Python 2
+
+plot_compressed_json = CompressedPlotJson()
+
+
+def split_report_pages(bundle_name):
+    """ Work out the pages for a split report - an index page with the General
+    Statistics, then one page for each module. Plots which don't belong to a
+    module go on the index page. Returns a list of (filename, page) tuples,
+    where page is the dict given to the template as `page`.
+    """
+    base_fn = os.path.splitext(config.output_fn)[0]
+    module_fns = OrderedDict()
+    pages = list()
+    module_plots = set()
+    for m in modules_output:
+        if len(m.sections) == 0:
+            continue
+        page_fn = '{}_{}.html'.format(base_fn, m.anchor)
+        module_fns[m.anchor] = os.path.basename(page_fn)
+        plot_ids = module_plot_ids.get(m.anchor, set())
+        module_plots.update(plot_ids)
+        pages.append((page_fn, { 'index': False, 'modules': [m], 'plot_ids': plot_ids }))
+    pages.insert(0, (config.output_fn, {
+        'index': True,
+        'modules': [],
+        'plot_ids': set(plot_data.keys()) - module_plots
+    }))
+    for page_fn, page in pages:
+        page['index_fn'] = os.path.basename(config.output_fn)
+        page['module_fns'] = module_fns
+        page['bundle'] = bundle_name
+        page['report_id'] = '{} {}'.format(config.output_fn, config.creation_date)
+    return pages
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+""" MultiQC run context. MultiQC keeps the state of a run in module
+variables (config, report etc.), so that modules can use them easily.
+To run MultiQC more than once in the same process, each run starts with
+these set back to their defaults. Once it has finished they are saved on
+the run context and the previous values are put back, so runs can also
+be started from within another run (eg. by a plugin).
+
+This does not make runs independent enough to happen concurrently: every
+module and plugin reads and writes these globals directly, so a process-wide
+lock makes runs in other threads wait until the current run has finished.
+Concurrent reports need separate processes (see multiqc.serve).
+
+The run context also keeps the telemetry of the run: how long each stage,
+module and plugin hook took, plus counts of files, samples etc. It is
+given to plugin hooks from the multiqc.hooks.v2 entry point group. """
+
+from __future__ import print_function
+import copy
+import functools
+import inspect
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from importlib import reload # Python 3
+except ImportError:
+    pass # Python 2 - reload is a builtin
+
+from multiqc.utils import config, data_writer, log, report, version_check
+
+# Modules which hold the state of a run
+state_modules = [config, report, log, data_writer, version_check]
+
+# Locks are shared by every run in the process, and can't be copied
+lock_types = (type(threading.Lock()), type(threading.RLock()))
+
+def module_state(module):
+    """ The variables of a module, without imports, functions, loggers and locks """
+    return dict(
+        (k, v) for k, v in vars(module).items() if not k.startswith('__')
+        and not inspect.ismodule(v) and not inspect.isroutine(v)
+        and not inspect.isclass(v) and not isinstance(v, logging.Logger)
+        and not isinstance(v, lock_types)
+    )
+
+def set_module_state(module, state):
+    """ Replace the variables of a module """
+    for k in set(module_state(module)) - set(state):
+        delattr(module, k)
+    for k, v in state.items():
+        setattr(module, k, v)
+
+# Defaults to start each run with, taken before anything has run
+default_state = [ copy.deepcopy(module_state(m)) for m in state_modules ]
+
+# Templates that have been imported. These can change the config
+# when imported, so need to be imported again for later runs.
+imported_templates = set()
+
+_lock = threading.RLock()
+_stack = list()
+
+def current():
+    """ The RunContext of the run in progress, or None """
+    return _stack[-1] if len(_stack) > 0 else None
+
+def timed(group, name):
+    """ Decorator adding the time taken by a function to a telemetry group
+    of the run in progress, eg. the time taken by each type of plot """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                ctx = current()
+                if ctx is not None:
+                    ctx.add_time(group, name, time.time() - start)
+        return wrapper
+    return decorator
+
+def load_template(name):
+    """ Load a template module, importing it again if an earlier run used it """
+    template_mod = config.avail_templates[name].load()
+    if template_mod.__name__ in imported_templates:
+        template_mod = reload(template_mod)
+    imported_templates.add(template_mod.__name__)
+    return template_mod
+
+class RunState(object):
+    """ Saved module variables, as attributes """
+    def __init__(self, state):
+        self.__dict__.update(state)
+
+class RunContext(object):
+    """ One MultiQC run. Use in a with statement around the run. Afterwards,
+    the final config and report variables are available as ctx.config and
+    ctx.report, with the exit code in ctx.sys_exit_code and the timings and
+    counters in ctx.telemetry. """
+
+    def __init__(self):
+        self.config = None
+        self.report = None
+        self.sys_exit_code = None
+        self.tmp_dir = None
+        self.telemetry = OrderedDict([
+            ('seconds', None),
+            ('stages', OrderedDict()),
+            ('modules', OrderedDict()),
+            ('plots', OrderedDict()),
+            ('hooks', OrderedDict()),
+            ('background', OrderedDict()),
+            ('counters', OrderedDict())
+        ])
+        self.stage = None
+        self._stage_start = None
+        self._start = None
+        self._saved_state = None
+
+    def start_stage(self, name):
+        """ Start timing a stage of the run, ending the one before """
+        now = time.time()
+        self.end_stage(now)
+        self.stage = name
+        self._stage_start = now
+
+    def end_stage(self, now=None):
+        if self.stage is not None:
+            self.add_time('stages', self.stage, (now or time.time()) - self._stage_start)
+        self.stage = None
+
+    def add_time(self, group, name, seconds):
+        """ Add to the time taken by something in one of the telemetry groups """
+        times = self.telemetry[group]
+        times[name] = times.get(name, 0) + seconds
+
+    def add_hook_time(self, hook_name, function_name, seconds):
+        times = self.telemetry['hooks'].setdefault(hook_name, OrderedDict())
+        times[function_name] = times.get(function_name, 0) + seconds
+
+    def count(self, name, n=1):
+        """ Add to one of the telemetry counters """
+        counters = self.telemetry['counters']
+        counters[name] = counters.get(name, 0) + n
+
+    def log_telemetry(self, logger):
+        """ Log the time taken by each stage, module and plugin hook """
+        def fmt(times):
+            return ', '.join('{}: {:.2f}s'.format(k, v) for k, v in times.items())
+        self.end_stage()
+        logger.debug("Run time    : {:.2f}s".format(time.time() - self._start))
+        logger.debug("Stage times : {}".format(fmt(self.telemetry['stages'])))
+        if len(self.telemetry['modules']) > 0:
+            logger.debug("Module times: {}".format(fmt(self.telemetry['modules'])))
+        if len(self.telemetry['plots']) > 0:
+            logger.debug("Plot times  : {}".format(fmt(self.telemetry['plots'])))
+        for hook_name, times in self.telemetry['hooks'].items():
+            logger.debug("Hook times  : {} - {}".format(hook_name, fmt(times)))
+        if len(self.telemetry['counters']) > 0:
+            logger.debug("Counters    : {}".format(', '.join('{}: {}'.format(k, v) for k, v in self.telemetry['counters'].items())))
+
+    def __enter__(self):
+        _lock.acquire()
+        self._saved_state = [ module_state(m) for m in state_modules ]
+        # Log messages only go to the log of the innermost run
+        for h in log.handlers:
+            config.logger.removeHandler(h)
+        for m, state in zip(state_modules, default_state):
+            set_module_state(m, copy.deepcopy(state))
+        _stack.append(self)
+        self._start = time.time()
+        self.start_stage('setup')
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            self.end_stage()
+            self.telemetry['seconds'] = time.time() - self._start
+            # Clean up anything left behind by runs that didn't finish
+            if self.tmp_dir is not None and os.path.exists(self.tmp_dir):
+                report.load_spilled_data()
+            log.close_log(config.logger)
+            data_writer.discard_archive()
+            for tmp_dir in [self.tmp_dir, log.log_tmp_dir]:
+                if tmp_dir is not None and os.path.exists(tmp_dir):
+                    shutil.rmtree(tmp_dir)
+            self.config = RunState(module_state(config))
+            self.report = RunState(module_state(report))
+        finally:
+            _stack.pop()
+            for m, state in zip(state_modules, self._saved_state):
+                set_module_state(m, state)
+            for h in log.handlers:
+                config.logger.addHandler(h)
+            self._saved_state = None
+            _lock.release()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+""" MultiQC disk-backed data, for the lean_memory config option. Values
+in a SpillDict can be moved out to files on disk once nothing more will be
+added to them. They are then loaded again each time they are used, so only
+one is held in memory at a time (eg. whilst compressing the plot data or
+writing multiqc_data.json). """
+
+from __future__ import print_function
+import os
+
+try:
+    import cPickle as pickle # Python 2
+except ImportError:
+    import pickle
+
+class _Spilled(object):
+    """ Placeholder for a value that has been written to disk """
+    __slots__ = ('fn',)
+    def __init__(self, fn):
+        self.fn = fn
+
+    def load(self):
+        with open(self.fn, 'rb') as fh:
+            return pickle.load(fh)
+
+class SpillDict(dict):
+    """ Dict whose values can be spilled to files in spill_dir. Spilled
+    values are loaded whenever they are read, including by items() and
+    values(), so JSON encoders and loops see the real values.
+
+    Spilled values are read-only: each read gives a new copy, so changes
+    to it would be lost. Setting a key that has been spilled, with
+    d[k] = v, update() or setdefault(), raises a TypeError. pop(), popitem()
+    and copy() give the loaded values. unspill() gives a plain dict with
+    everything loaded again, for before spill_dir is removed. """
+
+    def __init__(self, spill_dir, *args, **kwargs):
+        super(SpillDict, self).__init__(*args, **kwargs)
+        self.spill_dir = spill_dir
+        self.num_spilled = 0
+
+    def spill(self, keys=None):
+        """ Write these values (or all of them) to disk, and let go of them """
+        if not os.path.isdir(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        for k in list(self.keys()) if keys is None else keys:
+            v = dict.get(self, k)
+            if v is None or isinstance(v, _Spilled):
+                continue
+            self.num_spilled += 1
+            fn = os.path.join(self.spill_dir, '{}.pickle'.format(self.num_spilled))
+            with open(fn, 'wb') as fh:
+                pickle.dump(v, fh, pickle.HIGHEST_PROTOCOL)
+            dict.__setitem__(self, k, _Spilled(fn))
+
+    def _check_writable(self, k):
+        if isinstance(dict.get(self, k), _Spilled):
+            raise TypeError("'{}' has been written to disk and is read-only".format(k))
+
+    def __setitem__(self, k, v):
+        self._check_writable(k)
+        dict.__setitem__(self, k, v)
+
+    def __delitem__(self, k):
+        self.pop(k)
+
+    def update(self, *args, **kwargs):
+        new = dict(*args, **kwargs)
+        # Check first, so that nothing is changed if any key is read-only
+        for k in new:
+            self._check_writable(k)
+        for k, v in new.items():
+            dict.__setitem__(self, k, v)
+
+    def setdefault(self, k, default=None):
+        # Usually used to change the value in place, which won't work if spilled
+        self._check_writable(k)
+        return dict.setdefault(self, k, default)
+
+    def pop(self, k, *default):
+        if k not in self:
+            return dict.pop(self, k, *default)
+        v = dict.pop(self, k)
+        if isinstance(v, _Spilled):
+            loaded = v.load()
+            os.remove(v.fn)
+            return loaded
+        return v
+
+    def popitem(self):
+        if len(self) == 0:
+            raise KeyError('popitem(): dictionary is empty')
+        k = list(self.keys())[-1]
+        return k, self.pop(k)
+
+    def copy(self):
+        return self.unspill()
+
+    def unspill(self):
+        """ Plain dict of all of the values, loaded from disk """
+        return dict(self.items())
+
+    def __getitem__(self, k):
+        v = dict.__getitem__(self, k)
+        if isinstance(v, _Spilled):
+            return v.load()
+        return v
+
+    def get(self, k, default=None):
+        if k in self:
+            return self[k]
+        return default
+
+    def items(self):
+        for k in self.keys():
+            yield k, self[k]
+
+    def values(self):
+        for k in self.keys():
+            yield self[k]
+
+    iteritems = items # Python 2
+    itervalues = values
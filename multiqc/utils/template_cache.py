@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+""" MultiQC template caching. Reports inline the same JavaScript, CSS,
+images and fonts every time, so these are read (and base64 encoded) once
+and kept in a cache file for each installed MultiQC version. Compiled
+Jinja templates are cached alongside them. """
+
+from __future__ import print_function
+import base64
+import io
+import jinja2
+import json
+import logging
+import os
+import re
+import tempfile
+
+from multiqc import config
+
+logger = logging.getLogger(__name__)
+
+# Inlined file contents, shared by all reports made by this process
+# Keys are (path, b64): values are (mtime, size, contents)
+_assets = dict()
+_assets_loaded = False
+_assets_changed = False
+# Only files which come with templates are saved to disk, not custom logos etc.
+_template_dirs = set()
+_cacheable = set()
+
+def cache_dir():
+    """ Directory for cache files, or None if caching is disabled """
+    if not config.template_cache:
+        return None
+    cdir = config.template_cache_dir
+    if cdir is None:
+        cdir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'multiqc')
+    try:
+        if not os.path.isdir(cdir):
+            os.makedirs(cdir)
+    except OSError as e:
+        logger.debug("Could not create template cache directory '{}': {}".format(cdir, e))
+        return None
+    return cdir
+
+def _version_fn(cdir, fn):
+    """ Cache filename for this MultiQC version """
+    return os.path.join(cdir, fn.format(re.sub(r'[^\w\.]+', '_', config.version).strip('_')))
+
+def _assets_fn(cdir):
+    return _version_fn(cdir, 'template_assets_{}.json')
+
+def load_assets():
+    """ Load the cached template assets from disk, if not done already """
+    global _assets_loaded
+    if _assets_loaded:
+        return
+    _assets_loaded = True
+    cdir = cache_dir()
+    if cdir is None or not os.path.isfile(_assets_fn(cdir)):
+        return
+    try:
+        with io.open(_assets_fn(cdir), 'r', encoding='utf-8') as f:
+            for path, b64, mtime, size, contents in json.load(f):
+                _assets.setdefault((path, b64), (mtime, size, contents))
+                _cacheable.add((path, b64))
+    except (OSError, IOError, ValueError, TypeError) as e:
+        logger.debug("Could not load template cache '{}': {}".format(_assets_fn(cdir), e))
+
+def save_assets():
+    """ Write the template assets to the disk cache if anything new was read """
+    global _assets_changed
+    cdir = cache_dir()
+    if cdir is None or not _assets_changed:
+        return
+    _assets_changed = False
+    entries = [ [path, b64] + list(_assets[(path, b64)]) for path, b64 in _cacheable ]
+    # Write to a temporary file first so that parallel runs never see half a file
+    tmp_fn = None
+    try:
+        fh, tmp_fn = tempfile.mkstemp(dir=cdir, suffix='.tmp')
+        with io.open(fh, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(entries, ensure_ascii=False))
+        os.rename(tmp_fn, _assets_fn(cdir))
+    except (OSError, IOError) as e:
+        logger.debug("Could not write template cache '{}': {}".format(_assets_fn(cdir), e))
+        if tmp_fn is not None and os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+
+def read_asset(path, b64=False):
+    """ Return the contents of a file, using the cache if the file is unchanged """
+    global _assets_changed
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    cached = _assets.get((path, b64))
+    if cached is not None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+    if b64:
+        with io.open(path, "rb") as f:
+            contents = base64.b64encode(f.read()).decode('utf-8')
+    else:
+        with io.open(path, "r", encoding='utf-8') as f:
+            contents = f.read()
+    _assets[(path, b64)] = (stat.st_mtime, stat.st_size, contents)
+    if any([ path.startswith(d + os.sep) for d in _template_dirs ]):
+        _cacheable.add((path, b64))
+        _assets_changed = True
+    return contents
+
+def include_file_function(template_dirs):
+    """ Returns the include_file() function used in the Jinja templates.
+    Relative paths are looked for in each template directory in turn,
+    unless fdir is given. Set fdir to None for paths relative to the
+    working directory. """
+    load_assets()
+    _template_dirs.update([ os.path.realpath(d) for d in template_dirs ])
+    def include_file(name, fdir=template_dirs, b64=False):
+        if fdir is None:
+            fdir = ['']
+        elif not isinstance(fdir, list):
+            fdir = [fdir]
+        paths = [ os.path.join(d, name) for d in fdir ]
+        try:
+            for path in paths:
+                if os.path.isfile(path):
+                    return read_asset(path, b64)
+            raise IOError("File not found: {}".format(', '.join(paths)))
+        except (OSError, IOError) as e:
+            logger.error("Could not include file '{}': {}".format(name, e))
+    return include_file
+
+def bytecode_cache():
+    """ Jinja bytecode cache, so that templates aren't compiled on every run """
+    cdir = cache_dir()
+    if cdir is None:
+        return None
+    jinja_dir = _version_fn(cdir, 'jinja_{}')
+    try:
+        if not os.path.isdir(jinja_dir):
+            os.makedirs(jinja_dir)
+    except OSError as e:
+        logger.debug("Could not create Jinja cache directory '{}': {}".format(jinja_dir, e))
+        return None
+    return jinja2.FileSystemBytecodeCache(jinja_dir)
@@ -3,15 +3,23 @@
 """ MultiQC Utility functions, used in a variety of places. """
 
 from __future__ import print_function
-import io
+from collections import OrderedDict
 import json
+import numbers
 import os
+import sqlite3
 import yaml
 import time
 import shutil
 import sys
 
 from multiqc import config
+from multiqc.utils import data_writer
+
+try:
+    text_type = unicode # Python 2
+except NameError:
+    text_type = str
 
 def robust_rmtree(path, logger=None, max_retries=10):
     """Robustly tries to delete paths.
@@ -37,6 +45,36 @@ def robust_rmtree(path, logger=None, max_retries=10):
     shutil.rmtree(path)
 
 
+class MQCJSONEncoder(json.JSONEncoder):
+    """ JSON encoder which handles lambda functions (eg. in plot configs) """
+    def default(self, obj):
+        if callable(obj):
+            try:
+                return obj(1)
+            except:
+                return None
+        return json.JSONEncoder.default(self, obj)
+
+
+def iter_json(data, **kwargs):
+    """ Encode data as JSON, yielding the text a batch of chunks at a time
+    instead of building the whole JSON string in memory. """
+    chunks = list()
+    for chunk in MQCJSONEncoder(ensure_ascii=False, **kwargs).iterencode(data):
+        chunks.append(chunk)
+        if len(chunks) >= 8192:
+            yield u''.join(chunks)
+            chunks = list()
+    yield u''.join(chunks)
+
+
+def write_json(data, f, **kwargs):
+    """ Write data to a text file handle as JSON, without building
+    the whole JSON string in memory. """
+    for batch in iter_json(data, **kwargs):
+        f.write(batch)
+
+
 def write_data_file(data, fn, sort_cols=False, data_format=None):
     """ Write a data file to the report directory. Will not do anything
     if config.data_dir is not set.
@@ -52,43 +90,146 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
         # Add relevant file extension to filename
         if data_format is None:
             data_format = config.data_format
+        if data_format == 'sqlite':
+            write_sqlite_table(data, fn, sort_cols)
+            return
         fn = '{}.{}'.format(fn, config.data_format_extensions[data_format])
 
-        # JSON encoder class to handle lambda functions
-        class MQCJSONEncoder(json.JSONEncoder):
-            def default(self, obj):
-                if callable(obj):
-                    try:
-                        return obj(1)
-                    except:
-                        return None
-                return json.JSONEncoder.default(self, obj)
-
-        # Save file
-        with io.open (os.path.join(config.data_dir, fn), 'w', encoding='utf-8') as f:
+        # Save file. Output is written as it is generated, rather than building
+        # the whole file in memory first. Unencodable characters are dropped.
+        with data_writer.open_file(fn) as f:
             if data_format == 'json':
-                jsonstr = json.dumps(data, indent=4, cls=MQCJSONEncoder, ensure_ascii=False)
-                print( jsonstr.encode('utf-8', 'ignore').decode('utf-8'), file=f)
+                write_json(data, f, indent=4)
+                f.write(u'\n')
             elif data_format == 'yaml':
                 yaml.dump(data, f, default_flow_style=False)
             else:
                 # Default - tab separated output
-                # Get all headers
-                h = ['Sample']
-                for sn in sorted(data.keys()):
-                    for k in data[sn].keys():
-                        if type(data[sn][k]) is not dict and k not in h:
-                            h.append(str(k))
+                # Get all headers, in the order that they are first seen
+                samples = sorted(data.keys())
+                h = OrderedDict()
+                for sn in samples:
+                    for k, v in data[sn].items():
+                        if k not in h and type(v) is not dict:
+                            h[k] = str(k)
+                h.pop('Sample', None)
+                cols = list(h.keys())
                 if sort_cols:
-                    h = sorted(h)
+                    cols = sorted(cols, key=lambda k: h[k])
+
+                # Write the rows
+                f.write(u"\t".join(['Sample'] + [ h[k] for k in cols ]) + u"\n")
+                for sn in samples:
+                    # Sample name first, then each field in order of the header cols
+                    row = data[sn]
+                    f.write(u"\t".join([str(sn)] + [ str(row.get(k, '')) for k in cols ]) + u"\n")
+
+
+def sqlite_fn():
+    """ Path to the SQLite database used for --data-format sqlite """
+    return os.path.join(config.data_dir, 'multiqc_data.{}'.format(config.data_format_extensions['sqlite']))
+
+
+def sqlite_name(name):
+    """ Quote a table or column name for SQLite """
+    return '"{}"'.format(str(name).replace('"', '""'))
 
-                # Get the rows
-                rows = [ "\t".join(h) ]
-                for sn in sorted(data.keys()):
-                    # Make a list starting with the sample name, then each field in order of the header cols
-                    l = [str(sn)] + [ str(data[sn].get(k, '')) for k in h[1:] ]
-                    rows.append( "\t".join(l) )
 
-                body = '\n'.join(rows)
+def sqlite_value(v):
+    """ Convert a value to a type that SQLite can store """
+    if v is None or isinstance(v, text_type):
+        return v
+    if isinstance(v, numbers.Integral) and not isinstance(v, bool) and abs(v) < 2**63:
+        return int(v)
+    if isinstance(v, numbers.Real) and not isinstance(v, bool):
+        return float(v)
+    return str(v)
 
-                print( body.encode('utf-8', 'ignore').decode('utf-8'), file=f)
+
+def write_sqlite_table(data, table, sort_cols=False, index_cols=None):
+    """ Write a 2D dict to a table in the data directory SQLite database,
+    replacing the table if it already exists. The first column is the sample
+    name. Columns of whole numbers are INTEGER, other numbers REAL and all
+    else TEXT. All rows are inserted in a single transaction.
+    :param: data - a 2D dict, first key sample name (row header),
+            second key field (column header).
+    :param: table - Table name
+    :param: sort_cols - Sort columns alphabetically
+    :param: index_cols - Columns to add an index for. Default: ['Sample']
+    :return: None """
+    if index_cols is None:
+        index_cols = ['Sample']
+
+    # Get all columns, in the order that they are first seen.
+    # SQLite column names are not case sensitive, so make them unique.
+    samples = sorted(data.keys())
+    cols = OrderedDict()
+    col_names = set(['sample'])
+    for sn in samples:
+        for k, v in data[sn].items():
+            if k not in cols and type(v) is not dict:
+                name = str(k)
+                i = 2
+                while name.lower() in col_names:
+                    name = '{}_{}'.format(k, i)
+                    i += 1
+                col_names.add(name.lower())
+                cols[k] = name
+    keys = list(cols.keys())
+    if sort_cols:
+        keys = sorted(keys, key=lambda k: cols[k])
+
+    # Get the rows and work out the column types
+    rows = [ [ str(sn) ] + [ sqlite_value(data[sn].get(k)) for k in keys ] for sn in samples ]
+    col_types = list()
+    for i in range(1, len(keys) + 1):
+        vals = [ row[i] for row in rows if row[i] is not None ]
+        if all([ isinstance(v, numbers.Integral) for v in vals ]):
+            col_types.append('INTEGER')
+        elif all([ isinstance(v, numbers.Real) for v in vals ]):
+            col_types.append('REAL')
+        else:
+            col_types.append('TEXT')
+            for row in rows:
+                if row[i] is not None:
+                    row[i] = text_type(row[i])
+
+    columns = [ ('Sample', 'TEXT') ] + [ (cols[k], t) for k, t in zip(keys, col_types) ]
+    write_sqlite_rows(table, columns, rows, index_cols)
+
+
+def write_sqlite_rows(table, columns, rows, index_cols=None):
+    """ Create a table in the data directory SQLite database and insert rows
+    in one transaction, replacing the table if it already exists.
+    :param: table - Table name
+    :param: columns - list of (column name, SQLite type) tuples
+    :param: rows - list of rows, each a list of values in column order
+    :param: index_cols - Columns to add an index for
+    :return: None """
+    col_defs = [ '{} {}'.format(sqlite_name(c), t) for c, t in columns ]
+    conn = sqlite3.connect(sqlite_fn())
+    try:
+        with conn:
+            conn.execute('DROP TABLE IF EXISTS {}'.format(sqlite_name(table)))
+            conn.execute('CREATE TABLE {} ({})'.format(sqlite_name(table), ', '.join(col_defs)))
+            conn.executemany(
+                'INSERT INTO {} VALUES ({})'.format(sqlite_name(table), ', '.join(['?'] * len(columns))),
+                rows
+            )
+            for col in index_cols or []:
+                conn.execute('CREATE INDEX {} ON {} ({})'.format(
+                    sqlite_name('{}_{}'.format(table, col)), sqlite_name(table), sqlite_name(col)))
+    finally:
+        conn.close()
+
+def version_option(f):
+    """ click --version option. Like click.version_option(), but the version
+    (which can include the git hash) is only worked out if it is used """
+    import click
+    def print_version(ctx, param, value):
+        if not value or ctx.resilient_parsing:
+            return
+        click.echo('{}, version {}'.format(ctx.find_root().info_name, config.version))
+        ctx.exit()
+    return click.option('--version', is_flag=True, expose_value=False, is_eager=True,
+                        callback=print_version, help="Show the version and exit.")(f)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+""" Check whether a newer version of MultiQC is available. The check runs
+in a background thread whilst MultiQC works, and the result is reported
+at the end of the run. Results are cached so that repeated runs don't
+need to check again. Failed checks (eg. with no network) are cached too,
+for a shorter time, so that every run doesn't have to wait for them.
+
+benchmarks/version_check_server.py tests this against a stand-in server. """
+
+from __future__ import print_function
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    from urllib.request import urlopen #py3
+except ImportError:
+    from urllib2 import urlopen #py2
+
+from multiqc.utils import config, registry
+
+logger = logging.getLogger(__name__)
+
+_thread = None
+_started = None
+_result = dict()
+
+# Seconds to wait for an unfinished check at the end of a run
+grace_seconds = 0.5
+
+def cache_fn():
+    cdir = registry.cache_dir()
+    if cdir is None:
+        return None
+    return os.path.join(cdir, 'version_check.json')
+
+def load_cache(url):
+    """ Last result for this URL, if it is recent enough """
+    fn = cache_fn()
+    if fn is None or not os.path.isfile(fn):
+        return None
+    try:
+        with io.open(fn, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        hours = config.version_check_failed_cache_hours if cached.get('error') else config.version_check_cache_hours
+        if cached.get('url') == url and 0 <= time.time() - cached['checked'] < hours * 3600:
+            return cached
+    except (OSError, IOError, ValueError, TypeError, KeyError) as e:
+        logger.debug("Could not load version check cache '{}': {}".format(fn, e))
+    return None
+
+def _write_cache(fn, result):
+    """ Write a result to the cache file. Raises OSError / IOError on failure """
+    # Write to a temporary file first so that parallel runs never see half a file
+    fh, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(fn), suffix='.tmp')
+    try:
+        with io.open(fh, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False))
+        os.rename(tmp_fn, fn)
+    finally:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+
+def save_cache(result):
+    fn = cache_fn()
+    if fn is None:
+        return
+    try:
+        _write_cache(fn, result)
+    except (OSError, IOError) as e:
+        logger.debug("Could not write version check cache '{}': {}".format(fn, e))
+
+def _check(url, check_result, fn, timeout):
+    """ Get the latest version. Runs in the background thread, so doesn't log.
+    Saves to the result dict of the run that started it, and to the cache
+    file fn, even if the run has finished by then. """
+    result = { 'url': url, 'checked': time.time(), 'remote_version': None, 'error': None }
+    try:
+        response = urlopen(url, timeout=timeout)
+        result['remote_version'] = response.read().decode('utf-8').strip()
+    except Exception as e:
+        result['error'] = str(e)
+    check_result.update(result)
+    if fn is not None:
+        try:
+            _write_cache(fn, result)
+        except (OSError, IOError):
+            pass
+
+def start():
+    """ Start checking for a new version, unless checked recently """
+    global _thread, _started
+    if config.no_version_check is True:
+        return
+    url = config.version_check_url.format(config.short_version)
+    cached = load_cache(url)
+    if cached is not None:
+        _result.update(cached)
+        _result['cached'] = True
+        return
+    _started = time.time()
+    _thread = threading.Thread(target=_check, args=(url, _result, cache_fn(), config.version_check_timeout))
+    _thread.daemon = True
+    _thread.start()
+
+def version_tuple(v):
+    """ Numeric parts of a version string, for comparing versions """
+    parts = [ int(x) for x in re.sub(r'[^0-9\.]', '', v).split('.') if x != '' ]
+    while len(parts) > 0 and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+def finish():
+    """ Log the result of the version check. Waits grace_seconds at most
+    (and never past the check deadline), so that MultiQC never hangs. If the
+    check hasn't finished, it is cached as failed and the thread is left to
+    die with the process. """
+    global _thread
+    if _thread is not None:
+        _thread.join(max(min(_started + config.version_check_timeout - time.time(), grace_seconds), 0))
+        if _thread.is_alive():
+            logger.debug('Version check did not finish, not checking again for {} hours'.format(
+                config.version_check_failed_cache_hours))
+            _thread = None
+            save_cache({ 'url': config.version_check_url.format(config.short_version),
+                'checked': time.time(), 'remote_version': None, 'error': 'Timed out' })
+            return
+        _thread = None # The thread has cached the result itself
+    remote_version = _result.get('remote_version')
+    if remote_version:
+        if version_tuple(remote_version) > version_tuple(config.short_version):
+            logger.warn('MultiQC Version {} now available!'.format(remote_version))
+        else:
+            logger.debug('Latest MultiQC version is {}'.format(remote_version))
+    elif _result.get('error'):
+        logger.debug('Could not connect to multiqc.info for version check: {}'.format(_result['error']))
@@ -140,10 +140,19 @@ setup(
             # 'before_config = myplugin.hooks:before_config',
             # 'config_loaded = myplugin.hooks:config_loaded',
             # 'execution_start = myplugin.hooks:execution_start',
+            # 'before_discovery = myplugin.hooks:before_discovery',
+            # 'after_discovery = myplugin.hooks:after_discovery',
             # 'before_modules = myplugin.hooks:before_modules',
+            # 'before_module = myplugin.hooks:before_module',
+            # 'after_module = myplugin.hooks:after_module',
             # 'after_modules = myplugin.hooks:after_modules',
             # 'before_report_generation = myplugin.hooks:before_report_generation',
+            # 'before_template = myplugin.hooks:before_template',
             # 'execution_finish = myplugin.hooks:execution_finish',
+        # ],
+        # 'multiqc.hooks.v2': [
+            # Same hooks as v1, called with the run context
+            # 'before_module = myplugin.hooks:before_module_v2',
         # ]
     },
     classifiers = [